@@ -0,0 +1,414 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+def make_alert_payload(confidence, profile, now, camera=None):
+    """Builds the JSON body the IoT node expects for a detection at `now` (a datetime)."""
+    payload = {
+        "event": "tea_service_detected",
+        "profile": profile,
+        "confidence": confidence,
+        "timestamp": now.isoformat()
+    }
+    if camera is not None:
+        payload["camera"] = camera
+    return payload
+
+
+def alert_urls():
+    """The displays to alert: ALERT_ENDPOINTS, or the single IOT_NODE_IP display when it is empty."""
+    return list(config.ALERT_ENDPOINTS) or [f"http://{config.IOT_NODE_IP}:{config.IOT_NODE_PORT}{config.ALERT_ENDPOINT}"]
+
+
+class AlertSpool:
+    """
+    Durable store for alerts that could not be delivered.
+
+    An append-only JSON-lines file: one line per spooled alert
+    ({"id", "t", "url", "alert"}) and one per later delivery ({"ack": id}).
+    Loading replays the file to find what is still owed. Once everything is
+    acknowledged the file is truncated; past `compact_bytes` it is rewritten
+    with only the pending alerts. Alerts older than `max_age_seconds` are
+    expired instead of replayed, since a stale alert is misleading.
+    """
+    def __init__(self, path, max_age_seconds=None, compact_bytes=256 * 1024):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._records = OrderedDict()  # id -> record, oldest first
+        self._next_id = 1
+        self.expired = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._load()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line after a power cut
+                if "ack" in entry:
+                    self._records.pop(entry["ack"], None)
+                else:
+                    self._records[entry["id"]] = entry
+                    self._next_id = max(self._next_id, entry["id"] + 1)
+        self._rewrite()
+
+    def _append(self, entry):
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _rewrite(self):
+        """Replaces the file with just the pending records."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in self._records.values():
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _maybe_compact(self):
+        if not self._records:
+            self._file.truncate(0)
+            self._file.seek(0)
+        elif self._file.tell() > self.compact_bytes:
+            self._file.close()
+            self._rewrite()
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def add(self, url, payload):
+        """Stores an undelivered alert for `url`; returns its record id."""
+        with self._lock:
+            entry = {"id": self._next_id, "t": time.time(), "url": url, "alert": payload}
+            self._next_id += 1
+            self._records[entry["id"]] = entry
+            self._append(entry)
+            return entry["id"]
+
+    def ack(self, record_id):
+        """Marks a spooled alert as delivered."""
+        with self._lock:
+            if self._records.pop(record_id, None) is None:
+                return
+            self._append({"ack": record_id})
+            self._maybe_compact()
+
+    def pending(self, url):
+        """Alerts still owed to `url` as [(record_id, payload)], oldest first; expired ones are dropped."""
+        with self._lock:
+            if self.max_age_seconds is not None:
+                cutoff = time.time() - self.max_age_seconds
+                stale = [rid for rid, entry in self._records.items() if entry["t"] < cutoff]
+                for rid in stale:
+                    del self._records[rid]
+                    self._append({"ack": rid})
+                if stale:
+                    self.expired += len(stale)
+                    self._maybe_compact()
+            return [(rid, entry["alert"]) for rid, entry in self._records.items() if entry["url"] == url]
+
+    def __len__(self):
+        return len(self._records)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class AlertEndpoint:
+    """
+    Delivery to one display: its own queue, worker thread, keep-alive session
+    and statistics, so a slow or rebooting display never delays the others.
+    """
+    def __init__(self, url, dispatcher, queue_size, pool_size):
+        # Imported here: requests costs noticeable startup time on the board
+        # and is not needed by anything that only builds payloads
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.url = url
+        self.dispatcher = dispatcher
+        self.request_error = requests.exceptions.RequestException
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.lock = threading.Lock()
+
+        # Delivery statistics
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retries = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.last_latency = 0.0
+        self.total_latency = 0.0
+        self.last_error = None
+        self.online = True
+
+    @property
+    def average_latency(self):
+        return self.total_latency / self.sent if self.sent else 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name=f"alerts-{self.url}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        dispatcher = self.dispatcher
+        self._replay()  # Alerts spooled before a restart
+        while not dispatcher._stop.is_set():
+            owed = dispatcher.spool is not None and dispatcher.spool.pending(self.url)
+            try:
+                # With alerts owed, wake up periodically to retry them
+                item = self.queue.get(timeout=dispatcher.replay_interval if owed else None)
+            except queue.Empty:
+                self._replay()
+                continue
+            if item is None:
+                continue
+            queued_at, payload = item
+            if self._deliver(payload, dispatcher.max_retries):
+                latency = time.monotonic() - queued_at
+                with self.lock:
+                    self.sent += 1
+                    self.last_latency = latency
+                    self.total_latency += latency
+                # The display answers: send it whatever it missed
+                self._replay()
+            else:
+                with self.lock:
+                    self.failed += 1
+                self.spool(payload)
+
+    def spool(self, payload):
+        """Keeps an alert this display could not take for a later replay (if a spool is configured)."""
+        if self.dispatcher.spool is None:
+            return False
+        self.dispatcher.spool.add(self.url, payload)
+        with self.lock:
+            self.spooled += 1
+        return True
+
+    def _replay(self):
+        """Delivers alerts spooled for this display, oldest first, until one fails."""
+        spool = self.dispatcher.spool
+        if spool is None:
+            return
+        for record_id, payload in spool.pending(self.url):
+            if self.dispatcher._stop.is_set() or not self._deliver(payload, 0):
+                return
+            spool.ack(record_id)
+            with self.lock:
+                self.replayed += 1
+
+    def _deliver(self, payload, max_retries):
+        """Posts one alert, retrying with backoff. Returns True on HTTP 200."""
+        dispatcher = self.dispatcher
+        logger = dispatcher.logger
+        for attempt in range(max_retries + 1):
+            if attempt:
+                with self.lock:
+                    self.retries += 1
+                # Exponential backoff; returns early if we are shutting down
+                if dispatcher._stop.wait(dispatcher.backoff_seconds * (2 ** (attempt - 1))):
+                    return False
+            try:
+                logger.info(f"[INFO] Sending alert to {self.url}...")
+                response = self.session.post(self.url, json=payload, timeout=dispatcher.timeout)
+                if response.status_code == 200:
+                    logger.info(f"[INFO] Alert sent successfully to {self.url}.")
+                    if not self.online:
+                        logger.info(f"[INFO] Display {self.url} is reachable again.")
+                    self.online = True
+                    return True
+                self.last_error = f"HTTP {response.status_code}"
+                logger.warning(f"[WARN] Alert sent to {self.url} but server returned {response.status_code}")
+            except self.request_error as e:
+                self.last_error = str(e)
+                logger.error(f"[ERROR] Failed to send alert to {self.url}: {e}")
+        self.online = False
+        return False
+
+
+class AlertDispatcher:
+    """
+    Delivers alert payloads over HTTP to one or more displays from background threads.
+
+    Callers only enqueue (submit never blocks). Every display has its own
+    worker posting on a persistent keep-alive session with bounded retries
+    and exponential backoff, so N displays cost one timeout, not N.
+    Identical events (same event, camera and profile) within
+    `coalesce_seconds` are sent once. With a spool, alerts a display could
+    not take (retries exhausted, queue full, or shutdown) are written to disk
+    and replayed, oldest first, once that display answers again, also across
+    restarts. Without one, a full queue drops the alert and counts it.
+    """
+    def __init__(self, url, queue_size=16, max_retries=3, backoff_seconds=0.5,
+                 timeout=5.0, pool_size=2, logger=None, coalesce_seconds=0.0,
+                 spool=None, replay_interval=30.0):
+        urls = [url] if isinstance(url, str) else list(url)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.coalesce_seconds = coalesce_seconds
+        self.spool = spool
+        self.replay_interval = replay_interval
+        self.logger = logger or logging.getLogger("teatime.alerts")
+        self.endpoints = [AlertEndpoint(u, self, queue_size, pool_size) for u in urls]
+
+        self._stop = threading.Event()
+        self._started = False
+        self._lock = threading.Lock()
+        self._last_seen = {}  # Coalescing key -> monotonic time it was last accepted
+        self.coalesced = 0
+
+    @classmethod
+    def from_config(cls, logger=None):
+        """A dispatcher for the displays, retries, coalescing and spool set in config.py."""
+        spool = None
+        if config.ALERT_SPOOL_PATH:
+            spool = AlertSpool(config.ALERT_SPOOL_PATH, max_age_seconds=config.ALERT_SPOOL_MAX_AGE_SECONDS)
+        return cls(
+            alert_urls(),
+            queue_size=config.ALERT_QUEUE_SIZE,
+            max_retries=config.ALERT_MAX_RETRIES,
+            backoff_seconds=config.ALERT_RETRY_BACKOFF_SECONDS,
+            timeout=config.ALERT_TIMEOUT_SECONDS,
+            logger=logger,
+            coalesce_seconds=config.ALERT_COALESCE_SECONDS,
+            spool=spool,
+            replay_interval=config.ALERT_REPLAY_INTERVAL_SECONDS)
+
+    def start(self):
+        if not self._started:
+            self._started = True
+            for endpoint in self.endpoints:
+                endpoint.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        """Stops the workers; alerts still queued after `timeout` are spooled, or abandoned without a spool."""
+        self._stop.set()
+        for endpoint in self.endpoints:
+            try:
+                endpoint.queue.put_nowait(None)  # Wake the worker
+            except queue.Full:
+                pass
+        for endpoint in self.endpoints:
+            if endpoint.thread is not None:
+                endpoint.thread.join(timeout)
+                endpoint.thread = None
+            while True:
+                try:
+                    item = endpoint.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    endpoint.spool(item[1])
+            endpoint.session.close()
+        if self.spool is not None:
+            self.spool.close()
+
+    def submit(self, payload):
+        """
+        Queues an alert for every display. Returns False if some display had
+        to drop it (queue full and no spool).
+        """
+        if self.coalesce_seconds:
+            key = (payload.get("event"), payload.get("camera"), payload.get("profile"))
+            now = time.monotonic()
+            with self._lock:
+                last = self._last_seen.get(key)
+                if last is not None and now - last < self.coalesce_seconds:
+                    self.coalesced += 1
+                    return True
+                self._last_seen[key] = now
+
+        accepted = True
+        queued_at = time.monotonic()
+        for endpoint in self.endpoints:
+            try:
+                endpoint.queue.put_nowait((queued_at, payload))
+            except queue.Full:
+                if endpoint.spool(payload):
+                    continue
+                with endpoint.lock:
+                    endpoint.dropped += 1
+                accepted = False
+                self.logger.warning(f"[WARN] Alert queue for {endpoint.url} full, dropping alert.")
+        return accepted
+
+    # Totals over all displays
+    def _total(self, name):
+        return sum(getattr(endpoint, name) for endpoint in self.endpoints)
+
+    @property
+    def sent(self):
+        return self._total("sent")
+
+    @property
+    def failed(self):
+        return self._total("failed")
+
+    @property
+    def dropped(self):
+        return self._total("dropped")
+
+    @property
+    def retries(self):
+        return self._total("retries")
+
+    @property
+    def spooled(self):
+        return self._total("spooled")
+
+    @property
+    def replayed(self):
+        return self._total("replayed")
+
+    @property
+    def total_latency(self):
+        return self._total("total_latency")
+
+    @property
+    def pending(self):
+        return sum(endpoint.queue.qsize() for endpoint in self.endpoints)
+
+    @property
+    def spool_pending(self):
+        return len(self.spool) if self.spool is not None else 0
+
+    @property
+    def average_latency(self):
+        sent = self.sent
+        return self.total_latency / sent if sent else 0.0
+
+    def endpoint_summaries(self):
+        """One line of delivery statistics per display."""
+        lines = []
+        for e in self.endpoints:
+            line = (f"{e.url}: {'up' if e.online else 'DOWN'}, sent {e.sent}, failed {e.failed}, "
+                    f"retries {e.retries}, spooled {e.spooled}, replayed {e.replayed}, dropped {e.dropped}, "
+                    f"avg latency {e.average_latency * 1000:.0f} ms")
+            if not e.online and e.last_error:
+                line += f", last error: {e.last_error}"
+            lines.append(line)
+        return lines
@@ -0,0 +1,107 @@
+"""
+Detection backends the edge node can run with, selected by name
+(config.DETECTION_BACKEND or teatime.py --backend).
+
+Every backend is registered with the modules it needs. Availability is
+checked with importlib.util.find_spec, which does not import anything,
+and a backend's own imports (rclpy, hobot_dnn, ...) happen only in its
+run function (timed as the "imports" startup phase), so choosing one
+costs nothing for the others.
+"""
+
+import importlib.util
+
+import config
+from metrics import STARTUP
+
+BACKENDS = {}
+
+
+class Backend:
+    def __init__(self, name, description, run, requires=(), check=None):
+        self.name = name
+        self.description = description
+        self.run = run
+        self.requires = tuple(requires)
+        self.check = check
+
+    def missing(self):
+        """Why this backend cannot run here ([] when it can)."""
+        missing = [module for module in self.requires if importlib.util.find_spec(module) is None]
+        if not missing and self.check is not None:
+            reason = self.check()
+            if reason:
+                missing.append(reason)
+        return missing
+
+    def available(self):
+        return not self.missing()
+
+
+def register(name, description, requires=(), check=None):
+    """
+    Decorator registering `run(source)` as backend `name`. `check` may
+    return a reason the backend cannot run beyond missing modules.
+    """
+    def decorator(run):
+        BACKENDS[name] = Backend(name, description, run, requires=requires, check=check)
+        return run
+    return decorator
+
+
+def select(name=None):
+    """
+    The Backend called `name` (default config.DETECTION_BACKEND); "auto" is
+    the first available one of config.DETECTION_BACKEND_ORDER. Raises
+    ValueError for unknown names and ImportError when it cannot run here.
+    """
+    name = name or config.DETECTION_BACKEND
+    if name == "auto":
+        for candidate in config.DETECTION_BACKEND_ORDER:
+            if BACKENDS[candidate].available():
+                return BACKENDS[candidate]
+        raise ImportError("No detection backend can run here: " + "; ".join(
+            f"{candidate} needs {', '.join(BACKENDS[candidate].missing())}"
+            for candidate in config.DETECTION_BACKEND_ORDER))
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown detection backend {name!r}; choose from auto, {', '.join(BACKENDS)}")
+    backend = BACKENDS[name]
+    missing = backend.missing()
+    if missing:
+        raise ImportError(f"Detection backend {name!r} needs {', '.join(missing)}")
+    return backend
+
+
+@register("ros", "main.py: person boxes from the mono2d_body_detection topic (ROS2)",
+          requires=("rclpy", "sensor_msgs", "ai_msgs"))
+def run_ros(source=None):
+    with STARTUP.phase("imports"):
+        import main
+    main.main()
+
+
+def _bpu_enabled():
+    return None if config.USE_RDK_BPU else "USE_RDK_BPU = True"
+
+
+@register("bpu", "pipeline.py: cv2.VideoCapture + FCOS on the RDK X5 BPU",
+          requires=("hobot_dnn",), check=_bpu_enabled)
+def run_bpu(source=None):
+    with STARTUP.phase("imports"):
+        from pipeline import Pipeline
+    # Pipeline's default detector is the BPU one
+    Pipeline(config.VIDEO_SOURCE if source is None else source).run()
+
+
+def _hog_available():
+    from cpu_detector import hog_available
+    return None if hog_available() else "an OpenCV build with HOGDescriptor"
+
+
+@register("cpu", "pipeline.py: cv2.VideoCapture + OpenCV's HOG people detector on the CPU",
+          check=_hog_available)
+def run_cpu(source=None):
+    with STARTUP.phase("imports"):
+        from cpu_detector import CPUDetector
+        from pipeline import Pipeline
+    Pipeline(config.VIDEO_SOURCE if source is None else source, detector=CPUDetector()).run()
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the edge node hot paths. Needs neither ROS nor the
+BPU: the FCOS native library, the ROS client library and the message types
+are replaced by in-process stand-ins, so only our own code is measured.
+
+    python benchmark.py                        # run, compare with bench_baseline.json
+    python benchmark.py --output results.json  # also write machine-readable results
+    python benchmark.py --update-baseline      # store this run as the new baseline
+    python benchmark.py --verify-estimation [DIR]   # budgeted vs exact color verdicts
+
+Exits with status 1 when any case's median is slower than its baseline by
+more than --tolerance (default 25%). A missing baseline is only a warning,
+unless --check is given: then it, or a case the baseline does not cover,
+fails the run too, so a CI regression gate cannot pass vacuously.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import types
+
+import cv2
+import numpy as np
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+
+def measure(fn, iterations, warmup=3):
+    """Runs fn repeatedly and returns timing statistics in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+def synthetic_frame(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    # A purple block so the color check has something to find
+    frame[height // 4:height // 2, width // 4:width // 2] = (200, 50, 180)
+    return frame
+
+
+def person_boxes(width, height, count, box_w, box_h):
+    """`count` person boxes of box_w x box_h spread across the frame."""
+    boxes = []
+    for i in range(count):
+        x = int((width - box_w) * i / max(1, count - 1)) if count > 1 else (width - box_w) // 2
+        boxes.append((x, (height - box_h) // 2, x + box_w, (height + box_h) // 2))
+    return boxes
+
+
+def bench_uniform_color(iterations):
+    import config
+    from detector import TeaDetector
+    detector = TeaDetector()
+    frame = synthetic_frame(1920, 1080)
+    results = {}
+    for box_w, box_h in ((64, 160), (200, 500), (480, 1000)):
+        bbox = person_boxes(1920, 1080, 1, box_w, box_h)[0]
+        results[f"uniform_color/single/{box_w}x{box_h}"] = measure(
+            lambda: detector.check_uniform_color(frame, bbox), iterations)
+    estimator = TeaDetector(pixel_budget=config.COLOR_PIXEL_BUDGET, confidence_z=config.COLOR_CONFIDENCE_Z)
+    for box_w, box_h in ((200, 500), (480, 1000)):
+        bbox = person_boxes(1920, 1080, 1, box_w, box_h)[0]
+        results[f"uniform_color/estimated/{box_w}x{box_h}"] = measure(
+            lambda: estimator.check_uniform_colors(frame, [bbox], with_mask=False), iterations)
+    for count in (1, 5, 10):
+        boxes = person_boxes(1920, 1080, count, 160, 400)
+        results[f"uniform_color/per_box/{count}_persons"] = measure(
+            lambda: [detector.check_uniform_color(frame, b) for b in boxes], iterations)
+        results[f"uniform_color/batch/{count}_persons"] = measure(
+            lambda: detector.check_uniform_colors(frame, boxes, with_mask=False), iterations)
+    # A crowd: each box overlaps its neighbour by half, where the union pass pays off
+    crowd = [(400 + 80 * i, 340, 560 + 80 * i, 740) for i in range(10)]
+    results["uniform_color/per_box/10_persons_overlapping"] = measure(
+        lambda: [detector.check_uniform_color(frame, b) for b in crowd], iterations)
+    results["uniform_color/batch/10_persons_overlapping"] = measure(
+        lambda: detector.check_uniform_colors(frame, crowd, with_mask=False), iterations)
+    return results
+
+
+def bench_preprocess(iterations):
+    import config
+    from motion import MotionGate
+    from nv12 import NV12Preprocessor
+    from rdk_adapter import RDKDetector
+    w, h = config.RDK_MODEL_WIDTH, config.RDK_MODEL_HEIGHT
+    preprocessor = NV12Preprocessor(w, h)
+    gate = MotionGate(width=config.MOTION_GATE_WIDTH)
+    results = {}
+    for frame_w, frame_h in ((640, 480), (1280, 720), (1920, 1080)):
+        frame = synthetic_frame(frame_w, frame_h)
+        results[f"preprocess/resize_bgr2nv12_opencv/{frame_w}x{frame_h}"] = measure(
+            lambda: RDKDetector.bgr2nv12_opencv(cv2.resize(frame, (w, h))), iterations)
+        results[f"preprocess/resize_nv12/{frame_w}x{frame_h}"] = measure(
+            lambda: preprocessor(frame), iterations)
+        # Runs on every frame in front of the BPU, so it must stay far below preprocessing
+        results[f"preprocess/motion_gate/{frame_w}x{frame_h}"] = measure(
+            lambda: gate.check(frame), iterations)
+    return results
+
+
+def fake_model_outputs(input_w=512, input_h=512):
+    """Float FCOS outputs (5 cls, 5 box, 5 centerness) plus their property descriptors."""
+    from fcos_numpy import STRIDES
+    rng = np.random.default_rng(0)
+    model_outputs, outputs = [], []
+    for channels, fill in ((80, -6.0), (4, 30.0), (1, -6.0)):
+        for stride in STRIDES:
+            shape = (1, input_h // stride, input_w // stride, channels)
+            buffer = np.full(shape, fill, dtype=np.float32) + rng.normal(0, 0.5, shape).astype(np.float32)
+            properties = types.SimpleNamespace(layout="NHWC", shape=shape, scale_data=np.array([]))
+            model_outputs.append(types.SimpleNamespace(properties=properties))
+            outputs.append(types.SimpleNamespace(buffer=buffer))
+    # A handful of confident people at stride 16
+    for k in range(5):
+        outputs[1].buffer[0, 10 + k, 5 + 4 * k, 0] = 4.0
+        outputs[11].buffer[0, 10 + k, 5 + 4 * k, 0] = 4.0
+    return model_outputs, outputs
+
+
+def bench_fcos(iterations):
+    import fcos_lib
+    model_outputs, outputs = fake_model_outputs()
+
+    # Stand-in for libpostprocess.so: FcosdoProcess is a no-op and the result
+    # string carries a fixed set of detections, so only the Python side is timed
+    detections = [{"bbox": [10.0 * k, 20.0, 10.0 * k + 50, 200.0], "score": 0.9, "id": 0, "name": "person"}
+                  for k in range(5)]
+    result_bytes = ("post_process_result: " + json.dumps(detections)).encode("utf-8")
+    real_lib, real_get = fcos_lib.libpostprocess, fcos_lib.get_Postprocess_result
+    fcos_lib.libpostprocess = types.SimpleNamespace(FcosdoProcess=lambda *args: None)
+    fcos_lib.get_Postprocess_result = lambda info: result_bytes
+    try:
+        c_backend = fcos_lib.FcosPostProcessor(model_outputs, backend="c")
+        results = {"fcos/c_stubbed/process": measure(lambda: c_backend.process(outputs), iterations)}
+    finally:
+        fcos_lib.libpostprocess, fcos_lib.get_Postprocess_result = real_lib, real_get
+
+    numpy_backend = fcos_lib.FcosPostProcessor(model_outputs, backend="numpy")
+    results["fcos/numpy/process"] = measure(lambda: numpy_backend.process(outputs), iterations)
+    return results
+
+
+def install_ros_stand_ins():
+    """Registers minimal rclpy / message modules so main.TeaTimeNode runs without a ROS graph."""
+    class Logger:
+        def _log(self, message):
+            pass
+        info = debug = warn = warning = error = _log
+
+    class Node:
+        def __init__(self, name):
+            self._logger = Logger()
+
+        def get_logger(self):
+            return self._logger
+
+        def create_subscription(self, msg_type, topic, callback, qos, callback_group=None):
+            return types.SimpleNamespace(topic=topic, callback=callback)
+
+        def create_timer(self, period, callback, callback_group=None):
+            return types.SimpleNamespace(period=period, callback=callback)
+
+        def destroy_subscription(self, subscription):
+            pass
+
+        def destroy_timer(self, timer):
+            pass
+
+        def destroy_node(self):
+            pass
+
+    rclpy = types.ModuleType("rclpy")
+    rclpy.init = rclpy.shutdown = lambda *args, **kwargs: None
+    modules = {
+        "rclpy": rclpy,
+        "rclpy.node": types.ModuleType("rclpy.node"),
+        "rclpy.callback_groups": types.ModuleType("rclpy.callback_groups"),
+        "rclpy.executors": types.ModuleType("rclpy.executors"),
+        "sensor_msgs": types.ModuleType("sensor_msgs"),
+        "sensor_msgs.msg": types.ModuleType("sensor_msgs.msg"),
+        "ai_msgs": types.ModuleType("ai_msgs"),
+        "ai_msgs.msg": types.ModuleType("ai_msgs.msg"),
+    }
+    modules["rclpy.node"].Node = Node
+    modules["rclpy.callback_groups"].MutuallyExclusiveCallbackGroup = object
+    modules["rclpy.executors"].MultiThreadedExecutor = object
+    modules["sensor_msgs.msg"].CompressedImage = object
+    modules["ai_msgs.msg"].PerceptionTargets = object
+    sys.modules.update(modules)
+
+
+def fake_stamp(ns):
+    return types.SimpleNamespace(sec=ns // 1_000_000_000, nanosec=ns % 1_000_000_000)
+
+
+def fake_perception_targets(stamp_ns, boxes):
+    targets = []
+    for (x1, y1, x2, y2) in boxes:
+        rect = types.SimpleNamespace(x_offset=x1, y_offset=y1, width=x2 - x1, height=y2 - y1)
+        roi = types.SimpleNamespace(type="body", rect=rect)
+        targets.append(types.SimpleNamespace(type="person", rois=[roi]))
+    return types.SimpleNamespace(header=types.SimpleNamespace(stamp=fake_stamp(stamp_ns)), targets=targets)
+
+
+def make_node(cameras=(), camera_workers=0):
+    """A TeaTimeNode on ROS stand-ins that never leaves the process."""
+    install_ros_stand_ins()
+    import config
+    config.HEADLESS = True
+    config.DEBUG_STREAM_ENABLED = False
+    config.METRICS_SERVER_ENABLED = False
+    config.ALERT_SPOOL_PATH = None
+    config.RUNTIME_CONFIG_PATH = None
+    config.TIME_WINDOWS = [(0, 0, 23, 59)]
+    config.WEEKLY_TIME_WINDOWS = {}
+    config.CAMERAS = list(cameras)
+    config.CAMERA_WORKERS = camera_workers
+    import main
+
+    node = main.TeaTimeNode()
+    node.send_alert = lambda *args, **kwargs: None
+    return node
+
+
+def fake_image(stamp_ns, jpeg):
+    return types.SimpleNamespace(data=jpeg, header=types.SimpleNamespace(stamp=fake_stamp(stamp_ns)))
+
+
+def bench_detection_callback(iterations):
+    import config
+    # Inline processing so each call measures the full detection path
+    node = make_node()
+    camera = node.camera
+    results = {}
+    # Stamps keep increasing across cases so every frame is buffered and matched
+    clock = [1_000_000_000]
+    try:
+        for frame_w, frame_h, count in ((640, 480, 1), (1920, 1080, 1), (1920, 1080, 5)):
+            # Grey frames: no alerts, so the cooldown never suspends the node
+            frame = np.full((frame_h, frame_w, 3), 128, dtype=np.uint8)
+            jpeg = cv2.imencode(".jpg", frame)[1].tobytes()
+            boxes = person_boxes(frame_w, frame_h, count, frame_w // 8, frame_h // 2)
+
+            def one_message():
+                clock[0] += 33_000_000
+                node.frame_callback(camera, fake_image(clock[0], jpeg))
+                node.detection_callback(camera, fake_perception_targets(clock[0], boxes))
+
+            # Steady state with cached per-track verdicts, then with a color check every message
+            results[f"detection_callback/{frame_w}x{frame_h}/{count}_persons"] = measure(one_message, iterations)
+            camera.tracker.recheck_frames = 1
+            results[f"detection_callback/{frame_w}x{frame_h}/{count}_persons_uncached"] = measure(one_message, iterations)
+            camera.tracker.recheck_frames = config.TRACK_RECHECK_FRAMES
+    finally:
+        node.destroy_node()
+    return results
+
+
+def bench_multi_camera(iterations):
+    """
+    One synthetic publisher per camera feeding a single node; measures the
+    time for every camera's message to be processed by the shared worker pool.
+    """
+    import config
+    results = {}
+    frame = np.full((1080, 1920, 3), 128, dtype=np.uint8)
+    jpeg = cv2.imencode(".jpg", frame)[1].tobytes()
+    boxes = person_boxes(1920, 1080, 2, 240, 540)
+    for count in (1, 3):
+        cameras = [
+            {"name": f"cam{i}", "image_topic": f"/cam{i}/image", "detection_topic": f"/cam{i}/detections"}
+            for i in range(count)
+        ]
+        node = make_node(cameras, camera_workers=config.CAMERA_WORKERS or 2)
+        for camera in node.cameras:
+            camera.tracker.recheck_frames = 1  # A color check on every message
+        clock = [1_000_000_000]
+        done = {camera.name: 0 for camera in node.cameras}
+
+        def one_round():
+            clock[0] += 33_000_000
+            for camera in node.cameras:
+                node.frame_callback(camera, fake_image(clock[0], jpeg))
+                node.detection_callback(camera, fake_perception_targets(clock[0], boxes))
+            # Wait until every camera has handled (or superseded) this round
+            while any(camera.detection_stats.calls + camera.detections_dropped < done[camera.name] + 1
+                      for camera in node.cameras):
+                time.sleep(0.0002)
+            for camera in node.cameras:
+                done[camera.name] += 1
+
+        try:
+            results[f"multi_camera/{count}_cameras/1920x1080"] = measure(one_round, iterations)
+        finally:
+            node.destroy_node()
+    return results
+
+
+def synthetic_crops(seed=0):
+    """
+    Upper-body-sized crops whose uniform coverage sweeps across the default
+    threshold, laid out as smooth blobs (neighbouring pixels correlated, as
+    in real clothing) over a grey background.
+    """
+    rng = np.random.default_rng(seed)
+    for width, height in ((240, 600), (480, 1000), (720, 1080)):
+        noise = cv2.GaussianBlur(rng.random((height, width), dtype=np.float32), (0, 0), width / 20)
+        for coverage in (0.05, 0.15, 0.22, 0.24, 0.25, 0.26, 0.28, 0.35, 0.6):
+            crop = rng.integers(90, 140, (height, width, 3), dtype=np.uint8)
+            # Only rows 10-60% form the upper body, so place the coverage there
+            body = noise[int(height * 0.1):int(height * 0.6)]
+            cut = np.quantile(body, 1.0 - coverage)
+            crop[noise >= cut] = (180, 40, 170)
+            yield f"synthetic/{width}x{height}/{coverage:.0%}", crop
+
+
+def verify_estimation(crops_dir=None):
+    """
+    Checks that budgeted estimation gives the same verdict as counting every
+    pixel, on recorded person crops (*.jpg / *.png in crops_dir, one person
+    filling each image) or on synthetic crops. Returns the number of mismatches.
+    """
+    import config
+    from detector import TeaDetector
+    exact = TeaDetector()
+    estimator = TeaDetector(pixel_budget=config.COLOR_PIXEL_BUDGET, confidence_z=config.COLOR_CONFIDENCE_Z)
+    if crops_dir:
+        names = sorted(n for n in os.listdir(crops_dir) if n.lower().endswith((".jpg", ".jpeg", ".png")))
+        crops = ((name, cv2.imread(os.path.join(crops_dir, name))) for name in names)
+    else:
+        crops = synthetic_crops()
+
+    mismatches = checked = 0
+    for name, crop in crops:
+        if crop is None:
+            print(f"[WARN] Could not read {name}")
+            continue
+        bbox = (0, 0, crop.shape[1], crop.shape[0])
+        (expected, exact_pct, _), = exact.check_uniform_colors(crop, [bbox], with_mask=False)[0]
+        detected, pct, _, margin = estimator.estimate_uniform_color(crop, bbox)
+        checked += 1
+        status = "ok" if detected == expected else "MISMATCH"
+        mismatches += detected != expected
+        how = f"estimate {pct:6.2f}% +/- {margin:.2f}" if margin else f"exact    {pct:6.2f}%"
+        print(f"[VERIFY] {name:32s} exact {exact_pct:6.2f}%  {how}  {status}")
+    print(f"[VERIFY] {checked} crops, {mismatches} mismatches; estimated {estimator.estimates}, "
+          f"exact fallbacks {estimator.exact_fallbacks}")
+    return mismatches
+
+
+SUITES = {
+    "uniform_color": bench_uniform_color,
+    "preprocess": bench_preprocess,
+    "fcos": bench_fcos,
+    "detection_callback": bench_detection_callback,
+    "multi_camera": bench_multi_camera,
+}
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of (case, baseline_ms, current_ms) for cases slower than allowed."""
+    regressions = []
+    for case, current in results.items():
+        reference = baseline.get(case)
+        if reference is None:
+            continue
+        if current["p50_ms"] > reference["p50_ms"] * (1 + tolerance):
+            regressions.append((case, reference["p50_ms"], current["p50_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES), help="Run only these suites")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed median slowdown (0.25 = 25%%)")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true",
+                        help="Fail when the baseline is missing or lacks a case instead of skipping the comparison")
+    parser.add_argument("--verify-estimation", nargs="?", const="", metavar="DIR",
+                        help="Compare budgeted and exact color verdicts on the crops in DIR (default: synthetic) and exit")
+    args = parser.parse_args(argv)
+
+    if args.verify_estimation is not None:
+        return 1 if verify_estimation(args.verify_estimation or None) else 0
+
+    results = {}
+    for name in args.suite or SUITES:
+        print(f"[BENCH] Running {name}...")
+        results.update(SUITES[name](args.iterations))
+
+    for case, stats in results.items():
+        print(f"[BENCH] {case:50s} p50 {stats['p50_ms']:8.3f} ms   p95 {stats['p95_ms']:8.3f} ms")
+
+    report = {
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        level = "ERROR" if args.check else "WARN"
+        print(f"[{level}] No baseline at {args.baseline}; run with --update-baseline on the target board.")
+        return 1 if args.check else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != report["machine"]:
+        print(f"[WARN] Baseline was recorded on {baseline.get('machine')}, this is {report['machine']}.")
+    uncovered = sorted(set(results) - set(baseline["results"]))
+    for case in uncovered:
+        print(f"[{'ERROR' if args.check else 'WARN'}] {case} has no baseline; run with --update-baseline.")
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for case, before, after in regressions:
+        print(f"[REGRESSION] {case}: {before:.3f} ms -> {after:.3f} ms")
+    if regressions or (args.check and uncovered):
+        return 1
+    print("[BENCH] No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Offline HSV threshold sweep for a uniform profile.
+
+Every labelled person crop is reduced once to a 3D HSV histogram of its
+upper body (the region the node checks) and then to a cumulative-sum
+table, so the matching pixel count for any HSV range is 8 table lookups.
+Thousands of candidate ranges and percentage thresholds are scored
+against all crops with a few vectorized gathers. The best candidate is
+then re-checked exactly with the node's own color lookup table.
+
+    python calibrate.py DIR                     # DIR/positive/*.jpg, DIR/negative/*.jpg
+    python calibrate.py DIR --min-precision 0.98 --write runtime_config.json
+    python calibrate.py                         # synthetic crops (smoke test)
+
+Crops are whole-person images, one person filling each (as in
+benchmark.py --verify-estimation). Positives wear the uniform being
+calibrated; negatives are everyone and everything else. Candidate ranges
+sweep the hue range and the lower saturation and value bounds (upper
+saturation and value stay at 255), at the resolution of the histogram bins.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import config
+from color_lut import ColorClassifier
+from detector import TeaDetector
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# Candidates scored per step; bounds the (crops x candidates) temporaries
+CHUNK_CANDIDATES = 4096
+
+
+def load_crops(crops_dir):
+    """Yields (name, BGR crop, is_positive) from crops_dir/positive and crops_dir/negative."""
+    for label in ("positive", "negative"):
+        folder = os.path.join(crops_dir, label)
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(f"Missing {folder}: crops go in {crops_dir}/positive and {crops_dir}/negative")
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield f"{label}/{name}", cv2.imread(os.path.join(folder, name)), label == "positive"
+
+
+def synthetic_crops(seed=0):
+    """
+    Labelled crops for trying the tool without footage: purple uniforms
+    under varying light as positives; grey, blue and pink shirts and small
+    purple accessories as negatives.
+    """
+    rng = np.random.default_rng(seed)
+    cases = []
+    for _ in range(40):
+        cases.append((True, (int(rng.integers(138, 160)), int(rng.integers(110, 230)), int(rng.integers(90, 240))),
+                      float(rng.uniform(0.35, 0.7))))
+    for hue in (0, 110, 120, 170, 175):
+        for _ in range(8):
+            cases.append((False, (hue, int(rng.integers(60, 220)), int(rng.integers(60, 230))),
+                          float(rng.uniform(0.35, 0.7))))
+    for _ in range(20):
+        cases.append((False, (int(rng.integers(140, 158)), 200, 180), float(rng.uniform(0.02, 0.12))))
+    for i, (positive, hsv, coverage) in enumerate(cases):
+        width, height = int(rng.integers(120, 320)), int(rng.integers(300, 700))
+        crop = rng.integers(70, 150, (height, width, 3), dtype=np.uint8)
+        noise = cv2.GaussianBlur(rng.random((height, width), dtype=np.float32), (0, 0), width / 15)
+        body = noise[int(height * 0.1):int(height * 0.6)]
+        cloth = noise >= np.quantile(body, 1.0 - coverage)
+        color = cv2.cvtColor(np.uint8([[hsv]]), cv2.COLOR_HSV2BGR)[0, 0].astype(np.int16)
+        # Shading and sensor noise around the nominal color
+        shaded = color + rng.normal(0, 8, (int(cloth.sum()), 3))
+        crop[cloth] = np.clip(shaded, 0, 255).astype(np.uint8)
+        yield f"synthetic/{'positive' if positive else 'negative'}/{i:03d}", crop, positive
+
+
+class HistogramSet:
+    """
+    Cumulative 3D HSV histograms of many crops, flattened into one
+    (crops x cells) int32 array; cell (h, s, v) holds the number of pixels
+    with hue bin < h, saturation bin < s and value bin < v.
+    """
+    def __init__(self, hue_bins=90, sat_bins=32, val_bins=32):
+        for name, bins, span in (("hue", hue_bins, 180), ("saturation", sat_bins, 256), ("value", val_bins, 256)):
+            if span % bins:
+                raise ValueError(f"{name} bins must divide {span}, got {bins}")
+        self.bins = (hue_bins, sat_bins, val_bins)
+        self.widths = (180 // hue_bins, 256 // sat_bins, 256 // val_bins)
+        self.names = []
+        self.labels = []
+        self.totals = []
+        self._tables = []
+
+    def add(self, name, upper_body, positive):
+        hsv = cv2.cvtColor(upper_body, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1, 2], None, list(self.bins), [0, 180, 0, 256, 0, 256])
+        table = np.zeros(tuple(b + 1 for b in self.bins), dtype=np.int32)
+        table[1:, 1:, 1:] = hist.astype(np.int32).cumsum(0).cumsum(1).cumsum(2)
+        self._tables.append(table.reshape(-1))
+        self.names.append(name)
+        self.labels.append(positive)
+        self.totals.append(upper_body.shape[0] * upper_body.shape[1])
+
+    def freeze(self):
+        self.tables = np.stack(self._tables)
+        self.labels = np.array(self.labels, dtype=bool)
+        self.totals = np.array(self.totals, dtype=np.float64)
+        del self._tables
+        return self
+
+    def _index(self, h, s, v):
+        _, sat_bins, val_bins = self.bins
+        return (h * (sat_bins + 1) + s) * (val_bins + 1) + v
+
+    def counts(self, h0, h1, s0, s1, v0, v1):
+        """
+        Pixels of every crop inside the bin box [h0, h1) x [s0, s1) x [v0, v1),
+        for arrays of boxes: returns (crops x boxes).
+        """
+        t = self.tables
+        i = self._index
+        return (t[:, i(h1, s1, v1)] - t[:, i(h0, s1, v1)] - t[:, i(h1, s0, v1)] - t[:, i(h1, s1, v0)]
+                + t[:, i(h0, s0, v1)] + t[:, i(h0, s1, v0)] + t[:, i(h1, s0, v0)] - t[:, i(h0, s0, v0)])
+
+
+def candidate_grid(hist, hue_step=1, sat_step=1, val_step=1, min_hue_bins=1, wrap=False):
+    """
+    Bin-index bounds of every candidate range: (h0, h1, s0, v0) arrays, hue
+    bins [h0, h1) (wrapping through red when h0 >= h1), saturation and value
+    from s0 / v0 up to the top bin.
+    """
+    hue_bins, sat_bins, val_bins = hist.bins
+    hues = [(h0, h1) for h0 in range(0, hue_bins, hue_step) for h1 in range(h0 + min_hue_bins, hue_bins + 1, hue_step)]
+    if wrap:
+        hues += [(h0, h1) for h0 in range(0, hue_bins, hue_step) for h1 in range(1, h0 + 1, hue_step)
+                 if hue_bins - h0 + h1 >= min_hue_bins]
+    hues = np.array(hues, dtype=np.int64)
+    sats = np.arange(0, sat_bins, sat_step)
+    vals = np.arange(0, val_bins, val_step)
+    h, s, v = np.meshgrid(np.arange(len(hues)), sats, vals, indexing="ij")
+    h, s, v = h.reshape(-1), s.reshape(-1), v.reshape(-1)
+    return hues[h, 0], hues[h, 1], s, v
+
+
+def sweep(hist, grid, thresholds):
+    """
+    Scores every candidate range at every percentage threshold.
+    Returns (precision, recall, margin) arrays of shape (candidates x
+    thresholds); margin is the distance in percentage points from the
+    threshold to the closest crop, i.e. how far any verdict is from flipping.
+    """
+    hue_bins, sat_bins, val_bins = hist.bins
+    h0s, h1s, s0s, v0s = grid
+    thresholds = np.asarray(thresholds, dtype=np.float32)
+    scale = (100.0 / hist.totals)[:, None]
+    positives = hist.labels
+    tp = np.empty((len(h0s), len(thresholds)), dtype=np.int64)
+    fp = np.empty_like(tp)
+    margin = np.empty(tp.shape, dtype=np.float64)
+    for start in range(0, len(h0s), CHUNK_CANDIDATES):
+        sl = slice(start, start + CHUNK_CANDIDATES)
+        h0, h1, s0, v0 = h0s[sl], h1s[sl], s0s[sl], v0s[sl]
+        wraps = h0 >= h1
+        top = np.where(wraps, hue_bins, h1)
+        counts = hist.counts(h0, top, s0, sat_bins, v0, val_bins)
+        if wraps.any():
+            # The part of a wrapping range from hue 0 up to h1
+            counts += np.where(wraps, hist.counts(np.zeros_like(h1), h1, s0, sat_bins, v0, val_bins), 0)
+        percentage = (counts * scale).astype(np.float32)
+        distance = percentage[:, :, None] - thresholds  # crops x candidates x thresholds
+        detected = distance >= 0
+        tp[sl] = detected[positives].sum(axis=0)
+        fp[sl] = detected[~positives].sum(axis=0)
+        margin[sl] = np.abs(distance, out=distance).min(axis=0)
+    positive_count = max(int(positives.sum()), 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 1.0)
+    recall = tp / positive_count
+    return precision, recall, margin
+
+
+def bounds(hist, h0, h1, s0, v0):
+    """Inclusive HSV lower/upper bounds (config.py format) of a candidate's bins."""
+    hue_w, sat_w, val_w = hist.widths
+    lower = (int(h0) * hue_w, int(s0) * sat_w, int(v0) * val_w)
+    upper = (int(h1) * hue_w - 1, 255, 255)
+    return lower, upper
+
+
+def f1_score(precision, recall):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nan_to_num(2 * precision * recall / (precision + recall))
+
+
+def ranking(precision, recall, margin, min_precision=None):
+    """
+    Flat (candidate, threshold) indices, best first: by recall among those
+    with precision >= min_precision, or by F1 when no minimum is given (or
+    none reaches it). Ties go to the higher precision, then to the larger
+    margin, which favours ranges that sit clear of every crop.
+    """
+    precision, recall, margin = precision.reshape(-1), recall.reshape(-1), margin.reshape(-1)
+    primary = f1_score(precision, recall)
+    if min_precision is not None:
+        ok = precision >= min_precision
+        if ok.any():
+            primary = np.where(ok, recall, -1.0)
+        else:
+            print(f"[WARN] No candidate reaches precision {min_precision}; ranking by F1 instead")
+    # np.lexsort sorts by the last key first, ascending
+    return np.lexsort((-margin, -precision, -primary))
+
+
+def exact_scores(crops, lower, upper, threshold):
+    """Precision and recall of one profile checked exactly by the node's color engine."""
+    checker = TeaDetector(classifier=ColorClassifier(
+        {"candidate": {"lower": lower, "upper": upper, "threshold": threshold}}, bits=config.COLOR_LUT_BITS))
+    tp = fp = positives = 0
+    for _, crop, positive in crops:
+        (detected, _, _), = checker.check_uniform_colors(crop, [(0, 0, crop.shape[1], crop.shape[0])],
+                                                         with_mask=False)[0]
+        positives += positive
+        tp += detected and positive
+        fp += detected and not positive
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    return precision, tp / max(positives, 1)
+
+
+def write_csv(path, hist, grid, thresholds, precision, recall, margin):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["lower_h", "lower_s", "lower_v", "upper_h", "upper_s", "upper_v",
+                         "threshold", "precision", "recall", "margin"])
+        for c, (h0, h1, s0, v0) in enumerate(zip(*grid)):
+            lower, upper = bounds(hist, h0, h1, s0, v0)
+            for t, threshold in enumerate(thresholds):
+                writer.writerow([*lower, *upper, threshold, f"{precision[c, t]:.4f}", f"{recall[c, t]:.4f}",
+                                 f"{margin[c, t]:.2f}"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("crops_dir", nargs="?", help="Directory with positive/ and negative/ crops (default: synthetic)")
+    parser.add_argument("--profile", default=next(iter(config.UNIFORM_PROFILES)),
+                        help="Profile name to calibrate and report against (default: the first in config.py)")
+    parser.add_argument("--thresholds", default="10,15,20,22.5,25,27.5,30,35,40",
+                        help="Comma-separated percentage thresholds to try")
+    parser.add_argument("--hue-bins", type=int, default=90)
+    parser.add_argument("--sat-bins", type=int, default=32)
+    parser.add_argument("--val-bins", type=int, default=32)
+    parser.add_argument("--hue-step", type=int, default=1, help="Candidate hue bounds every N bins")
+    parser.add_argument("--sat-step", type=int, default=2, help="Candidate lower saturation every N bins")
+    parser.add_argument("--val-step", type=int, default=2, help="Candidate lower value every N bins")
+    parser.add_argument("--min-hue-bins", type=int, default=3, help="Narrowest hue range to try, in bins")
+    parser.add_argument("--wrap", action="store_true", help="Also try hue ranges wrapping through red")
+    parser.add_argument("--min-precision", type=float,
+                        help="Pick the highest recall at this precision or better (default: best F1)")
+    parser.add_argument("--top", type=int, default=10, help="Candidates to print")
+    parser.add_argument("--csv", help="Write precision/recall of every candidate to this CSV file")
+    parser.add_argument("--write", metavar="PATH",
+                        help="Write the best profile as a runtime config override (e.g. runtime_config.json)")
+    args = parser.parse_args(argv)
+
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    hist = HistogramSet(args.hue_bins, args.sat_bins, args.val_bins)
+    crops = []
+    started = time.perf_counter()
+    source = load_crops(args.crops_dir) if args.crops_dir else synthetic_crops()
+    for name, crop, positive in source:
+        if crop is None:
+            print(f"[WARN] Could not read {name}")
+            continue
+        roi = TeaDetector.upper_body_roi(crop.shape, (0, 0, crop.shape[1], crop.shape[0]))
+        if roi is None:
+            print(f"[WARN] {name} is too small")
+            continue
+        y0, y1, x0, x1 = roi
+        hist.add(name, crop[y0:y1, x0:x1], positive)
+        crops.append((name, crop, positive))
+    hist.freeze()
+    positives = int(hist.labels.sum())
+    if not positives or positives == len(crops):
+        print("[ERROR] Need both positive and negative crops")
+        return 1
+    print(f"[CALIBRATE] {len(crops)} crops ({positives} positive) histogrammed in "
+          f"{time.perf_counter() - started:.2f} s")
+
+    started = time.perf_counter()
+    grid = candidate_grid(hist, args.hue_step, args.sat_step, args.val_step, args.min_hue_bins, args.wrap)
+    precision, recall, margin = sweep(hist, grid, thresholds)
+    print(f"[CALIBRATE] {len(grid[0])} ranges x {len(thresholds)} thresholds scored in "
+          f"{time.perf_counter() - started:.2f} s")
+    if args.csv:
+        write_csv(args.csv, hist, grid, thresholds, precision, recall, margin)
+        print(f"[CALIBRATE] Wrote {args.csv}")
+
+    order = ranking(precision, recall, margin, args.min_precision)
+    print(f"[CALIBRATE] Top {args.top}:")
+    for flat in order[:args.top]:
+        c, t = divmod(int(flat), len(thresholds))
+        lower, upper = bounds(hist, *(g[c] for g in grid))
+        print(f"[CALIBRATE]   lower {lower}  upper {upper}  threshold {thresholds[t]:5.1f}%  "
+              f"precision {precision[c, t]:.3f}  recall {recall[c, t]:.3f}  margin {margin[c, t]:5.2f}")
+
+    current = config.UNIFORM_PROFILES.get(args.profile)
+    if current is not None:
+        threshold = current.get("threshold", config.UNIFORM_PIXEL_PERCENTAGE_THRESHOLD)
+        p, r = exact_scores(crops, current["lower"], current["upper"], threshold)
+        print(f"[CALIBRATE] Current {args.profile}: lower {tuple(current['lower'])}  upper {tuple(current['upper'])}  "
+              f"threshold {threshold}%  precision {p:.3f}  recall {r:.3f}")
+
+    c, t = divmod(int(order[0]), len(thresholds))
+    lower, upper = bounds(hist, *(g[c] for g in grid))
+    p, r = exact_scores(crops, lower, upper, thresholds[t])
+    print(f"[BEST] lower {lower}  upper {upper}  threshold {thresholds[t]}%  precision {p:.3f}  recall {r:.3f} "
+          f"(histogram estimate {precision[c, t]:.3f} / {recall[c, t]:.3f})")
+    profile = {"lower": list(lower), "upper": list(upper), "threshold": thresholds[t]}
+    print(f"[BEST] {json.dumps({args.profile: profile})}")
+    if args.write:
+        # Keep the other overrides and profiles already in force
+        overrides = {}
+        if os.path.exists(args.write):
+            with open(args.write, encoding="utf-8") as f:
+                overrides = json.load(f)
+        profiles = dict(overrides.get("UNIFORM_PROFILES", config.UNIFORM_PROFILES))
+        profiles[args.profile] = profile
+        overrides["UNIFORM_PROFILES"] = profiles
+        with open(args.write + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(overrides, f, indent=2)
+        # Atomic, so the node's watcher never reads a half-written file
+        os.replace(args.write + ".tmp", args.write)
+        print(f"[BEST] Wrote {args.write}; a running node picks it up within RUNTIME_CONFIG_POLL_SECONDS")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
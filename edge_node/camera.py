@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+import config
+from frame_buffer import FrameStore
+from metrics import CallbackStats
+from runtime_config import RuntimeConfig
+from schedule import Schedule
+from tracker import Tracker
+
+
+def camera_configs():
+    """
+    The cameras to serve: config.CAMERAS, or a single "default" camera on
+    ROS_IMAGE_TOPIC / ROS_DETECTION_TOPIC when it is empty.
+    """
+    cameras = config.CAMERAS or [{
+        "name": "default",
+        "image_topic": config.ROS_IMAGE_TOPIC,
+        "detection_topic": config.ROS_DETECTION_TOPIC,
+    }]
+    names = [camera["name"] for camera in cameras]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate camera names in CAMERAS: {duplicates}")
+    return cameras
+
+
+class Camera:
+    """
+    Everything one camera needs on its own: topics, frame buffer, tracker,
+    schedule, cooldown, subscriptions and statistics. The color engine and
+    the alert dispatcher are shared between cameras.
+
+    Schedule, cooldown and tracker parameters come from a RuntimeConfig
+    snapshot, with the camera's own overrides on top, and follow reloads
+    through apply().
+    """
+    def __init__(self, name, image_topic, detection_topic, time_windows=None, weekly_time_windows=None,
+                 timezone=None, cooldown_seconds=None, runtime=None):
+        self.name = name
+        self.image_topic = image_topic
+        self.detection_topic = detection_topic
+        self.time_windows = time_windows
+        self.weekly_time_windows = weekly_time_windows
+        self.timezone = timezone
+        self.cooldown_override = cooldown_seconds
+        runtime = runtime or RuntimeConfig()
+
+        # Recent frames are kept compressed, keyed by header stamp, and only
+        # decoded when a detection needs pixels
+        max_skew_ns = None
+        if config.FRAME_MATCH_MAX_SKEW_MS is not None:
+            max_skew_ns = int(config.FRAME_MATCH_MAX_SKEW_MS * 1_000_000)
+        self.frames = FrameStore(
+            capacity=config.FRAME_BUFFER_SIZE,
+            max_skew_ns=max_skew_ns,
+            decode_scale=config.FRAME_DECODE_SCALE)
+
+        # Per-person cached color verdicts and K-of-N alert voting
+        self.tracker = Tracker(**runtime.tracking)
+        self.apply(runtime)
+
+        self.last_alert_time = 0
+        self.active = None  # Unknown until the first gate update
+        self.image_subscription = None
+        self.detection_subscription = None
+        self.gate_timer = None
+        self.gate_lock = threading.Lock()
+
+        self.frame_stats = CallbackStats(f"{name}/frame_callback")
+        self.detection_stats = CallbackStats(f"{name}/detection")
+        self.detections_processed = 0
+        self.detections_dropped = 0  # Superseded by a newer message before a worker got to them
+        self.detection_errors = 0  # Messages whose handling raised
+        self.alerts_raised = 0
+
+    @classmethod
+    def from_config(cls, entry, runtime=None):
+        return cls(
+            entry["name"], entry["image_topic"], entry["detection_topic"],
+            time_windows=entry.get("time_windows"),
+            weekly_time_windows=entry.get("weekly_time_windows"),
+            timezone=entry.get("timezone"),
+            cooldown_seconds=entry.get("cooldown_seconds"),
+            runtime=runtime)
+
+    def apply(self, runtime):
+        """
+        Switches to the schedule, cooldown and tracker parameters of a
+        RuntimeConfig snapshot. Each is replaced by a single reference or
+        value swap, so callbacks in flight see either the old or the new one.
+        """
+        if self.time_windows is None and self.weekly_time_windows is None and self.timezone is None:
+            self.schedule = runtime.schedule
+        else:
+            self.schedule = Schedule(
+                runtime.values["TIME_WINDOWS"] if self.time_windows is None else self.time_windows,
+                runtime.values["WEEKLY_TIME_WINDOWS"] if self.weekly_time_windows is None
+                else self.weekly_time_windows,
+                self.timezone or runtime.values["TIMEZONE"])
+        self.cooldown_seconds = runtime.cooldown_seconds if self.cooldown_override is None else self.cooldown_override
+        self.tracker.configure(**runtime.tracking)
+        self.runtime = runtime
+
+    def cooldown_remaining(self, now=None):
+        now = time.time() if now is None else now
+        return max(0.0, self.last_alert_time + self.cooldown_seconds - now)
+
+
+class FairScheduler:
+    """
+    Spreads detection work for several cameras over a pool of worker threads.
+
+    Each camera holds at most one pending message (a newer one replaces it
+    and counts as dropped) and is handled by at most one worker at a time,
+    so its state needs no extra locking. Cameras are served in the order
+    their work arrived, so a busy camera cannot starve a quiet one.
+    With workers=0, work runs inline on the calling thread.
+    A handler that raises is logged with its traceback on `logger`.
+    """
+    def __init__(self, handler, workers=2, logger=None):
+        self.handler = handler
+        self.workers = workers
+        self.logger = logger or logging.getLogger("teatime")
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()  # camera -> newest message, oldest camera first
+        self._busy = set()
+        self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"camera-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, camera, item):
+        if not self._threads:
+            self.handler(camera, item)
+            return
+        with self._cond:
+            if camera in self._pending:
+                camera.detections_dropped += 1
+            else:
+                self._cond.notify()
+            # Replacing keeps the camera's place in line
+            self._pending[camera] = item
+
+    def _next(self):
+        for camera in self._pending:
+            if camera not in self._busy:
+                return camera
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                camera = self._next()
+                while camera is None and not self._stopped:
+                    self._cond.wait()
+                    camera = self._next()
+                if self._stopped:
+                    return
+                item = self._pending.pop(camera)
+                self._busy.add(camera)
+            try:
+                self.handler(camera, item)
+            except Exception as e:
+                # Keep the worker alive for the other cameras. The ROS logger
+                # takes no exc_info, so the traceback goes into the message
+                camera.detection_errors += 1
+                self.logger.error(f"[ERROR] [{camera.name}] Detection handler failed: {e!r}\n{traceback.format_exc()}")
+            finally:
+                with self._cond:
+                    self._busy.discard(camera)
+                    # This camera may have queued more work meanwhile
+                    self._cond.notify()
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
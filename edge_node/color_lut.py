@@ -0,0 +1,99 @@
+import cv2
+import numpy as np
+import config
+
+MAX_PROFILES = 8  # One bit per profile in a uint8 table entry
+# Pixels classified per step; keeps the float/index temporaries cache-resident
+CHUNK_PIXELS = 32768
+
+
+class ColorClassifier:
+    """
+    Classifies BGR pixels against several HSV uniform profiles at once.
+
+    A quantized BGR -> profile-bits lookup table is computed once from the
+    HSV ranges, so classifying an image is a single table gather instead of
+    a cvtColor + inRange per profile. Bit i of each table entry is set when
+    the (quantized) color falls inside profile i.
+    """
+    def __init__(self, profiles, bits=6, default_threshold=None):
+        if not profiles:
+            raise ValueError("At least one uniform profile is required")
+        if len(profiles) > MAX_PROFILES:
+            raise ValueError(f"At most {MAX_PROFILES} uniform profiles are supported, got {len(profiles)}")
+        if not 1 <= bits <= 8:
+            raise ValueError(f"bits must be between 1 and 8, got {bits}")
+
+        self.bits = bits
+        self.shift = 8 - bits
+        self.names = list(profiles)
+        if default_threshold is None:
+            default_threshold = config.UNIFORM_PIXEL_PERCENTAGE_THRESHOLD
+        self.thresholds = {
+            name: float(spec.get("threshold", default_threshold))
+            for name, spec in profiles.items()
+        }
+        self.lut = self._build_lut(profiles)
+
+        # Table index = (b >> shift) << 2*bits | (g >> shift) << bits | (r >> shift).
+        # Masking off the low bits first makes this an exact weighted sum,
+        # which cv2.transform computes in one vectorized pass.
+        self._keep_bits = np.uint8((0xFF << self.shift) & 0xFF)
+        self._index_weights = np.array(
+            [[(1 << (2 * bits)) / (1 << self.shift), (1 << bits) / (1 << self.shift), 1 / (1 << self.shift)]],
+            dtype=np.float32)
+
+    def _build_lut(self, profiles):
+        levels = 1 << self.bits
+        # Classify the center of each quantization cell
+        centers = (np.arange(levels, dtype=np.uint16) << self.shift) + ((1 << self.shift) >> 1)
+        b, g, r = np.meshgrid(centers, centers, centers, indexing="ij")
+        cube = np.stack([b, g, r], axis=-1).astype(np.uint8).reshape(-1, 1, 3)
+        hsv = cv2.cvtColor(cube, cv2.COLOR_BGR2HSV)
+
+        lut = np.zeros(levels ** 3, dtype=np.uint8)
+        for i, name in enumerate(self.names):
+            lower = np.array(profiles[name]["lower"], dtype="uint8")
+            upper = np.array(profiles[name]["upper"], dtype="uint8")
+            if lower[0] <= upper[0]:
+                mask = cv2.inRange(hsv, lower, upper)
+            else:
+                # Hue range wraps around 179 -> 0 (reds)
+                mask = cv2.inRange(hsv, lower, np.array([179, upper[1], upper[2]], dtype="uint8"))
+                mask |= cv2.inRange(hsv, np.array([0, lower[1], lower[2]], dtype="uint8"), upper)
+            lut[mask.reshape(-1) > 0] |= 1 << i
+        return lut
+
+    def bit(self, name):
+        return 1 << self.names.index(name)
+
+    def classify(self, bgr, out=None):
+        """Returns a uint8 image of packed profile bits for a BGR image (written to `out` if given)."""
+        rows, cols = bgr.shape[:2]
+        if out is None:
+            out = np.empty((rows, cols), dtype=np.uint8)
+        step = max(1, CHUNK_PIXELS // max(1, cols))
+        for y in range(0, rows, step):
+            q = (bgr[y:y + step] & self._keep_bits).astype(np.float32)
+            idx = cv2.transform(q, self._index_weights).astype(np.int32)
+            np.take(self.lut, idx.reshape(q.shape[:2]), out=out[y:y + step])
+        return out
+
+    def mask(self, codes, name=None):
+        """Returns a 0/255 mask of pixels in profile `name` (or in any profile)."""
+        if name is None:
+            hit = codes != 0
+        else:
+            hit = (codes & self.bit(name)) != 0
+        return hit.astype(np.uint8) * 255
+
+
+_default_classifier = None
+
+
+def get_default_classifier():
+    """Returns the process-wide classifier built from config.UNIFORM_PROFILES."""
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = ColorClassifier(config.UNIFORM_PROFILES, bits=config.COLOR_LUT_BITS)
+    return _default_classifier
@@ -1,4 +1,9 @@
 # config.py
+import os
+
+# Directory of this file. Default file locations are resolved against it,
+# not against the directory the node was started from
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Time Windows (IST)
 # Format: (Start Hour, Start Minute, End Hour, End Minute)
@@ -9,6 +14,20 @@ TIME_WINDOWS = [
     (14, 30, 16, 0)
 ]
 
+# Timezone the windows are expressed in (IANA name); None uses the board's local time
+TIMEZONE = "Asia/Kolkata"
+
+# Optional per-weekday windows (0 = Monday ... 6 = Sunday), same format as TIME_WINDOWS.
+# Days not listed use TIME_WINDOWS; an empty list disables that day.
+# Example: WEEKLY_TIME_WINDOWS = {5: [(10, 30, 11, 30)], 6: []}
+WEEKLY_TIME_WINDOWS = {}
+
+# Outside the windows and during the cooldown the node drops its subscriptions
+# and sleeps until the next transition. Set to False to stay subscribed
+# (messages are then discarded on arrival).
+SUSPEND_SUBSCRIPTIONS_WHEN_INACTIVE = True
+GATE_MAX_SLEEP_SECONDS = 300.0  # Upper bound between schedule re-checks
+
 # HSV Color Ranges for Purple/Violet Uniform
 # Initial suggested range: Hue 125-155, Saturation 50-255, Value 50-255
 # OpenCV HSV ranges: H: 0-179, S: 0-255, V: 0-255
@@ -21,10 +40,44 @@ TIME_WINDOWS = [
 UNIFORM_HSV_LOWER = (135, 80, 70)
 UNIFORM_HSV_UPPER = (165, 255, 255)
 
-# Thresholds
+# Uniform profiles, all evaluated in the same pass by the color lookup table (max 8).
+# name -> {"lower": HSV, "upper": HSV, optional "threshold": percentage}
+# A lower hue greater than the upper hue wraps around through red (e.g. 170 -> 10).
+UNIFORM_PROFILES = {
+    "tea_staff": {"lower": UNIFORM_HSV_LOWER, "upper": UNIFORM_HSV_UPPER},
+    # "coffee_staff": {"lower": (10, 100, 40), "upper": (22, 255, 200)},
+    # "housekeeping": {"lower": (95, 80, 60), "upper": (115, 255, 255)},
+}
+# Bits per BGR channel in the lookup table: 6 -> 64^3 entries (256 KB), 8 is exact (16 MB)
+COLOR_LUT_BITS = 6
+
+# Upper-body regions larger than COLOR_PIXEL_BUDGET pixels are estimated from
+# an evenly strided sample of that size, so a person close to the camera costs
+# no more than one further away. When a profile's estimate is within
+# COLOR_CONFIDENCE_Z standard errors of its threshold, the region is counted
+# exactly instead. None always counts every pixel.
+COLOR_PIXEL_BUDGET = 16384
+COLOR_CONFIDENCE_Z = 3.0
+
+# Thresholds (default for profiles without their own)
 UNIFORM_PIXEL_PERCENTAGE_THRESHOLD = 25.0  # Percentage (25-30%)
 CONFIDENCE_THRESHOLD = 0.6 # Person detection confidence
 
+# Person tracking and alert voting
+# People are tracked across detection messages (by the detector's track_id
+# when it provides one, otherwise by box overlap). Each track's color verdict
+# is cached and only re-checked every TRACK_RECHECK_FRAMES messages, when its
+# box moves (IoU with the last checked box below TRACK_RECHECK_IOU) or while
+# its vote is undecided. An alert needs TRACK_VOTE_MIN matching checks among
+# the track's last TRACK_VOTE_WINDOW. Set all three to 1 to check every box
+# of every message and alert on the first match.
+TRACK_IOU_THRESHOLD = 0.3   # Min overlap to continue a track
+TRACK_MAX_AGE_FRAMES = 15   # Messages a track survives without being seen
+TRACK_RECHECK_FRAMES = 10
+TRACK_RECHECK_IOU = 0.7
+TRACK_VOTE_WINDOW = 5
+TRACK_VOTE_MIN = 3
+
 # Cooldown
 COOLDOWN_SECONDS = 15 * 60  # 15 minutes
 
@@ -33,11 +86,56 @@ IOT_NODE_IP = "192.168.137.251" # Placeholder IP, to be configured
 IOT_NODE_PORT = 80
 ALERT_ENDPOINT = "/alert"
 
+# Alert delivery (background dispatcher)
+ALERT_QUEUE_SIZE = 16             # Outbound alerts waiting for delivery
+ALERT_MAX_RETRIES = 3             # Retries after the first attempt
+ALERT_RETRY_BACKOFF_SECONDS = 0.5 # Doubled after every failed attempt
+ALERT_TIMEOUT_SECONDS = 5.0
+
+# Displays to alert, each delivered to in parallel on its own worker.
+# Empty uses the single display at IOT_NODE_IP / IOT_NODE_PORT / ALERT_ENDPOINT.
+# Example: ALERT_ENDPOINTS = ["http://192.168.137.251/alert", "http://192.168.137.252/alert"]
+ALERT_ENDPOINTS = []
+ALERT_COALESCE_SECONDS = 10.0     # Identical events (camera + profile) within this window are sent once
+# Alerts a display could not take are kept in this append-only file and
+# replayed when it answers again (also after a restart). Each spooled alert
+# is fsynced, which only happens while a display is failing. None disables it.
+ALERT_SPOOL_PATH = os.path.join(PACKAGE_DIR, "alert_spool.jsonl")
+ALERT_SPOOL_MAX_AGE_SECONDS = 600.0   # Older undelivered alerts are discarded, not replayed
+ALERT_REPLAY_INTERVAL_SECONDS = 30.0  # How often an unreachable display is retried
+
 # RDK X5 Specific Config
 USE_RDK_BPU = True  # Set to True to attempt using hardware acceleration
 RDK_MODEL_PATH = "/opt/hobot/model/x5/basic/fcos_512x512_nv12.bin" # Standard path example
 RDK_MODEL_WIDTH = 512
 RDK_MODEL_HEIGHT = 512
+FCOS_BACKEND = "auto"  # "c" (libpostprocess.so), "numpy", or "auto" (c when available)
+RDK_LETTERBOX = False  # Keep aspect ratio and pad instead of stretching to the model size
+# The BPU model loads and warms up on a background thread while frames are
+# already being captured (standalone pipeline); inference starts once ready
+MODEL_LOAD_IN_BACKGROUND = True
+MODEL_WARMUP_RUNS = 2  # Blank-frame inferences before the first real one
+
+# Detection backend started by teatime.py:
+#   "ros" - main.py, person boxes from the mono2d_body_detection topic
+#   "bpu" - pipeline.py, cv2.VideoCapture + FCOS on the RDK X5 BPU (needs USE_RDK_BPU)
+#   "cpu" - pipeline.py, cv2.VideoCapture + OpenCV's HOG people detector
+#   "auto" - the first of DETECTION_BACKEND_ORDER whose modules are installed
+DETECTION_BACKEND = "auto"
+DETECTION_BACKEND_ORDER = ["ros", "bpu", "cpu"]
+CPU_DETECTOR_WIDTH = 640  # Frames are scaled down to this width for the CPU detector
+
+# Motion gate (BPU path: standalone pipeline and RDKDetector.detect_person)
+# A downscaled grayscale difference against a running-average background.
+# Frames of a static scene skip inference and color checks (detect_person
+# returns the previous result). A frame still goes through at least every
+# MOTION_HEARTBEAT_SECONDS.
+MOTION_GATE_ENABLED = True
+MOTION_GATE_WIDTH = 64                # Width of the comparison image in pixels
+MOTION_PIXEL_THRESHOLD = 15           # Gray-level change that counts a pixel as changed
+MOTION_MIN_CHANGED_FRACTION = 0.005   # Changed pixels (fraction) that count as motion
+MOTION_HEARTBEAT_SECONDS = 2.0
+MOTION_BACKGROUND_RATE = 0.05         # Background adaptation per frame (0-1)
 
 # Video source: integer for camera index (e.g., 0) or string for video file path
 VIDEO_SOURCE = 0
@@ -46,3 +144,82 @@ VIDEO_SOURCE = 0
 ROS_IMAGE_TOPIC = "/image"
 ROS_DETECTION_TOPIC = "/hobot_mono2d_body_detection"
 
+# Multi-camera mode: one entry per camera, served by a single node that shares
+# the color engine and the alert dispatcher. Each camera has its own frame
+# buffer, tracker and cooldown; "time_windows", "weekly_time_windows",
+# "timezone" and "cooldown_seconds" optionally override the global settings.
+# An empty list serves one camera on ROS_IMAGE_TOPIC / ROS_DETECTION_TOPIC.
+# Example:
+# CAMERAS = [
+#     {"name": "pantry_east", "image_topic": "/cam0/image", "detection_topic": "/cam0/hobot_mono2d_body_detection"},
+#     {"name": "pantry_west", "image_topic": "/cam1/image", "detection_topic": "/cam1/hobot_mono2d_body_detection"},
+#     {"name": "lift_lobby", "image_topic": "/cam2/image", "detection_topic": "/cam2/hobot_mono2d_body_detection",
+#      "time_windows": [(9, 30, 17, 30)]},
+# ]
+CAMERAS = []
+
+# Display
+# Production boards have no display: HEADLESS skips all drawing, frame copies
+# and OpenCV windows. The debug stream serves annotated frames and the color
+# mask as MJPEG on http://DEBUG_STREAM_HOST:DEBUG_STREAM_PORT/, rendered on its
+# own thread at most DEBUG_STREAM_MAX_FPS times a second and only while a
+# client is connected. The stream shows camera footage without any
+# authentication, so it only listens on the loopback interface unless
+# DEBUG_STREAM_HOST says otherwise (or use an SSH tunnel).
+HEADLESS = False
+DEBUG_STREAM_ENABLED = False
+DEBUG_STREAM_HOST = "127.0.0.1"
+DEBUG_STREAM_PORT = 8080
+DEBUG_STREAM_MAX_FPS = 5.0
+
+# Threading
+EXECUTOR_THREADS = 4  # rclpy MultiThreadedExecutor threads
+COLOR_WORKERS = 4     # Parallel strips for color classification (1 = no pool)
+CAMERA_WORKERS = 2    # Threads handling detection messages, shared fairly by the cameras (0 = inline)
+
+# Metrics
+# Stage latency histograms, counters and gauges, served in Prometheus text
+# format on http://METRICS_HOST:METRICS_PORT/metrics. The same server offers
+# /profile?seconds=N for an on-demand sampling profile of at most
+# PROFILE_MAX_SECONDS. The server has no authentication, so it only listens
+# on the loopback interface unless METRICS_HOST says otherwise
+# ("0.0.0.0" for every interface, e.g. for a Prometheus on another host).
+METRICS_ENABLED = True
+METRICS_SERVER_ENABLED = False
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9100
+PROFILE_MAX_SECONDS = 30.0
+
+# Runtime overrides
+# A JSON object of the settings above that can change without a restart
+# (uniform profiles and thresholds, color estimation, CONFIDENCE_THRESHOLD,
+# time windows, cooldown and TRACK_*), e.g.
+#   {"UNIFORM_PROFILES": {"tea_staff": {"lower": [138, 90, 70], "upper": [165, 255, 255]}},
+#    "UNIFORM_PIXEL_PERCENTAGE_THRESHOLD": 22.0}
+# The file is checked every RUNTIME_CONFIG_POLL_SECONDS and applied between
+# messages once it validates; deleting it goes back to the values here.
+# None disables the file.
+RUNTIME_CONFIG_PATH = "runtime_config.json"
+RUNTIME_CONFIG_POLL_SECONDS = 2.0
+
+# Recording
+# Writes every frame, detection message, gate change, config reload and
+# alert the node handles to RECORD_PATH (a time.strftime pattern), for
+# replay.py to reproduce without cameras or ROS. None disables it.
+# Example: RECORD_PATH = "recordings/teatime-%Y%m%d-%H%M%S.ttr"
+RECORD_PATH = None
+RECORD_MAX_BYTES = 4 * 1024 ** 3  # Recording stops at this size
+
+# Frame decoding
+# Frames are kept compressed and decoded only when a detection needs pixels.
+# FRAME_DECODE_SCALE decodes at 1/N resolution (1, 2, 4 or 8); 2 is usually
+# plenty for the color check and roughly quarters the JPEG decode cost.
+FRAME_DECODE_SCALE = 1
+STATS_LOG_INTERVAL_SECONDS = 60.0
+
+# Frame/detection pairing
+# Recent frames are buffered by header stamp so each PerceptionTargets message
+# is checked against the image its boxes were computed on.
+FRAME_BUFFER_SIZE = 30          # Frames kept (1 second at 30 FPS)
+FRAME_MATCH_MAX_SKEW_MS = 50.0  # Max stamp difference for a match (None = always use closest)
+
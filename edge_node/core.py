@@ -0,0 +1,353 @@
+import logging
+import time
+
+import cv2
+import config
+from alerts import make_alert_payload
+from camera import Camera, FairScheduler, camera_configs
+from debug_stream import annotate
+from detector import TeaDetector
+from frame_buffer import stamp_to_ns
+from metrics import REGISTRY, STARTUP, expose, stage_histogram, unexpose
+from runtime_config import RuntimeConfig
+
+
+def person_boxes(msg):
+    """
+    Body boxes (startX, startY, endX, endY) and detector track ids (None when
+    untracked) of the persons in a PerceptionTargets message.
+    """
+    bboxes = []
+    track_ids = []
+    for target in msg.targets:
+        if target.type == 'person':
+            # Find the bounding box for the body
+            for roi in target.rois:
+                if roi.type == 'body':
+                    # Extract bounding box
+                    r = roi.rect
+                    # Convert from (x_offset, y_offset, width, height) to (startX, startY, endX, endY)
+                    bboxes.append((r.x_offset, r.y_offset, r.x_offset + r.width, r.y_offset + r.height))
+                    # 0 means the detector is not tracking
+                    track_ids.append(getattr(target, 'track_id', 0) or None)
+    return bboxes, track_ids
+
+
+class EdgeCore:
+    """
+    Everything between received messages and alerts, without ROS: cameras,
+    frame matching, tracking, color checks, gating and alert decisions.
+
+    TeaTimeNode adds subscriptions and timers on top; the replayer drives it
+    directly from a recording. `clock` gives the wall time used for the
+    cooldown, the schedule and alert timestamps, so a replay can run on the
+    recorded time. Subclasses react to gate changes through resume() and
+    suspend().
+    """
+    def __init__(self, alerts, runtime=None, logger=None, clock=time.time, camera_workers=None,
+                 debug_stream=None, recorder=None, headless=None):
+        self.logger = logger or logging.getLogger("teatime")
+        self.clock = clock
+        self.alerts = alerts
+        self.debug_stream = debug_stream
+        self.recorder = recorder
+        self.headless = config.HEADLESS if headless is None else headless
+        self.started = time.monotonic()
+
+        # Tunable settings (config.py plus RUNTIME_CONFIG_PATH), validated and
+        # precompiled once; reloads swap in a new snapshot
+        self.runtime = runtime or RuntimeConfig()
+
+        # Initialize Detector (we only need it for check_uniform_color).
+        # One color engine serves every camera.
+        self.detector = TeaDetector(
+            workers=config.COLOR_WORKERS,
+            pixel_budget=self.runtime.pixel_budget,
+            confidence_z=self.runtime.confidence_z,
+            classifier=self.runtime.classifier)
+
+        # Every camera has its own frame buffer, tracker, schedule and cooldown
+        self.cameras = [Camera.from_config(entry, self.runtime) for entry in camera_configs()]
+
+        # Detection handling runs on a worker pool that serves the cameras in turn
+        self.scheduler = FairScheduler(
+            self.process_detections, workers=config.CAMERA_WORKERS if camera_workers is None else camera_workers,
+            logger=self.logger)
+
+        # Prometheus metrics: shared color engine, then per-stage histograms
+        # and counters for each camera
+        self.alert_enqueue_seconds = stage_histogram("alert_enqueue")
+        # Objects whose attributes are exported; stop() withdraws them
+        self.exposed = [self, self.detector]
+        expose("teatime_color", self.detector, ("estimates", "exact_fallbacks"))
+        REGISTRY.gauge("teatime_runtime_config_version", "Version of the runtime config in force",
+                       fn=lambda: self.runtime.version, owner=self)
+        for camera in self.cameras:
+            labels = {"camera": camera.name}
+            camera.match_seconds = stage_histogram("match", labels)
+            camera.decode_seconds = stage_histogram("decode", labels)
+            camera.color_check_seconds = stage_histogram("color_check", labels)
+            camera.active_gauge = REGISTRY.gauge(
+                "teatime_pipeline_active", "1 while inside a time window and outside the cooldown", labels)
+            self.exposed += [camera, camera.frames, camera.tracker, camera.frame_stats, camera.detection_stats]
+            expose("teatime_frames", camera.frames, ("frames_received", "frames_decoded", "decodes_skipped",
+                                                     "matches", "misses", "evictions", "frames_out_of_order"),
+                   labels=labels)
+            expose("teatime_tracker", camera.tracker, ("checks", "cache_hits", "tracks_created"), labels=labels)
+            expose("teatime_detections", camera, ("detections_processed", "detections_dropped", "alerts_raised"),
+                   labels=labels)
+            for stats in (camera.frame_stats, camera.detection_stats):
+                stats.clock = clock
+                labels = {"camera": camera.name, "callback": stats.name.split("/")[-1]}
+                expose("teatime_callback", stats, ("calls",), labels=labels)
+                expose("teatime_callback", stats, ("in_flight", "max_in_flight", "max_latency", "max_lag"),
+                       kind="gauge", labels=labels)
+
+    @property
+    def camera(self):
+        """The first (in single-camera mode the only) camera."""
+        return self.cameras[0]
+
+    def apply_runtime(self, runtime):
+        """
+        Switches the color engine and every camera to a reloaded RuntimeConfig.
+        A color check in flight finishes with the lookup table it started
+        with; subscriptions only change if the new schedule or cooldown says so.
+        """
+        self.runtime = runtime
+        self.detector.apply(runtime)
+        if self.recorder is not None:
+            self.recorder.config(runtime.values)
+        for camera in self.cameras:
+            camera.apply(runtime)
+            # The windows or the cooldown may have changed the camera's state
+            self.update_gate(camera)
+
+    def update_gate(self, camera):
+        """Resumes or suspends a camera for its current schedule and cooldown state."""
+        with camera.gate_lock:
+            self._update_gate(camera)
+
+    def _update_gate(self, camera):
+        """Returns (cooldown remaining, in window) for subclasses that schedule the next check."""
+        now = self.clock()
+        cooldown = camera.cooldown_remaining(now)
+        in_window = camera.schedule.is_active(camera.schedule.now(now))
+        active = in_window and cooldown == 0.0
+        self.set_active(camera, active, "time_window" if not in_window else "cooldown")
+        return cooldown, in_window
+
+    def set_active(self, camera, active, reason=None):
+        """Records a gate decision for a camera and notifies resume()/suspend() on a change."""
+        if active and camera.active is not True:
+            self.logger.info(f"[INFO] [{camera.name}] Pipeline active.")
+            self.resume(camera)
+        elif not active and camera.active is not False:
+            if reason is not None:
+                self.logger.info(f"[INFO] [{camera.name}] Pipeline suspended "
+                                 f"({'cooldown' if reason == 'cooldown' else 'outside time window'}).")
+                self.suppressed(camera, reason, "suspension")
+            self.suspend(camera)
+        if active != camera.active and self.recorder is not None:
+            self.recorder.gate(camera.name, active)
+        camera.active = active
+        camera.active_gauge.set(int(active))
+
+    def match_frame(self, camera, stamp):
+        """
+        The buffered frame the detections stamped `stamp` were computed on, or
+        None if none is within the skew. Recorded, so a replay can use the
+        same frame even if later frames were buffered before this ran.
+        """
+        matched = camera.frames.closest(stamp)
+        if self.recorder is not None:
+            self.recorder.match(camera.name, stamp, None if matched is None else matched.stamp)
+        return matched
+
+    def resume(self, camera):
+        """Called when a camera becomes active."""
+
+    def suspend(self, camera):
+        """Called when a camera is suspended."""
+
+    def send_alert(self, camera, confidence, profile):
+        """Queues an HTTP POST alert to the IoT Node; delivery happens in the background."""
+        with self.alert_enqueue_seconds.time():
+            self.alerts.submit(make_alert_payload(confidence, profile, camera.schedule.now(self.clock()),
+                                                  camera=camera.name))
+
+    @staticmethod
+    def suppressed(camera, reason, what):
+        """Counts work skipped by the gate (`what`: suspension, frame or detection)."""
+        REGISTRY.counter("teatime_suppressed_total", "Work skipped by the time window or cooldown gate",
+                         {"camera": camera.name, "reason": reason, "what": what}).inc()
+
+    def log_stats(self):
+        """Logs per-camera and aggregate throughput, decode, matching and tracking statistics."""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        for camera in self.cameras:
+            frames = camera.frames
+            self.logger.info(
+                f"[STATS] [{camera.name}] Frames received: {frames.frames_received}, decoded: {frames.frames_decoded}, "
+                f"decodes skipped: {frames.decodes_skipped}, matched: {frames.matches}, "
+                f"unmatched: {frames.misses}, evicted: {frames.evictions}, "
+                f"out of order: {frames.frames_out_of_order}")
+            tracker = camera.tracker
+            self.logger.info(
+                f"[STATS] [{camera.name}] Detections processed: {camera.detections_processed} "
+                f"({camera.detections_processed / elapsed:.1f}/s), dropped: {camera.detections_dropped}, "
+                f"errors: {camera.detection_errors}, "
+                f"alerts: {camera.alerts_raised}, color checks: {tracker.checks}, "
+                f"cached verdicts reused: {tracker.cache_hits}, "
+                f"tracks: {len(tracker.tracks)} active / {tracker.tracks_created} created")
+            for stats in (camera.frame_stats, camera.detection_stats):
+                self.logger.info(f"[STATS] {stats.summary()}")
+        if len(self.cameras) > 1:
+            processed = sum(camera.detections_processed for camera in self.cameras)
+            received = sum(camera.frames.frames_received for camera in self.cameras)
+            self.logger.info(
+                f"[STATS] All {len(self.cameras)} cameras: frames received {received} "
+                f"({received / elapsed:.1f}/s), detections processed {processed} ({processed / elapsed:.1f}/s)")
+        self.logger.info(
+            f"[STATS] Color estimated: {self.detector.estimates}, exact fallbacks: {self.detector.exact_fallbacks}")
+
+    def show_debug(self, camera, frame, bboxes, mask):
+        """Feeds the debug stream and, unless headless, the OpenCV windows."""
+        if self.debug_stream is not None:
+            self.debug_stream.publish(frame, bboxes, mask)
+        if self.headless:
+            return
+        suffix = f" ({camera.name})" if len(self.cameras) > 1 else ""
+        # Show the color mask for debugging
+        if mask is not None:
+            cv2.imshow("Color Mask" + suffix, mask)
+        # Show the live feed with boxes
+        cv2.imshow("Live Feed" + suffix, annotate(frame, bboxes))
+        cv2.waitKey(1)
+
+    def stop(self):
+        self.scheduler.stop()
+        unexpose(*self.exposed)
+
+    def startup_milestone(self, name, camera):
+        """Logs the first time the process reaches `name` (first frame, first detection)."""
+        elapsed = STARTUP.milestone(name)
+        if elapsed is not None:
+            self.logger.info(f"[STARTUP] {name.replace('_', ' ').capitalize()} ({camera.name}) after {elapsed:.2f} s")
+
+    def frame_callback(self, camera, msg):
+        """Callback to buffer the compressed image frame (decoded lazily)."""
+        self.put_frame(camera, msg.data, stamp_to_ns(msg.header.stamp))
+
+    def put_frame(self, camera, data, stamp):
+        if not camera.active:
+            self.suppressed(camera, "inactive", "frame")
+            return
+        if not camera.frames.frames_received:
+            self.startup_milestone("first_frame", camera)
+        if self.recorder is not None:
+            # Before the frame becomes visible, so a recording never lists a
+            # detection ahead of a frame it could have been matched with
+            self.recorder.frame(camera.name, stamp, data)
+        with camera.frame_stats.track(stamp):
+            camera.frames.put(data, stamp)
+
+    def detection_callback(self, camera, msg):
+        """Callback function for detection results: hands them to the camera worker pool."""
+        if not camera.active:
+            self.suppressed(camera, "inactive", "detection")
+            return
+        self.scheduler.submit(camera, msg)
+
+    def process_detections(self, camera, msg):
+        """Matches the message to its frame, checks uniforms and triggers the alert."""
+        bboxes, track_ids = person_boxes(msg)
+        self.process_boxes(camera, stamp_to_ns(msg.header.stamp), bboxes, track_ids)
+
+    def process_boxes(self, camera, stamp, bboxes, track_ids):
+        """process_detections for boxes already taken out of their message. Returns the alerted profile or None."""
+        if self.recorder is not None:
+            self.recorder.detections(camera.name, stamp, bboxes, track_ids)
+        if not camera.detections_processed:
+            self.startup_milestone("first_detection", camera)
+        with camera.detection_stats.track(stamp):
+            profile = self._process_boxes(camera, stamp, bboxes, track_ids)
+        camera.detections_processed += 1
+        return profile
+
+    def _process_boxes(self, camera, stamp, bboxes, track_ids):
+        # 1. Time window and cooldown (precomputed by the gate; no decode while inactive)
+        if not camera.active:
+            self.suppressed(camera, "inactive", "detection")
+            return None
+
+        # 2. Ensure we have a frame to process
+        if camera.frames.latest is None:
+            self.logger.info(f"[STATUS] [{camera.name}] Waiting for image frame...")
+            return None
+
+        detected_tea_staff = False
+
+        # 3. Follow people across messages; only new, moved, stale or
+        # undecided tracks need a fresh color check
+        tracker = camera.tracker
+        tracks = tracker.update(bboxes, track_ids)
+        to_check = [track for track in tracks if tracker.needs_check(track)]
+
+        # The mask is only built when someone can look at it
+        want_debug = not self.headless or (self.debug_stream is not None and self.debug_stream.has_clients)
+        if not to_check and not want_debug:
+            return None
+
+        # Pick the frame the boxes were computed on, and decode it only now
+        # that its pixels are needed
+        with camera.match_seconds.time():
+            matched = self.match_frame(camera, stamp)
+        if matched is None:
+            self.logger.debug(f"[STATUS] [{camera.name}] No frame within skew of detection stamp, skipping.")
+            return None
+        with camera.decode_seconds.time():
+            frame = camera.frames.decode(matched)
+        if frame is None:
+            self.logger.error(f"[{camera.name}] Failed to decode image frame.")
+            return None
+
+        # 4. Check the uniform color of the tracks that need it in one pass
+        # (boxes mapped onto the possibly reduced-scale decoded frame)
+        mask = None
+        if to_check:
+            with camera.color_check_seconds.time():
+                results, mask = self.detector.check_uniform_colors(
+                    frame, [camera.frames.scale_bbox(track.bbox) for track in to_check], with_mask=want_debug)
+            for track, result in zip(to_check, results):
+                tracker.record(track, result)
+
+        # An alert needs TRACK_VOTE_MIN matching checks of the same person
+        for track in tracks:
+            profile = tracker.vote(track)
+            if profile is not None:
+                # Bypassing confidence from message as it's 0.0
+                best_confidence = 1.0
+                detected_profile = profile
+                percent = track.verdict[1]
+                self.logger.info(
+                    f"\n[DETECT] [{camera.name}] Potential {profile} detected! Uniform color %: {percent:.2f}%")
+                detected_tea_staff = True
+                break # Trigger on first valid detection
+
+        if want_debug:
+            self.show_debug(camera, frame, [camera.frames.scale_bbox(bbox) for bbox in bboxes], mask)
+
+        # 5. Trigger Alert
+        if not detected_tea_staff:
+            return None
+        if self.recorder is not None:
+            self.recorder.alert(camera.name, stamp, detected_profile, percent)
+        self.send_alert(camera, float(best_confidence), detected_profile)
+        camera.last_alert_time = self.clock()
+        camera.alerts_raised += 1
+        # Votes do not carry over the cooldown
+        tracker.clear()
+        self.logger.info(f"[INFO] [{camera.name}] Cooldown started for {camera.cooldown_seconds} seconds.")
+        self.update_gate(camera)
+        return detected_profile
@@ -0,0 +1,64 @@
+import threading
+
+import cv2
+import numpy as np
+import config
+from metrics import STARTUP, stage_histogram
+
+FORWARD_SECONDS = stage_histogram("forward", {"backend": "cpu"})
+
+
+def hog_available():
+    return hasattr(cv2, "HOGDescriptor")
+
+
+class CPUDetector:
+    """
+    Person detection on the CPU with OpenCV's built-in HOG people detector.
+
+    Needs no model file and no accelerator, so the standalone pipeline runs
+    on any machine; it is far slower and less accurate than FCOS on the BPU
+    and meant for development and as a fallback. Same interface as
+    RDKDetector (infer/postprocess, detect_person, ready/wait_ready).
+    Frames are scaled down to at most `width` pixels wide before detection.
+    """
+    def __init__(self, width=config.CPU_DETECTOR_WIDTH):
+        if not hog_available():
+            raise ImportError(f"OpenCV {cv2.__version__} has no HOGDescriptor; the cpu backend needs OpenCV 4")
+        self.width = width
+        self.load_error = None
+        self.ready = threading.Event()
+        with STARTUP.phase("model_load"):
+            self.hog = cv2.HOGDescriptor()
+            self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        STARTUP.milestone("model_ready")
+        self.ready.set()
+
+    def wait_ready(self, timeout=None):
+        return True
+
+    def detect_person(self, frame):
+        """Returns: list of ((x1, y1, x2, y2), confidence)"""
+        return self.postprocess(self.infer(frame), frame.shape)
+
+    def infer(self, frame, detach=False):
+        """HOG detection; returns (boxes as x, y, w, h in frame pixels, SVM weights)."""
+        scale = min(1.0, self.width / frame.shape[1])
+        small = frame if scale == 1.0 else cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        with FORWARD_SECONDS.time():
+            rects, weights = self.hog.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        return np.asarray(rects, dtype=np.float32).reshape(-1, 4) / scale, np.asarray(weights).reshape(-1)
+
+    def postprocess(self, outputs, frame_shape):
+        """
+        Boxes clamped to the frame. The confidence is the SVM weight clipped
+        to [0, 1] (it is not a probability; around 1 is a clear person).
+        """
+        rects, weights = outputs
+        h, w = frame_shape[:2]
+        detections = []
+        for (x, y, bw, bh), weight in zip(rects, weights):
+            x1, y1 = max(0, int(x)), max(0, int(y))
+            x2, y2 = min(w, int(x + bw)), min(h, int(y + bh))
+            detections.append(((x1, y1, x2, y2), float(min(1.0, max(0.0, weight)))))
+        return detections
@@ -0,0 +1,139 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+BOUNDARY = "teatimeframe"
+
+INDEX_PAGE = b"""<html><head><title>TeaTime debug</title></head><body>
+<h3>Live Feed</h3><img src="/stream">
+<h3>Color Mask</h3><img src="/mask">
+</body></html>"""
+
+
+def annotate(frame, bboxes):
+    """Returns a copy of `frame` with the person boxes drawn on it."""
+    frame_with_boxes = frame.copy()
+    for bbox in bboxes:
+        cv2.rectangle(frame_with_boxes, (bbox[0], bbox[1]), (bbox[2], bbox[3]), (0, 255, 0), 2)
+    return frame_with_boxes
+
+
+class DebugStream:
+    """
+    Local MJPEG endpoint for watching what the edge node sees.
+
+    publish() only stores references to the latest frame, boxes and mask.
+    Drawing and JPEG encoding happen on a separate render thread, at most
+    max_fps times per second, and only while a client is connected.
+    Listens on the loopback interface unless given another host.
+    """
+    def __init__(self, host="127.0.0.1", port=8080, max_fps=5.0, jpeg_quality=70):
+        self.min_interval = 1.0 / max_fps
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+
+        self._lock = threading.Lock()
+        self._new_frame = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._pending = None
+        self._jpegs = {"stream": None, "mask": None}
+        self._sequence = 0
+        self.clients = 0
+        self.frames_encoded = 0
+
+        stream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/":
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html")
+                    self.send_header("Content-Length", str(len(INDEX_PAGE)))
+                    self.end_headers()
+                    self.wfile.write(INDEX_PAGE)
+                elif self.path in ("/stream", "/mask"):
+                    stream._serve(self, self.path[1:])
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._threads = []
+
+    def start(self):
+        for target, name in ((self._server.serve_forever, "debug-http"), (self._render, "debug-render")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._new_frame:
+            self._new_frame.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def has_clients(self):
+        return self.clients > 0
+
+    def publish(self, frame, bboxes, mask=None):
+        """Offers the latest frame for streaming. Cheap no-op when nobody is watching."""
+        if not self.clients:
+            return
+        with self._lock:
+            self._pending = (frame, list(bboxes), mask)
+
+    def _render(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            with self._lock:
+                pending, self._pending = self._pending, None
+            if pending is not None and self.clients:
+                frame, bboxes, mask = pending
+                jpegs = {"stream": self._encode(annotate(frame, bboxes)), "mask": None}
+                if mask is not None:
+                    jpegs["mask"] = self._encode(mask)
+                with self._new_frame:
+                    self._jpegs = jpegs
+                    self._sequence += 1
+                    self._new_frame.notify_all()
+                self.frames_encoded += 1
+            # Cap the render rate
+            self._stop.wait(max(0.0, self.min_interval - (time.monotonic() - started)))
+
+    def _encode(self, image):
+        ok, buf = cv2.imencode(".jpg", image, self.encode_params)
+        return buf.tobytes() if ok else None
+
+    def _serve(self, handler, kind):
+        handler.send_response(200)
+        handler.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.end_headers()
+        with self._lock:
+            self.clients += 1
+        seen = -1
+        try:
+            while not self._stop.is_set():
+                with self._new_frame:
+                    if self._sequence == seen:
+                        self._new_frame.wait(1.0)
+                    seen = self._sequence
+                    jpeg = self._jpegs[kind]
+                if jpeg is None:
+                    continue
+                handler.wfile.write(
+                    f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode())
+                handler.wfile.write(jpeg)
+                handler.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self._lock:
+                self.clients -= 1
@@ -1,15 +1,220 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
-import config
+from color_lut import get_default_classifier
+
+# Regions shorter than this per worker are not worth splitting
+MIN_ROWS_PER_WORKER = 32
+# Classify the union of all rois only while it is at most this many times
+# the summed roi area. The summed-area tables cost about as much as the
+# classification itself, so the batch only wins when overlapping people
+# share pixels; side by side or spread out, one by one is cheaper
+MAX_UNION_OVERHEAD = 0.9
 
 class TeaDetector:
-    def __init__(self):
+    def __init__(self, workers=1, pixel_budget=None, confidence_z=3.0, classifier=None):
         """
         Initializes the detector (no model loading needed as detection comes from ROS topic).
+        With workers > 1, color classification of large regions is split into
+        horizontal strips processed in parallel (OpenCV and NumPy release the GIL).
+        With a pixel_budget, upper-body regions larger than the budget are
+        estimated from an evenly strided sample of at most that many pixels;
+        the exact count is only computed when a profile's percentage lies
+        within confidence_z standard errors of its threshold.
+        The classifier, budget and z can be swapped at runtime with apply();
+        every call works with the classifier it started with.
         """
         # The MobileNetSSD model loading is removed as it's no longer used for person detection.
         # This class now primarily serves the check_uniform_color functionality.
-        pass
+        # Colors are classified with the shared lookup-table engine, which
+        # evaluates every uniform profile in a single pass.
+        self.classifier = classifier or get_default_classifier()
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="color") if workers > 1 else None
+        self.pixel_budget = pixel_budget
+        self.confidence_z = confidence_z
+        # Estimation statistics
+        self.estimates = 0
+        self.exact_fallbacks = 0
+
+    def apply(self, runtime):
+        """Switches to the color settings of a RuntimeConfig snapshot."""
+        self.pixel_budget = runtime.pixel_budget
+        self.confidence_z = runtime.confidence_z
+        self.classifier = runtime.classifier
+
+    def classify(self, region, classifier=None):
+        """Classifies a BGR region, in parallel strips when a worker pool is configured."""
+        classifier = classifier or self.classifier
+        rows = region.shape[0]
+        strips = min(self.workers, rows // MIN_ROWS_PER_WORKER)
+        if self.pool is None or strips < 2:
+            return classifier.classify(region)
+        codes = np.empty(region.shape[:2], dtype=np.uint8)
+        bounds = np.linspace(0, rows, strips + 1).astype(int)
+        futures = [
+            self.pool.submit(classifier.classify, region[y0:y1], codes[y0:y1])
+            for y0, y1 in zip(bounds[:-1], bounds[1:])
+        ]
+        for future in futures:
+            future.result()
+        return codes
+
+    @staticmethod
+    def _score(classifier, counts, total_pixels):
+        """
+        Turns per-profile matching pixel counts into (is_detected, percentage, profile).
+        The first profile over its threshold wins; otherwise the best-scoring one is reported.
+        """
+        best_name, best_percentage = None, -1.0
+        for name, matching in zip(classifier.names, counts):
+            percentage = (matching / total_pixels) * 100
+            if percentage >= classifier.thresholds[name]:
+                return True, percentage, name
+            if percentage > best_percentage:
+                best_name, best_percentage = name, percentage
+        return False, best_percentage, best_name
+
+    def margin(self, matching, sampled_pixels):
+        """
+        Half-width, in percentage points, of the confidence interval of a
+        percentage estimated from `sampled_pixels` samples (normal
+        approximation plus one sample of slack for tiny proportions).
+        Neighbouring pixels are correlated, so confidence_z should be generous.
+        """
+        p = matching / sampled_pixels
+        return 100.0 * (self.confidence_z * math.sqrt(p * (1.0 - p) / sampled_pixels) + 1.0 / sampled_pixels)
+
+    def estimate(self, frame, roi, classifier=None):
+        """
+        Classifies an evenly strided sample of `roi` (y0, y1, x0, x1) holding
+        at most pixel_budget pixels. Returns (counts, sampled_pixels, step, codes).
+        """
+        classifier = classifier or self.classifier
+        y0, y1, x0, x1 = roi
+        step = max(1, math.ceil(math.sqrt((y1 - y0) * (x1 - x0) / self.pixel_budget)))
+        codes = self.classify(frame[y0:y1:step, x0:x1:step], classifier)
+        counts = [cv2.countNonZero(codes & classifier.bit(name)) for name in classifier.names]
+        return counts, codes.size, step, codes
+
+    def estimate_uniform_color(self, frame, bbox):
+        """
+        Budgeted estimate for one person: (is_detected, percentage, profile, margin),
+        where margin is the confidence half-width of every profile's percentage
+        that matters for the verdict (0.0 when the region was evaluated exactly).
+        """
+        roi = self.upper_body_roi(frame.shape, bbox)
+        if roi is None:
+            return False, 0.0, None, 0.0
+        result, _, _, margin = self._check_roi(frame, roi, self.classifier)
+        return result + (margin,)
+
+    def _check_roi(self, frame, roi, classifier):
+        """
+        One region on its own: estimated when it exceeds the pixel budget and the
+        estimate is clear of every threshold, exact otherwise.
+        Returns ((is_detected, percentage, profile), codes, step, margin).
+        """
+        y0, y1, x0, x1 = roi
+        area = (y1 - y0) * (x1 - x0)
+        if self.pixel_budget and area > self.pixel_budget:
+            counts, sampled, step, codes = self.estimate(frame, roi, classifier)
+            margins = [self.margin(matching, sampled) for matching in counts]
+            thresholds = [classifier.thresholds[name] for name in classifier.names]
+            if all(abs(matching / sampled * 100 - threshold) > margin
+                   for matching, threshold, margin in zip(counts, thresholds, margins)):
+                self.estimates += 1
+                return self._score(classifier, counts, sampled), codes, step, max(margins)
+            # Too close to call: count every pixel
+            self.exact_fallbacks += 1
+        codes = self.classify(frame[y0:y1, x0:x1], classifier)
+        counts = [cv2.countNonZero(codes & classifier.bit(name)) for name in classifier.names]
+        return self._score(classifier, counts, area), codes, 1, 0.0
+
+    @staticmethod
+    def upper_body_roi(frame_shape, bbox):
+        """
+        Returns the clipped upper-body region (y0, y1, x0, x1) of a person box,
+        or None if the region is empty.
+        """
+        (startX, startY, endX, endY) = bbox
+        height = endY - startY
+        y0 = max(0, min(startY + int(height * 0.1), frame_shape[0]))
+        y1 = max(0, min(startY + int(height * 0.6), frame_shape[0]))
+        x0 = max(0, min(startX, frame_shape[1]))
+        x1 = max(0, min(endX, frame_shape[1]))
+        if y0 >= y1 or x0 >= x1:
+            return None
+        return y0, y1, x0, x1
+
+    def check_uniform_colors(self, frame, bboxes, with_mask=True):
+        """
+        Batch version of check_uniform_color for all persons in one frame.
+        The union of the upper-body regions is classified once, and a
+        summed-area table per uniform profile gives each person's matching
+        percentage in constant time.
+        Returns ([(is_detected, percentage, profile), ...], union_mask);
+        the mask is only built when with_mask is True.
+        """
+        classifier = self.classifier
+        rois = [self.upper_body_roi(frame.shape, bbox) for bbox in bboxes]
+        valid = [r for r in rois if r is not None]
+        if not valid:
+            return [(False, 0.0, None)] * len(bboxes), None
+
+        uy0 = min(r[0] for r in valid)
+        uy1 = max(r[1] for r in valid)
+        ux0 = min(r[2] for r in valid)
+        ux1 = max(r[3] for r in valid)
+
+        areas = [(r[1] - r[0]) * (r[3] - r[2]) for r in valid]
+        over_budget = self.pixel_budget and max(areas) > self.pixel_budget
+        if over_budget or (uy1 - uy0) * (ux1 - ux0) > MAX_UNION_OVERHEAD * sum(areas):
+            return self._check_separately(frame, rois, (uy0, uy1, ux0, ux1), with_mask, classifier)
+
+        codes = self.classify(frame[uy0:uy1, ux0:ux1], classifier)
+        tables = [
+            cv2.integral(((codes & classifier.bit(name)) != 0).view(np.uint8), sdepth=cv2.CV_32S)
+            for name in classifier.names
+        ]
+
+        results = []
+        for r in rois:
+            if r is None:
+                results.append((False, 0.0, None))
+                continue
+            y0, y1, x0, x1 = r[0] - uy0, r[1] - uy0, r[2] - ux0, r[3] - ux0
+            counts = [
+                int(t[y1, x1]) - int(t[y0, x1]) - int(t[y1, x0]) + int(t[y0, x0])
+                for t in tables
+            ]
+            results.append(self._score(classifier, counts, (y1 - y0) * (x1 - x0)))
+        return results, classifier.mask(codes) if with_mask else None
+
+    def _check_separately(self, frame, rois, union, with_mask, classifier):
+        """
+        check_uniform_colors for sparse rois, or when some exceed the pixel
+        budget: classifies (or estimates) each roi on its own.
+        """
+        uy0, uy1, ux0, ux1 = union
+        mask = np.zeros((uy1 - uy0, ux1 - ux0), dtype=np.uint8) if with_mask else None
+        results = []
+        for r in rois:
+            if r is None:
+                results.append((False, 0.0, None))
+                continue
+            y0, y1, x0, x1 = r
+            result, codes, step, _ = self._check_roi(frame, r, classifier)
+            results.append(result)
+            if mask is not None:
+                roi_mask = classifier.mask(codes)
+                if step > 1:
+                    # Sampled mask: blow it back up to the region size for display
+                    roi_mask = cv2.resize(roi_mask, (x1 - x0, y1 - y0), interpolation=cv2.INTER_NEAREST)
+                mask[y0 - uy0:y1 - uy0, x0 - ux0:x1 - ux0] = roi_mask
+        return results, mask
 
     def check_uniform_color(self, frame, bbox):
         """
@@ -41,21 +246,15 @@ class TeaDetector:
         if roi.size == 0:
             return False, 0.0, None
 
-        # Convert to HSV
-        hsv_roi = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
+        # Classify every pixel against all uniform profiles with one table lookup
+        classifier = self.classifier
+        codes = classifier.classify(roi)
         
-        # Create mask for the uniform color
-        lower_bound = np.array(config.UNIFORM_HSV_LOWER, dtype="uint8")
-        upper_bound = np.array(config.UNIFORM_HSV_UPPER, dtype="uint8")
-        
-        mask = cv2.inRange(hsv_roi, lower_bound, upper_bound)
-        
-        # Calculate percentage of matching pixels
+        # Calculate percentage of matching pixels per profile
         total_pixels = roi.shape[0] * roi.shape[1]
-        matching_pixels = cv2.countNonZero(mask)
+        counts = [cv2.countNonZero(codes & classifier.bit(name)) for name in classifier.names]
         
-        percentage = (matching_pixels / total_pixels) * 100
+        is_detected, percentage, _ = self._score(classifier, counts, total_pixels)
         
-        is_detected = percentage >= config.UNIFORM_PIXEL_PERCENTAGE_THRESHOLD
-        
-        return is_detected, percentage, mask
+        return is_detected, percentage, classifier.mask(codes)
+
@@ -4,8 +4,11 @@ import sys
 import os
 import ctypes
 import json
+import threading
 import numpy as np
 import cv2
+from fcos_numpy import NumpyFcosDecoder, from_dicts, DETECTION_DTYPE
+from metrics import REGISTRY
 
 # Define C structures matching the library
 class hbSysMem_t(ctypes.Structure):
@@ -67,15 +70,33 @@ class FcosPostProcessInfo_t(ctypes.Structure):
         ("is_pad_resize",ctypes.c_int)
     ]
 
-# Load shared library
-try:
-    libpostprocess = ctypes.CDLL('/usr/lib/libpostprocess.so')
-    get_Postprocess_result = libpostprocess.FcosPostProcess
-    get_Postprocess_result.argtypes = [ctypes.POINTER(FcosPostProcessInfo_t)]
-    get_Postprocess_result.restype = ctypes.c_char_p
-except OSError:
-    print("[WARN] libpostprocess.so not found. FCOS post-processing will fail.")
-    libpostprocess = None
+LIBPOSTPROCESS_PATH = '/usr/lib/libpostprocess.so'
+
+# Shared library, loaded by load_libpostprocess() on first use
+libpostprocess = None
+get_Postprocess_result = None
+_load_lock = threading.Lock()
+_load_attempted = False
+
+def load_libpostprocess():
+    """
+    Loads libpostprocess.so the first time a C backend is asked for, so
+    importing this module costs no dlopen and prints nothing on machines
+    without it. Returns the library, or None (warning once) when missing.
+    """
+    global libpostprocess, get_Postprocess_result, _load_attempted
+    with _load_lock:
+        if libpostprocess is None and not _load_attempted:
+            _load_attempted = True
+            try:
+                lib = ctypes.CDLL(LIBPOSTPROCESS_PATH)
+                get_Postprocess_result = lib.FcosPostProcess
+                get_Postprocess_result.argtypes = [ctypes.POINTER(FcosPostProcessInfo_t)]
+                get_Postprocess_result.restype = ctypes.c_char_p
+                libpostprocess = lib
+            except OSError:
+                print("[WARN] libpostprocess.so not found. Using the NumPy FCOS post-processing backend.")
+        return libpostprocess
 
 def get_TensorLayout(Layout):
     if Layout == "NCHW":
@@ -84,9 +105,27 @@ def get_TensorLayout(Layout):
         return int(0)
 
 class FcosPostProcessor:
-    def __init__(self, model_outputs, input_w=512, input_h=512, ori_w=1920, ori_h=1080):
-        if libpostprocess is None:
+    """
+    FCOS post-processing with a selectable backend:
+      "c"     - /usr/lib/libpostprocess.so (Horizon reference implementation)
+      "numpy" - fcos_numpy.NumpyFcosDecoder, runs on any machine
+      "auto"  - "c" when the library can be loaded, otherwise "numpy"
+    Both return a fcos_numpy.DETECTION_DTYPE structured array. The library
+    is only loaded for "c" and "auto" (and by compare_backends).
+    """
+    def __init__(self, model_outputs, input_w=512, input_h=512, ori_w=1920, ori_h=1080, backend="auto"):
+        if backend not in ("auto", "c", "numpy"):
+            raise ValueError(f"Unknown FCOS backend: {backend}")
+        lib = None if backend == "numpy" else load_libpostprocess()
+        if backend == "auto":
+            backend = "c" if lib is not None else "numpy"
+        if backend == "c" and lib is None:
             raise ImportError("libpostprocess.so not loaded")
+        self.backend = backend
+        self.process_seconds = REGISTRY.histogram(
+            "teatime_fcos_seconds", "FCOS post-processing time in seconds", {"backend": backend})
+        self.detections = REGISTRY.counter(
+            "teatime_fcos_detections_total", "Detections returned by FCOS post-processing", {"backend": backend})
 
         self.info = FcosPostProcessInfo_t()
         self.info.height = input_h
@@ -98,36 +137,81 @@ class FcosPostProcessor:
         self.info.nms_top_k = 5
         self.info.is_pad_resize = 0
 
+        scales, layouts = [], []
+        # Keep the scale arrays alive: the C structs only hold raw pointers into them
+        self._scale_refs = []
+        for i in range(len(model_outputs)):
+            properties = model_outputs[i].properties
+            layouts.append(properties.layout)
+            if len(properties.scale_data) == 0:
+                scales.append(None)
+            else:
+                scale_data = np.ascontiguousarray(properties.scale_data, dtype=np.float32)
+                scales.append(scale_data)
+                self._scale_refs.append(scale_data)
+        self.decoder = NumpyFcosDecoder(input_w, input_h, scales, layouts)
+
+        self._model_outputs = model_outputs
+        self._scales = scales
+        self.output_tensors = None
+        if lib is not None:
+            self._build_tensors()
+
+    def _build_tensors(self):
+        """C tensor descriptors for libpostprocess, built once the library is loaded."""
+        model_outputs, scales = self._model_outputs, self._scales
         self.output_tensors = (hbDNNTensor_t * len(model_outputs))()
+        # Last buffer address bound to each output tensor; pointers are only
+        # rebound when the runtime hands us a different buffer
+        self._addresses = [None] * len(model_outputs)
 
         for i in range(len(model_outputs)):
             self.output_tensors[i].properties.tensorLayout = get_TensorLayout(model_outputs[i].properties.layout)
             
-            if (len(model_outputs[i].properties.scale_data) == 0):
+            if scales[i] is None:
                 self.output_tensors[i].properties.quantiType = 0
             else:
                 self.output_tensors[i].properties.quantiType = 2
-                scale_data_tmp = model_outputs[i].properties.scale_data.reshape(1, 1, 1, model_outputs[i].properties.shape[3])
-                self.output_tensors[i].properties.scale.scaleData = scale_data_tmp.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+                self.output_tensors[i].properties.scale.scaleData = scales[i].ctypes.data_as(ctypes.POINTER(ctypes.c_float))
 
             for j in range(len(model_outputs[i].properties.shape)):
                 self.output_tensors[i].properties.validShape.dimensionSize[j] = model_outputs[i].properties.shape[j]
                 self.output_tensors[i].properties.alignedShape.dimensionSize[j] = model_outputs[i].properties.shape[j]
 
     def process(self, outputs):
+        with self.process_seconds.time():
+            if self.backend == "numpy":
+                result = self.process_numpy(outputs)
+            else:
+                result = self.process_c(outputs)
+        self.detections.inc(len(result))
+        return result
+
+    def process_numpy(self, outputs):
+        info = self.info
+        return self.decoder.decode(
+            [output.buffer for output in outputs],
+            info.ori_width, info.ori_height,
+            score_threshold=info.score_threshold,
+            nms_threshold=info.nms_threshold,
+            nms_top_k=info.nms_top_k,
+            pad_resize=bool(info.is_pad_resize))
+
+    def _bind(self, index, output):
+        address = output.buffer.ctypes.data
+        if address != self._addresses[index]:
+            self.output_tensors[index].sysMem[0].virAddr = address
+            self._addresses[index] = address
+
+    def process_c(self, outputs):
         strides = [8, 16, 32, 64, 128]
         # Ensure we don't go out of bounds if model output count differs
         num_strides = min(len(strides), len(outputs) // 3)
         
         for i in range(num_strides):
-            if (self.output_tensors[i].properties.quantiType == 0):
-                self.output_tensors[i].sysMem[0].virAddr = ctypes.cast(outputs[i].buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_float)), ctypes.c_void_p)
-                self.output_tensors[i + 5].sysMem[0].virAddr = ctypes.cast(outputs[i + 5].buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_float)), ctypes.c_void_p)
-                self.output_tensors[i + 10].sysMem[0].virAddr = ctypes.cast(outputs[i + 10].buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_float)), ctypes.c_void_p)
-            else:
-                self.output_tensors[i].sysMem[0].virAddr = ctypes.cast(outputs[i].buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)), ctypes.c_void_p)
-                self.output_tensors[i + 5].sysMem[0].virAddr = ctypes.cast(outputs[i + 5].buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)), ctypes.c_void_p)
-                self.output_tensors[i + 10].sysMem[0].virAddr = ctypes.cast(outputs[i + 10].buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)), ctypes.c_void_p)
+            self._bind(i, outputs[i])
+            self._bind(i + 5, outputs[i + 5])
+            self._bind(i + 10, outputs[i + 10])
 
             libpostprocess.FcosdoProcess(self.output_tensors[i], self.output_tensors[i + 5], self.output_tensors[i + 10], ctypes.pointer(self.info), i)
 
@@ -144,9 +228,41 @@ class FcosPostProcessor:
                 json_str = result_str
             
             if not json_str:
-                return []
+                return np.empty(0, dtype=DETECTION_DTYPE)
                 
-            return json.loads(json_str)
+            return from_dicts(json.loads(json_str))
         except Exception as e:
             print(f"[ERROR] Failed to parse FCOS result: {e}")
-            return []
\ No newline at end of file
+            return np.empty(0, dtype=DETECTION_DTYPE)
+
+    def compare_backends(self, outputs, iou_threshold=0.9, score_tolerance=0.02):
+        """
+        Runs both backends on the same outputs and reports how well they agree.
+        A C detection counts as matched when the NumPy backend has a detection
+        of the same class with IoU >= iou_threshold and a score within score_tolerance.
+        """
+        if load_libpostprocess() is None:
+            raise ImportError("libpostprocess.so not loaded; nothing to compare against")
+        if self.output_tensors is None:
+            self._build_tensors()
+        reference = self.process_c(outputs)
+        candidate = self.process_numpy(outputs)
+        matched = 0
+        for det in reference:
+            same_class = candidate[candidate["id"] == det["id"]]
+            if len(same_class) == 0:
+                continue
+            a, b = det["bbox"], same_class["bbox"]
+            w = np.clip(np.minimum(a[2], b[:, 2]) - np.maximum(a[0], b[:, 0]), 0, None)
+            h = np.clip(np.minimum(a[3], b[:, 3]) - np.maximum(a[1], b[:, 1]), 0, None)
+            inter = w * h
+            union = (a[2] - a[0]) * (a[3] - a[1]) + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - inter
+            iou = inter / np.maximum(union, 1e-9)
+            close = (iou >= iou_threshold) & (np.abs(same_class["score"] - det["score"]) <= score_tolerance)
+            matched += int(close.any())
+        return {
+            "c_detections": len(reference),
+            "numpy_detections": len(candidate),
+            "matched": matched,
+            "parity": matched == len(reference) == len(candidate),
+        }
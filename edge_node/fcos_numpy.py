@@ -0,0 +1,146 @@
+import numpy as np
+
+STRIDES = (8, 16, 32, 64, 128)
+
+# Structured result returned by both FCOS post-processing backends
+DETECTION_DTYPE = np.dtype([
+    ("bbox", np.float32, (4,)),   # x1, y1, x2, y2 in original frame pixels
+    ("score", np.float32),
+    ("id", np.int32),             # Index into COCO_CLASSES
+])
+
+COCO_CLASSES = (
+    "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck", "boat",
+    "traffic light", "fire hydrant", "stop sign", "parking meter", "bench", "bird", "cat", "dog",
+    "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe", "backpack", "umbrella",
+    "handbag", "tie", "suitcase", "frisbee", "skis", "snowboard", "sports ball", "kite",
+    "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket", "bottle",
+    "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple", "sandwich", "orange",
+    "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair", "couch", "potted plant",
+    "bed", "dining table", "toilet", "tv", "laptop", "mouse", "remote", "keyboard", "cell phone",
+    "microwave", "oven", "toaster", "sink", "refrigerator", "book", "clock", "vase", "scissors",
+    "teddy bear", "hair drier", "toothbrush",
+)
+PERSON_CLASS_ID = 0
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def nms(boxes, scores, class_ids, iou_threshold, top_k):
+    """
+    Class-aware greedy NMS. Boxes of different classes are shifted apart so a
+    single pass never suppresses across classes. Returns kept indices, best first.
+    """
+    if len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    offset = class_ids.astype(np.float32)[:, None] * (boxes.max() + 1.0)
+    shifted = boxes + offset
+    x1, y1, x2, y2 = shifted[:, 0], shifted[:, 1], shifted[:, 2], shifted[:, 3]
+    areas = np.maximum(0.0, x2 - x1) * np.maximum(0.0, y2 - y1)
+
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size and len(keep) < top_k:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = w * h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class NumpyFcosDecoder:
+    """
+    Vectorized FCOS post-processing: per-stride score/box/centerness decode,
+    dequantization, class-aware NMS and top-k, with no native library.
+
+    Expects the 15 model outputs ordered as 5 classification maps, 5 box
+    regression maps (left/top/right/bottom distances in input pixels) and
+    5 centerness maps, each NHWC with a leading batch dimension of 1.
+    """
+    def __init__(self, input_w=512, input_h=512, scales=None, layouts=None):
+        self.input_w = input_w
+        self.input_h = input_h
+        # Per-output dequantization scales (None for float outputs)
+        self.scales = scales or [None] * (3 * len(STRIDES))
+        self.layouts = layouts or ["NHWC"] * (3 * len(STRIDES))
+        # Anchor point centers per stride, computed once
+        self.centers = {}
+        for stride in STRIDES:
+            rows, cols = input_h // stride, input_w // stride
+            ys, xs = np.meshgrid(np.arange(rows), np.arange(cols), indexing="ij")
+            self.centers[stride] = ((np.stack([xs, ys], axis=-1).reshape(-1, 2) + 0.5) * stride).astype(np.float32)
+
+    def _tensor(self, index, array):
+        """Returns output `index` as float32 (H*W, C), dequantized and NHWC."""
+        if self.layouts[index] == "NCHW":
+            array = np.transpose(array, (0, 2, 3, 1))
+        array = array.reshape(-1, array.shape[-1])
+        scale = self.scales[index]
+        if scale is not None:
+            return array.astype(np.float32) * scale
+        return array.astype(np.float32, copy=False)
+
+    def decode(self, arrays, ori_w, ori_h, score_threshold=0.5, nms_threshold=0.6,
+               nms_top_k=5, pad_resize=False):
+        """Decodes the raw output arrays into a DETECTION_DTYPE array in original frame pixels."""
+        boxes, scores, class_ids = [], [], []
+        levels = min(len(STRIDES), len(arrays) // 3)
+        for i in range(levels):
+            stride = STRIDES[i]
+            cls = self._tensor(i, arrays[i])
+            reg = self._tensor(i + 5, arrays[i + 5])
+            ctr = self._tensor(i + 10, arrays[i + 10])
+
+            # Sigmoid is monotonic, so pick the best class on the logits
+            best = cls.argmax(axis=1)
+            best_logit = cls[np.arange(len(best)), best]
+            score = np.sqrt(_sigmoid(best_logit) * _sigmoid(ctr[:, 0]))
+            hit = score > score_threshold
+            if not hit.any():
+                continue
+
+            points = self.centers[stride][:len(hit)][hit]
+            dist = reg[hit]
+            boxes.append(np.concatenate([points - dist[:, :2], points + dist[:, 2:4]], axis=1))
+            scores.append(score[hit])
+            class_ids.append(best[hit])
+
+        if not boxes:
+            return np.empty(0, dtype=DETECTION_DTYPE)
+        boxes = np.concatenate(boxes)
+        scores = np.concatenate(scores).astype(np.float32)
+        class_ids = np.concatenate(class_ids)
+
+        keep = nms(boxes, scores, class_ids, nms_threshold, nms_top_k)
+
+        # Map model input coordinates back onto the original frame
+        if pad_resize:
+            scale = max(ori_w / self.input_w, ori_h / self.input_h)
+            factors = np.array([scale, scale, scale, scale], dtype=np.float32)
+        else:
+            sx, sy = ori_w / self.input_w, ori_h / self.input_h
+            factors = np.array([sx, sy, sx, sy], dtype=np.float32)
+        limits = np.array([ori_w, ori_h, ori_w, ori_h], dtype=np.float32)
+
+        result = np.empty(len(keep), dtype=DETECTION_DTYPE)
+        result["bbox"] = np.clip(boxes[keep] * factors, 0, limits)
+        result["score"] = scores[keep]
+        result["id"] = class_ids[keep]
+        return result
+
+
+def from_dicts(detections):
+    """Converts libpostprocess-style [{'bbox', 'score', 'id', 'name'}, ...] into DETECTION_DTYPE."""
+    result = np.empty(len(detections), dtype=DETECTION_DTYPE)
+    for k, det in enumerate(detections):
+        name = det.get("name")
+        result[k]["bbox"] = det["bbox"]
+        result[k]["score"] = det["score"]
+        result[k]["id"] = COCO_CLASSES.index(name) if name in COCO_CLASSES else det.get("id", -1)
+    return result
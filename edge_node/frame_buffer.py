@@ -0,0 +1,188 @@
+import threading
+from bisect import bisect_left
+
+import cv2
+import numpy as np
+
+# cv2.imdecode flags for decoding at a reduced scale. JPEG can skip most of
+# the IDCT work at 1/2, 1/4 and 1/8 scale, which is much cheaper than a full
+# decode followed by a resize.
+DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+class LazyFrame:
+    """
+    Holds the compressed bytes of one image and decodes them only on demand.
+    The decoded image is cached, so repeated reads of the same frame are free.
+    """
+    __slots__ = ("data", "stamp", "_image", "_scale")
+
+    def __init__(self, data, stamp=0):
+        self.data = data
+        self.stamp = stamp
+        self._image = None
+        self._scale = None
+
+    @property
+    def is_decoded(self):
+        return self._image is not None
+
+    def decode(self, scale=1):
+        """
+        Returns the frame as a BGR image, downscaled by `scale` (1, 2, 4 or 8).
+        Returns None if the bytes cannot be decoded.
+        """
+        if self._image is not None and self._scale == scale:
+            return self._image
+        buf = np.frombuffer(self.data, dtype=np.uint8)
+        self._image = cv2.imdecode(buf, DECODE_FLAGS[scale])
+        self._scale = scale
+        return self._image
+
+
+def stamp_to_ns(stamp):
+    """Converts a builtin_interfaces/Time stamp to integer nanoseconds."""
+    return stamp.sec * 1_000_000_000 + stamp.nanosec
+
+
+class _StampView:
+    """Read-only, oldest-first sequence view of the ring buffer stamps (for bisect)."""
+    __slots__ = ("_store",)
+
+    def __init__(self, store):
+        self._store = store
+
+    def __len__(self):
+        return self._store._count
+
+    def __getitem__(self, i):
+        store = self._store
+        return store._stamps[(store._start + i) % store.capacity]
+
+
+class FrameStore:
+    """
+    Bounded ring buffer of recent compressed frames keyed by header stamp.
+    Insertion and eviction are O(1); finding the frame closest to a
+    detection stamp is a binary search, O(log n).
+    Also counts how many frames were received versus actually decoded.
+    Safe to fill and query from different executor threads.
+    """
+    def __init__(self, capacity=30, max_skew_ns=None, decode_scale=1):
+        if capacity < 1:
+            raise ValueError(f"capacity must be >= 1, got {capacity}")
+        if decode_scale not in DECODE_FLAGS:
+            raise ValueError(f"decode_scale must be one of {sorted(DECODE_FLAGS)}, got {decode_scale}")
+        self.capacity = capacity
+        self.max_skew_ns = max_skew_ns
+        self.decode_scale = decode_scale
+        self._stamps = [0] * capacity
+        self._frames = [None] * capacity
+        self._start = 0
+        self._count = 0
+        self._view = _StampView(self)
+        self._lock = threading.Lock()
+
+        self.frames_received = 0
+        self.frames_decoded = 0
+        self.frames_out_of_order = 0
+        self.matches = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def latest(self):
+        """The newest frame, or None if the buffer is empty."""
+        if self._count == 0:
+            return None
+        return self._frames[(self._start + self._count - 1) % self.capacity]
+
+    def put(self, data, stamp=0):
+        """Stores the compressed bytes of a new frame without decoding them."""
+        with self._lock:
+            self._put(data, stamp)
+
+    def _put(self, data, stamp):
+        self.frames_received += 1
+        if self._count and stamp < self._view[self._count - 1]:
+            # Stamps must stay sorted for the binary search; late frames are dropped
+            self.frames_out_of_order += 1
+            return
+        if self._count == self.capacity:
+            self._frames[self._start] = None
+            self._start = (self._start + 1) % self.capacity
+            self._count -= 1
+            self.evictions += 1
+        slot = (self._start + self._count) % self.capacity
+        self._stamps[slot] = stamp
+        self._frames[slot] = LazyFrame(data, stamp)
+        self._count += 1
+
+    def closest(self, stamp):
+        """
+        Returns the buffered frame whose stamp is closest to `stamp`, or None if
+        the buffer is empty or the closest frame is further away than max_skew_ns.
+        """
+        with self._lock:
+            return self._closest(stamp)
+
+    def _closest(self, stamp):
+        if self._count == 0:
+            self.misses += 1
+            return None
+        i = bisect_left(self._view, stamp)
+        best = None
+        best_skew = None
+        for j in (i - 1, i):
+            if 0 <= j < self._count:
+                skew = abs(self._view[j] - stamp)
+                if best_skew is None or skew < best_skew:
+                    best, best_skew = j, skew
+        if self.max_skew_ns is not None and best_skew > self.max_skew_ns:
+            self.misses += 1
+            return None
+        self.matches += 1
+        return self._frames[(self._start + best) % self.capacity]
+
+    def find(self, stamp):
+        """
+        Returns the buffered frame stamped exactly `stamp`, or None if there is
+        none (not received yet, or already evicted).
+        """
+        with self._lock:
+            i = bisect_left(self._view, stamp)
+            if i < self._count and self._view[i] == stamp:
+                return self._frames[(self._start + i) % self.capacity]
+            return None
+
+    def decode(self, frame):
+        """Decodes `frame` (once) at the store's decode scale."""
+        if not frame.is_decoded:
+            self.frames_decoded += 1
+        return frame.decode(self.decode_scale)
+
+    def decode_latest(self):
+        """Decodes the newest frame and returns it, or None if there is no frame."""
+        frame = self.latest
+        if frame is None:
+            return None
+        return self.decode(frame)
+
+    @property
+    def decodes_skipped(self):
+        return self.frames_received - self.frames_decoded
+
+    def scale_bbox(self, bbox):
+        """Maps a full-resolution (startX, startY, endX, endY) box onto the decoded image."""
+        if self.decode_scale == 1:
+            return bbox
+        s = self.decode_scale
+        return tuple(int(v) // s for v in bbox)
@@ -1,160 +1,209 @@
 import rclpy
 from rclpy.node import Node
+from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
+from rclpy.executors import MultiThreadedExecutor
 from sensor_msgs.msg import CompressedImage # Import the correct message type
 from ai_msgs.msg import PerceptionTargets
-from cv_bridge import CvBridge
 import cv2
 import time
-import datetime
-import requests
 import config
-from detector import TeaDetector
+from alerts import AlertDispatcher
+from camera import camera_configs
+from core import EdgeCore
+from debug_stream import DebugStream
+from metrics import STARTUP, MetricsServer, expose, unexpose
+from recording import RECORDED_SETTINGS, Recorder
+from runtime_config import ConfigWatcher, load_initial
 import sys
 
-class TeaTimeNode(Node):
+class TeaTimeNode(EdgeCore, Node):
+    """
+    ROS front end of EdgeCore: subscribes each camera's image and detection
+    topics while it is active and wakes it with timers at schedule and
+    cooldown transitions.
+    """
     def __init__(self):
-        super().__init__('tea_time_node')
+        with STARTUP.phase("ros_node"):
+            Node.__init__(self, 'tea_time_node')
         self.get_logger().info("[INFO] Starting TeaTime Edge Node (ROS2)...")
 
-        # Initialize Detector (we only need it for check_uniform_color)
-        self.detector = TeaDetector()
+        # Alerts are delivered from a background thread so a slow or offline
+        # display never stalls the executor (shared by all cameras)
+        with STARTUP.phase("alerts"):
+            alerts = AlertDispatcher.from_config(logger=self.get_logger()).start()
+
+        # Optional MJPEG debug stream (works in headless mode too)
+        debug_stream = None
+        if config.DEBUG_STREAM_ENABLED:
+            debug_stream = DebugStream(
+                host=config.DEBUG_STREAM_HOST,
+                port=config.DEBUG_STREAM_PORT,
+                max_fps=config.DEBUG_STREAM_MAX_FPS).start()
+            self.get_logger().info(f"[INFO] Debug stream on http://{config.DEBUG_STREAM_HOST}:{config.DEBUG_STREAM_PORT}/")
+
+        with STARTUP.phase("runtime_config"):
+            runtime = load_initial(config.RUNTIME_CONFIG_PATH, logger=self.get_logger())
+        with STARTUP.phase("core"):
+            EdgeCore.__init__(self, alerts, runtime=runtime, logger=self.get_logger(), debug_stream=debug_stream,
+                              recorder=self.make_recorder(runtime))
         self.get_logger().info("[INFO] Loaded color checker from TeaDetector.")
 
-        # Initialize CV Bridge and state
-        self.bridge = CvBridge()
-        self.latest_frame = None
-        self.last_alert_time = 0
-
-        # Subscriber for the Image stream
-        self.image_subscription = self.create_subscription(
-            CompressedImage,
-            config.ROS_IMAGE_TOPIC,
-            self.frame_callback,
-            10) # QoS profile depth
-        self.get_logger().info(f"[INFO] Subscribed to Image stream on topic: {config.ROS_IMAGE_TOPIC}")
-
-        # Subscriber for the Detection results
-        self.detection_subscription = self.create_subscription(
-            PerceptionTargets,
-            config.ROS_DETECTION_TOPIC,
-            self.detection_callback,
-            10)
-        self.get_logger().info(f"[INFO] Subscribed to PerceptionTargets on topic: {config.ROS_DETECTION_TOPIC}")
-
-
-    def is_time_in_window(self):
-        """Checks if current time is within the configured windows."""
-        now = datetime.datetime.now()
-        current_minutes = now.hour * 60 + now.minute
-        for (start_h, start_m, end_h, end_m) in config.TIME_WINDOWS:
-            start_minutes = start_h * 60 + start_m
-            end_minutes = end_h * 60 + end_m
-            if start_minutes <= current_minutes <= end_minutes:
-                return True
-        return False
-
-    def send_alert(self, confidence):
-        """Sends an HTTP POST alert to the IoT Node."""
-        url = f"http://{config.IOT_NODE_IP}:{config.IOT_NODE_PORT}{config.ALERT_ENDPOINT}"
-        payload = {
-            "event": "tea_service_detected",
-            "confidence": confidence,
-            "timestamp": datetime.datetime.now().isoformat()
-        }
-        try:
-            self.get_logger().info(f"[INFO] Sending alert to {url}...")
-            response = requests.post(url, json=payload, timeout=5)
-            if response.status_code == 200:
-                self.get_logger().info("[INFO] Alert sent successfully.")
-            else:
-                self.get_logger().warn(f"[WARN] Alert sent but server returned {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            self.get_logger().error(f"[ERROR] Failed to send alert: {e}")
-
-    def frame_callback(self, msg):
-        """Callback to store the latest image frame."""
-        try:
-            self.latest_frame = self.bridge.compressed_imgmsg_to_cv2(msg, "bgr8")
-        except Exception as e:
-            self.get_logger().error(f"Failed to convert image: {e}")
-
-    def detection_callback(self, msg):
-        """Callback function for processing detection results."""
-        # 1. Ensure we have a frame to process
-        if self.latest_frame is None:
-            self.get_logger().info("[STATUS] Waiting for image frame...")
-            return
-            
-        # Create a copy of the frame to draw on
-        frame_with_boxes = self.latest_frame.copy()
-
-        # 2. Time Check
-        if not self.is_time_in_window():
-            cv2.imshow("Live Feed", frame_with_boxes)
-            cv2.waitKey(1)
-            return
-
-        # 3. Cooldown Check
-        if time.time() - self.last_alert_time < config.COOLDOWN_SECONDS:
-            cv2.imshow("Live Feed", frame_with_boxes)
-            cv2.waitKey(1)
-            return
-
-        detected_tea_staff = False
-        
-        # 4. Process Detections from the message
-        for target in msg.targets:
-            if target.type == 'person':
-                # Find the bounding box for the body
-                for roi in target.rois:
-                    if roi.type == 'body':
-                        # Extract bounding box
-                        r = roi.rect
-                        # Convert from (x_offset, y_offset, width, height) to (startX, startY, endX, endY)
-                        bbox = (r.x_offset, r.y_offset, r.x_offset + r.width, r.y_offset + r.height)
-                        
-                        # Draw bounding box on the frame
-                        cv2.rectangle(frame_with_boxes, (bbox[0], bbox[1]), (bbox[2], bbox[3]), (0, 255, 0), 2)
-
-                        # We have a person, now check their uniform color
-                        is_uniform, percent, mask = self.detector.check_uniform_color(self.latest_frame, bbox)
-                        
-                        # Show the color mask for debugging
-                        if mask is not None:
-                            cv2.imshow("Color Mask", mask)
-
-                        if is_uniform:
-                            # Bypassing confidence from message as it's 0.0
-                            best_confidence = 1.0 
-                            self.get_logger().info(f"\n[DETECT] Potential Tea Staff detected! Purple %: {percent:.2f}%")
-                            detected_tea_staff = True
-                            break # Trigger on first valid detection
-                
-                if detected_tea_staff:
-                    break
-        
-        # Show the live feed with boxes
-        cv2.imshow("Live Feed", frame_with_boxes)
-        cv2.waitKey(1)
-
-        # 5. Trigger Alert
-        if detected_tea_staff:
-            self.send_alert(float(best_confidence))
-            self.last_alert_time = time.time()
-            self.get_logger().info(f"[INFO] Cooldown started for {config.COOLDOWN_SECONDS} seconds.")
+        # Periodic decode and delivery statistics
+        self.stats_timer = self.create_timer(config.STATS_LOG_INTERVAL_SECONDS, self.log_stats)
+
+        expose("teatime_alerts", self.alerts, ("coalesced",))
+        expose("teatime_alerts", self.alerts, ("pending", "spool_pending"), kind="gauge")
+        for endpoint in self.alerts.endpoints:
+            labels = {"endpoint": endpoint.url}
+            expose("teatime_alerts", endpoint, ("sent", "failed", "dropped", "retries", "spooled", "replayed"),
+                   labels=labels)
+            expose("teatime_alerts", endpoint, ("online", "average_latency"), kind="gauge", labels=labels)
+        self.metrics_server = None
+        if config.METRICS_SERVER_ENABLED:
+            self.metrics_server = MetricsServer(port=config.METRICS_PORT).start()
+            self.get_logger().info(f"[INFO] Metrics on http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+
+        # Image ingestion stays on the executor, one callback group per camera
+        # and stream so the multi-threaded executor can overlap them
+        for camera in self.cameras:
+            camera.image_group = MutuallyExclusiveCallbackGroup()
+            camera.detection_group = MutuallyExclusiveCallbackGroup()
+
+        # The time windows and the cooldown gate each camera: outside them its
+        # subscriptions are dropped and a one-shot timer wakes it at the next
+        # transition.
+        with STARTUP.phase("subscriptions"):
+            for camera in self.cameras:
+                self.update_gate(camera)
+
+        # Settings edited on site are picked up without a restart
+        self.config_watcher = None
+        if config.RUNTIME_CONFIG_PATH:
+            self.config_watcher = ConfigWatcher(
+                config.RUNTIME_CONFIG_PATH, self.apply_runtime, current=self.runtime,
+                interval=config.RUNTIME_CONFIG_POLL_SECONDS, logger=self.get_logger()).start()
+        self.get_logger().info(f"[STARTUP] {STARTUP.summary()}")
+
+    def make_recorder(self, runtime):
+        """A Recorder for RECORD_PATH (strftime pattern), or None when recording is off."""
+        if not config.RECORD_PATH:
+            return None
+        path = time.strftime(config.RECORD_PATH)
+        self.get_logger().info(f"[INFO] Recording frames and detections to {path}")
+        cameras = camera_configs()
+        return Recorder(path, [entry["name"] for entry in cameras], max_bytes=config.RECORD_MAX_BYTES,
+                        meta={"cameras_config": cameras,
+                              "runtime": runtime.values,
+                              "settings": {name: getattr(config, name) for name in RECORDED_SETTINGS}})
+
+    def subscribe(self, camera):
+        """Creates the image and detection subscriptions of a camera."""
+        if camera.image_subscription is None:
+            # Subscriber for the Image stream
+            camera.image_subscription = self.create_subscription(
+                CompressedImage,
+                camera.image_topic,
+                lambda msg: self.frame_callback(camera, msg),
+                10, # QoS profile depth
+                callback_group=camera.image_group)
+            self.get_logger().info(f"[INFO] [{camera.name}] Subscribed to Image stream on topic: {camera.image_topic}")
+
+        if camera.detection_subscription is None:
+            # Subscriber for the Detection results
+            camera.detection_subscription = self.create_subscription(
+                PerceptionTargets,
+                camera.detection_topic,
+                lambda msg: self.detection_callback(camera, msg),
+                10,
+                callback_group=camera.detection_group)
+            self.get_logger().info(
+                f"[INFO] [{camera.name}] Subscribed to PerceptionTargets on topic: {camera.detection_topic}")
+
+    def unsubscribe(self, camera):
+        """Drops a camera's subscriptions so no messages are delivered while suspended."""
+        if camera.image_subscription is not None:
+            self.destroy_subscription(camera.image_subscription)
+            camera.image_subscription = None
+        if camera.detection_subscription is not None:
+            self.destroy_subscription(camera.detection_subscription)
+            camera.detection_subscription = None
+
+    def resume(self, camera):
+        self.subscribe(camera)
+
+    def suspend(self, camera):
+        if config.SUSPEND_SUBSCRIPTIONS_WHEN_INACTIVE:
+            self.unsubscribe(camera)
+        else:
+            self.subscribe(camera)
+
+    def _update_gate(self, camera):
+        """
+        Resumes or suspends a camera for its current schedule and cooldown
+        state, then arms a one-shot timer for its next transition.
+        """
+        if camera.gate_timer is not None:
+            self.destroy_timer(camera.gate_timer)
+            camera.gate_timer = None
+
+        cooldown, in_window = super()._update_gate(camera)
+
+        # Wake up at the next schedule or cooldown transition (re-checked at
+        # least every GATE_MAX_SLEEP_SECONDS to tolerate clock adjustments)
+        delay = camera.schedule.seconds_until_transition()
+        if cooldown and in_window:
+            delay = cooldown if delay is None else min(delay, cooldown)
+        delay = config.GATE_MAX_SLEEP_SECONDS if delay is None else min(delay, config.GATE_MAX_SLEEP_SECONDS)
+        camera.gate_timer = self.create_timer(max(delay, 0.01), lambda: self.update_gate(camera))
+
+    def log_stats(self):
+        """Logs per-camera and aggregate throughput, decode, matching and delivery statistics."""
+        super().log_stats()
+        alerts = self.alerts
+        self.get_logger().info(
+            f"[STATS] Alerts sent: {alerts.sent}, failed: {alerts.failed}, dropped: {alerts.dropped}, "
+            f"retries: {alerts.retries}, pending: {alerts.pending}, coalesced: {alerts.coalesced}, "
+            f"spooled: {alerts.spool_pending}, avg delivery latency: {alerts.average_latency * 1000:.0f} ms")
+        if len(alerts.endpoints) > 1 or alerts.spool_pending:
+            for line in alerts.endpoint_summaries():
+                self.get_logger().info(f"[STATS] Display {line}")
+        if self.recorder is not None:
+            self.recorder.flush()
+            self.get_logger().info(
+                f"[STATS] Recorded {self.recorder.records} records, {self.recorder.bytes_written / 1e6:.1f} MB"
+                + (" (full, recording stopped)" if self.recorder.full else ""))
+
+    def destroy_node(self):
+        if self.config_watcher is not None:
+            self.config_watcher.stop()
+        self.stop()
+        self.alerts.stop()
+        unexpose(self.alerts, *self.alerts.endpoints)
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.debug_stream is not None:
+            self.debug_stream.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        super().destroy_node()
+
 
 
 def main(args=None):
     rclpy.init(args=args)
     tea_time_node = TeaTimeNode()
     try:
-        rclpy.spin(tea_time_node)
+        # Image ingestion, detection handling and timers run on separate threads
+        executor = MultiThreadedExecutor(num_threads=config.EXECUTOR_THREADS)
+        executor.add_node(tea_time_node)
+        executor.spin()
     except KeyboardInterrupt:
         print("\n[INFO] Stopping...")
     finally:
-        cv2.destroyAllWindows()
+        if not config.HEADLESS:
+            cv2.destroyAllWindows()
         tea_time_node.destroy_node()
         rclpy.shutdown()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
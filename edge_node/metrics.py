@@ -0,0 +1,532 @@
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import config
+
+# Latency histogram buckets in seconds (Prometheus "le" upper bounds)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class CallbackStats:
+    """
+    Thread-safe latency and backlog statistics for one callback.
+
+    Use track() as a context manager around the callback body. `lag` is the
+    time between a message's header stamp and the start of its callback: it
+    grows when messages sit in the subscription queue. `in_flight` counts
+    callbacks currently running. `clock` gives the wall time the lag is
+    measured against.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.clock = time.time
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def track(self, stamp_ns=None):
+        return _Tracked(self, stamp_ns)
+
+    def record(self, latency):
+        """Records one completed call measured elsewhere."""
+        with self._lock:
+            self.calls += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def _enter(self, stamp_ns):
+        lag = 0.0
+        if stamp_ns:
+            lag = max(0.0, self.clock() - stamp_ns / 1e9)
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+
+    def _exit(self, latency):
+        with self._lock:
+            self.in_flight -= 1
+            self.calls += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def summary(self):
+        with self._lock:
+            calls = self.calls or 1
+            return (f"{self.name}: calls {self.calls}, in flight {self.in_flight} (max {self.max_in_flight}), "
+                    f"latency avg {self.total_latency / calls * 1000:.1f} ms / max {self.max_latency * 1000:.1f} ms, "
+                    f"queue lag avg {self.total_lag / calls * 1000:.1f} ms / max {self.max_lag * 1000:.1f} ms")
+
+
+class _Tracked:
+    __slots__ = ("stats", "stamp_ns", "started")
+
+    def __init__(self, stats, stamp_ns):
+        self.stats = stats
+        self.stamp_ns = stamp_ns
+
+    def __enter__(self):
+        self.stats._enter(self.stamp_ns)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stats._exit(time.perf_counter() - self.started)
+        return False
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Counter:
+    """Monotonic counter."""
+    kind = "counter"
+
+    def __init__(self, registry, name, help, labels=None):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if self.registry.enabled:
+            with self._lock:
+                self.value += amount
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Gauge:
+    """
+    Value that can go up and down, or is read from `fn` at scrape time.
+    `owner` is the object `fn` reads from, if any.
+    """
+    kind = "gauge"
+
+    def __init__(self, registry, name, help, labels=None, fn=None, kind=None, owner=None):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.fn = fn
+        self.owner = owner
+        self.value = 0
+        if kind:
+            # Callback-backed counters (e.g. totals kept by other objects)
+            self.kind = kind
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        value = self.fn() if self.fn else self.value
+        yield self.name, self.labels, int(value) if isinstance(value, bool) else value
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (seconds)."""
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labels=None, buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        if not self.registry.enabled:
+            return
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the duration of its block (free when metrics are off)."""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _HistogramTimer(self)
+
+    def samples(self):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield self.name + "_bucket", dict(self.labels, le=le), cumulative
+        yield self.name + "_sum", self.labels, total
+        yield self.name + "_count", self.labels, count
+
+
+class _HistogramTimer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Registry:
+    """
+    Holds all metrics of the process and renders them in the Prometheus text
+    format. Asking twice for the same name and labels returns the same metric.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = cls(self, name, help, labels, **kwargs)
+                self._metrics[key] = metric
+            return metric
+
+    def counter(self, name, help, labels=None):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=None, fn=None, kind=None, owner=None):
+        """
+        With an `owner`, raises ValueError when another owner already has a
+        gauge of this name and labels (it would otherwise keep reporting the
+        first owner's values).
+        """
+        gauge = self._get(Gauge, name, help, labels, fn=fn, kind=kind, owner=owner)
+        if owner is not None and gauge.owner is not owner:
+            raise ValueError(f"{name}{_label_text(labels)} is already exported for another "
+                             f"{type(gauge.owner).__name__}; unexpose() it first or use distinct labels")
+        return gauge
+
+    def remove_owned(self, owner):
+        """Drops every metric whose `owner` is `owner`."""
+        with self._lock:
+            for key in [key for key, metric in self._metrics.items() if getattr(metric, "owner", None) is owner]:
+                del self._metrics[key]
+
+    def histogram(self, name, help, labels=None, buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        family = None
+        for metric in metrics:
+            if metric.name != family:
+                family = metric.name
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry(enabled=config.METRICS_ENABLED)
+
+
+def stage_histogram(stage, labels=None, registry=REGISTRY):
+    """Latency histogram for one processing stage (all stages share one metric family)."""
+    return registry.histogram("teatime_stage_seconds", "Wall time per processing stage in seconds",
+                              dict(labels or {}, stage=stage))
+
+
+def expose(prefix, obj, attributes, kind="counter", labels=None, registry=REGISTRY):
+    """
+    Exports numeric attributes (or properties) of `obj`, read at scrape time,
+    so statistics that objects already keep cost nothing extra per frame.
+    Raises ValueError when another object already exports one of the names
+    with the same labels.
+    """
+    for attr in attributes:
+        name = f"{prefix}_{attr}_total" if kind == "counter" else f"{prefix}_{attr}"
+        registry.gauge(name, f"{type(obj).__name__}.{attr}", labels,
+                       fn=lambda attr=attr: getattr(obj, attr), kind=kind, owner=obj)
+
+
+def unexpose(*objects, registry=REGISTRY):
+    """Stops exporting everything expose() registered for `objects`."""
+    for obj in objects:
+        registry.remove_owned(obj)
+
+
+class StartupTimer:
+    """
+    Where startup time goes: the duration of each named phase (phases may
+    run on background threads, e.g. model loading) and the time since
+    start at which milestones such as the first frame were reached. Both
+    are exported as teatime_startup_seconds. `started` is when this module
+    was first imported, which is early in every entry point.
+    """
+    def __init__(self, registry=REGISTRY):
+        self.registry = registry
+        self.started = time.monotonic()
+        self.phases = {}
+        self.milestones = {}
+        self._lock = threading.Lock()
+
+    def phase(self, name):
+        """Context manager timing one phase; a repeated name accumulates."""
+        return _Phase(self, name)
+
+    def _add(self, name, seconds):
+        with self._lock:
+            seconds = self.phases[name] = self.phases.get(name, 0.0) + seconds
+        self.registry.gauge("teatime_startup_seconds", "Startup phase durations and milestone times",
+                            {"phase": name}).set(seconds)
+
+    def milestone(self, name):
+        """Records the first time `name` is reached; returns the seconds since start then, or None after."""
+        with self._lock:
+            if name in self.milestones:
+                return None
+            elapsed = self.milestones[name] = time.monotonic() - self.started
+        self.registry.gauge("teatime_startup_seconds", "Startup phase durations and milestone times",
+                            {"milestone": name}).set(elapsed)
+        return elapsed
+
+    def summary(self):
+        with self._lock:
+            phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items())
+            milestones = ", ".join(f"{name} at {seconds:.2f} s" for name, seconds in self.milestones.items())
+        text = f"Startup after {time.monotonic() - self.started:.2f} s: {phases or 'no phases'}"
+        return f"{text}; {milestones}" if milestones else text
+
+
+class _Phase:
+    __slots__ = ("timer", "name", "started")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer._add(self.name, time.monotonic() - self.started)
+        return False
+
+
+STARTUP = StartupTimer()
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: samples every thread's Python stack at a fixed
+    interval and tallies them in collapsed ("a;b;c count") flame graph format.
+    Costs nothing until started and can be switched on and off at runtime.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = _Tally()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is None:
+            self.stacks.clear()
+            self.samples = 0
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.report()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]})")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class MetricsServer:
+    """
+    Local HTTP endpoint:
+      /metrics                 Prometheus text format
+      /profile?seconds=N       run the sampling profiler for N seconds, return collapsed stacks
+      /profile/start, /profile/stop   switch the profiler on/off (stop returns the stacks)
+    Listens on config.METRICS_HOST (loopback by default). Only one profile
+    runs at a time (409 otherwise) and none runs longer than
+    max_profile_seconds: a timed profile holds its request thread, so longer
+    requests are refused, and a started one is stopped when the time is up
+    (its stacks are kept for /profile/stop).
+    """
+    def __init__(self, registry=REGISTRY, host=None, port=9100, max_profile_seconds=None):
+        self.registry = registry
+        self.profiler = SamplingProfiler()
+        self.max_profile_seconds = config.PROFILE_MAX_SECONDS if max_profile_seconds is None else max_profile_seconds
+        # Held by whichever profile is running, timed or started
+        self._profile_lock = threading.Lock()
+        # The profile from /profile/start: its time limit, or its report once expired
+        self._started_lock = threading.Lock()
+        self._started_timer = None
+        self._started_report = None
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/metrics":
+                    self._reply(server.registry.render(), "text/plain; version=0.0.4")
+                elif url.path == "/profile":
+                    try:
+                        seconds = float(parse_qs(url.query).get("seconds", ["10"])[0])
+                    except ValueError:
+                        seconds = -1.0
+                    if not 0 < seconds <= server.max_profile_seconds:
+                        self.send_error(400, f"seconds must be in (0, {server.max_profile_seconds:g}]")
+                    elif server.profiler.running or not server._profile_lock.acquire(blocking=False):
+                        self.send_error(409, "A profile is already running")
+                    else:
+                        try:
+                            server.profiler.start()
+                            time.sleep(seconds)
+                            report = server.profiler.stop()
+                        finally:
+                            server._profile_lock.release()
+                        self._reply(report)
+                elif url.path == "/profile/start":
+                    if server.start_profile():
+                        self._reply(f"profiler started, stops after {server.max_profile_seconds:g} s\n")
+                    else:
+                        self.send_error(409, "A profile is already running")
+                elif url.path == "/profile/stop":
+                    report = server.stop_profile()
+                    if report is None:
+                        self.send_error(409, "No profile was started with /profile/start")
+                    else:
+                        self._reply(report)
+                else:
+                    self.send_error(404)
+
+            def _reply(self, text, content_type="text/plain"):
+                body = text.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((config.METRICS_HOST if host is None else host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def start_profile(self):
+        """Starts an open-ended profile, limited to max_profile_seconds. False if one is running."""
+        if self.profiler.running or not self._profile_lock.acquire(blocking=False):
+            return False
+        with self._started_lock:
+            self._started_report = None
+            self.profiler.start()
+            self._started_timer = threading.Timer(self.max_profile_seconds, self._finish_profile)
+            self._started_timer.daemon = True
+            self._started_timer.start()
+        return True
+
+    def _finish_profile(self):
+        """Stops the started profile; returns True if there was one running."""
+        with self._started_lock:
+            if self._started_timer is None:
+                return False
+            self._started_timer.cancel()
+            self._started_timer = None
+            self._started_report = self.profiler.stop()
+            self._profile_lock.release()
+            return True
+
+    def stop_profile(self):
+        """
+        Stops the profile from start_profile() and returns its stacks (also
+        once it has stopped on its own), or None if there is none.
+        """
+        self._finish_profile()
+        with self._started_lock:
+            report, self._started_report = self._started_report, None
+        return report
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._finish_profile()
+        self.profiler.stop()
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,78 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap scene-change test run before person detection.
+
+    Each frame is shrunk to `width` pixels wide, converted to grayscale and
+    compared against a running-average background. The frame counts as
+    moving when more than `min_changed` of its pixels differ from the
+    background by over `threshold` gray levels. Even in a static scene a
+    frame is let through at least every `heartbeat_seconds`, so a person
+    who walked in and stopped is still picked up by the next inference.
+    """
+    def __init__(self, width=64, threshold=15, min_changed=0.005, heartbeat_seconds=2.0, learning_rate=0.05):
+        self.width = width
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.heartbeat_seconds = heartbeat_seconds
+        self.learning_rate = learning_rate
+        self._background = None
+        self._small = None
+        self._gray = None
+        self._diff = None
+        self._last_pass = None
+
+        # Statistics
+        self.frames_seen = 0
+        self.frames_skipped = 0
+        self.heartbeats = 0
+        self.changed_fraction = 0.0
+
+    def reset(self):
+        """Forgets the background; the next frame always passes."""
+        self._background = None
+
+    def check(self, frame, now=None):
+        """Returns True when `frame` should go through detection, False when it can be skipped."""
+        now = time.monotonic() if now is None else now
+        self.frames_seen += 1
+
+        h, w = frame.shape[:2]
+        size = (self.width, max(1, h * self.width // w))
+        if self._small is None or self._small.shape[:2] != size[::-1]:
+            self._small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self._gray = np.empty(size[::-1], dtype=np.uint8)
+            self._diff = np.empty(size[::-1], dtype=np.uint8)
+            self._background = None
+        # Shrinking first keeps the per-frame cost low. A strided view drops
+        # most pixels for free; area averaging over the rest (at most 4x the
+        # target size) still smooths out sensor noise.
+        step = max(1, w // (self.width * 4))
+        cv2.resize(frame[::step, ::step], size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+        if self._background is None:
+            self._background = self._gray.astype(np.float32)
+            self.changed_fraction = 1.0
+            self._last_pass = now
+            return True
+
+        cv2.absdiff(self._gray, cv2.convertScaleAbs(self._background), dst=self._diff)
+        changed = cv2.countNonZero(cv2.threshold(self._diff, self.threshold, 255, cv2.THRESH_BINARY)[1])
+        self.changed_fraction = changed / self._diff.size
+        cv2.accumulateWeighted(self._gray, self._background, self.learning_rate)
+
+        if self.changed_fraction > self.min_changed:
+            self._last_pass = now
+            return True
+        if now - self._last_pass >= self.heartbeat_seconds:
+            self._last_pass = now
+            self.heartbeats += 1
+            return True
+        self.frames_skipped += 1
+        return False
@@ -0,0 +1,116 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class NV12Preprocessor:
+    """
+    Resizes BGR frames to the model input size and converts them to NV12
+    using buffers allocated once at construction.
+
+    The I420 conversion is written straight into the NV12 output buffer, so
+    the Y plane is never copied; only the chroma planes are interleaved in
+    place through a small scratch buffer. The returned array is reused by
+    the next call, so it must be consumed (e.g. by forward()) before then.
+
+    With letterbox=True the frame is scaled to fit while keeping its aspect
+    ratio and padded on the right/bottom with pad_value, matching the FCOS
+    post-processing "pad resize" convention; `scale` describes the mapping
+    of the last frame.
+    """
+    def __init__(self, width, height, letterbox=False, pad_value=127):
+        if width % 2 or height % 2:
+            raise ValueError(f"NV12 needs even dimensions, got {width}x{height}")
+        self.width = width
+        self.height = height
+        self.letterbox = letterbox
+        self.pad_value = pad_value
+
+        area = width * height
+        self._resized = np.empty((height, width, 3), dtype=np.uint8)
+        self.nv12 = np.empty(area * 3 // 2, dtype=np.uint8)
+        self._i420 = self.nv12.reshape((height * 3 // 2, width))
+        self._chroma = self.nv12[area:]
+        self._uv = self._chroma.reshape((area // 4, 2))
+        self._scratch = np.empty(area // 2, dtype=np.uint8)
+        self._quarter = area // 4
+
+        self.scale = 1.0
+        self._last_shape = None
+
+    def _fit(self, image):
+        """Resizes (or letterboxes) `image` into the preallocated model-size buffer."""
+        h, w = image.shape[:2]
+        if not self.letterbox:
+            if (w, h) == (self.width, self.height):
+                return image
+            cv2.resize(image, (self.width, self.height), dst=self._resized)
+            return self._resized
+
+        if self._last_shape != (h, w):
+            # Geometry only changes with the input size; repaint the padding then
+            self.scale = min(self.width / w, self.height / h)
+            new_w = min(self.width, int(round(w * self.scale)))
+            new_h = min(self.height, int(round(h * self.scale)))
+            self._resized[...] = self.pad_value
+            self._inner = self._resized[:new_h, :new_w]
+            self._last_shape = (h, w)
+        cv2.resize(image, (self._inner.shape[1], self._inner.shape[0]), dst=self._inner)
+        return self._resized
+
+    def __call__(self, image):
+        """Returns the NV12 bytes of `image` at model resolution (a reused buffer)."""
+        fitted = self._fit(image)
+        cv2.cvtColor(fitted, cv2.COLOR_BGR2YUV_I420, dst=self._i420)
+        # I420 stores U then V planes; NV12 interleaves them as UVUV...
+        np.copyto(self._scratch, self._chroma)
+        self._uv[:, 0] = self._scratch[:self._quarter]
+        self._uv[:, 1] = self._scratch[self._quarter:]
+        return self.nv12
+
+    def to_frame_coords(self, bbox):
+        """Maps a letterboxed model-input box back onto the original frame."""
+        if not self.letterbox:
+            return bbox
+        return tuple(v / self.scale for v in bbox)
+
+
+def _legacy_preprocess(image, width, height):
+    # The original RDKDetector.preprocess: resize + bgr2nv12_opencv
+    resized = cv2.resize(image, (width, height))
+    area = height * width
+    yuv420p = cv2.cvtColor(resized, cv2.COLOR_BGR2YUV_I420).reshape((area * 3 // 2,))
+    y = yuv420p[:area]
+    uv_planar = yuv420p[area:].reshape((2, area // 4))
+    uv_packed = uv_planar.transpose((1, 0)).reshape((area // 2,))
+    nv12 = np.zeros_like(yuv420p)
+    nv12[:area] = y
+    nv12[area:] = uv_packed
+    return nv12
+
+
+def benchmark(width=512, height=512, iterations=200):
+    """Compares the preallocated path against the original preprocessing on synthetic frames."""
+    rng = np.random.default_rng(0)
+    preprocessor = NV12Preprocessor(width, height)
+    for frame_w, frame_h in ((640, 480), (1920, 1080)):
+        frame = rng.integers(0, 256, (frame_h, frame_w, 3), dtype=np.uint8)
+        if not np.array_equal(preprocessor(frame), _legacy_preprocess(frame, width, height)):
+            raise AssertionError("NV12Preprocessor output differs from the original preprocessing")
+        timings = {}
+        for name, fn in (("original", lambda: _legacy_preprocess(frame, width, height)),
+                         ("preallocated", lambda: preprocessor(frame))):
+            fn()
+            start = time.perf_counter()
+            for _ in range(iterations):
+                fn()
+            timings[name] = (time.perf_counter() - start) / iterations * 1000
+        print(f"[BENCH] {frame_w}x{frame_h} -> {width}x{height}: original {timings['original']:.3f} ms, "
+              f"preallocated {timings['preallocated']:.3f} ms "
+              f"({timings['original'] / timings['preallocated']:.2f}x)")
+
+
+if __name__ == "__main__":
+    import config
+    benchmark(config.RDK_MODEL_WIDTH, config.RDK_MODEL_HEIGHT)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Standalone TeaTime runner: cv2.VideoCapture -> RDK BPU inference -> uniform
+check + alert, without ROS.
+
+The three stages run on their own threads and are connected by single-slot
+"latest wins" queues, so capturing frame N+1 overlaps inference of frame N.
+A slow stage drops stale frames instead of building a backlog. The BPU
+model loads in the background (MODEL_LOAD_IN_BACKGROUND): capture starts
+at once and inference begins on the newest frame when the model is ready.
+
+Usage: python pipeline.py [video source]   (defaults to config.VIDEO_SOURCE)
+"""
+
+import sys
+import threading
+import time
+
+import cv2
+import config
+from alerts import AlertDispatcher, make_alert_payload
+from detector import TeaDetector
+from metrics import REGISTRY, STARTUP, CallbackStats, MetricsServer, expose, stage_histogram
+from motion import MotionGate
+from rdk_adapter import RDKDetector
+from runtime_config import ConfigWatcher, load_initial
+from tracker import Tracker
+
+
+class LatestQueue:
+    """Single-slot hand-off between stages: put() replaces any unread item."""
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Returns the newest item, or None once closed (or on timeout)."""
+        with self._cond:
+            if self._item is None and not self._closed:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class Pipeline:
+    def __init__(self, source=config.VIDEO_SOURCE, detector=None, color_checker=None, alerts=None):
+        self.source = source
+        # First, so a model loading in the background overlaps the rest
+        with STARTUP.phase("detector"):
+            # The pipeline's own motion gate (below) runs before inference
+            self.detector = detector or RDKDetector(background=config.MODEL_LOAD_IN_BACKGROUND, motion_gating=False)
+        with STARTUP.phase("runtime_config"):
+            self.runtime = load_initial(config.RUNTIME_CONFIG_PATH)
+        with STARTUP.phase("color_engine"):
+            self.color_checker = color_checker or TeaDetector(
+                workers=config.COLOR_WORKERS,
+                pixel_budget=self.runtime.pixel_budget,
+                confidence_z=self.runtime.confidence_z,
+                classifier=self.runtime.classifier)
+        self.schedule = self.runtime.schedule
+        with STARTUP.phase("alerts"):
+            self.alerts = alerts or AlertDispatcher.from_config()
+
+        self.to_infer = LatestQueue()
+        self.to_classify = LatestQueue()
+        self.stop_event = threading.Event()
+        self.last_alert_time = 0
+        self.tracker = Tracker(**self.runtime.tracking)
+
+        self.capture_stats = CallbackStats("capture")
+        self.infer_stats = CallbackStats("inference")
+        self.classify_stats = CallbackStats("classify")
+        self.end_to_end = CallbackStats("end_to_end")
+        self.frames_captured = 0
+        self.frames_completed = 0
+        # Frames of a static scene are dropped before inference and color checks
+        self.motion_gate = None
+        if config.MOTION_GATE_ENABLED:
+            self.motion_gate = MotionGate(
+                width=config.MOTION_GATE_WIDTH,
+                threshold=config.MOTION_PIXEL_THRESHOLD,
+                min_changed=config.MOTION_MIN_CHANGED_FRACTION,
+                heartbeat_seconds=config.MOTION_HEARTBEAT_SECONDS,
+                learning_rate=config.MOTION_BACKGROUND_RATE)
+
+        self.capture_seconds = stage_histogram("capture")
+        self.color_check_seconds = stage_histogram("color_check")
+        self.end_to_end_seconds = stage_histogram("end_to_end")
+        self.active_gauge = REGISTRY.gauge("teatime_pipeline_active", "1 while inside a time window and outside the cooldown")
+        expose("teatime_pipeline", self, ("frames_captured", "frames_completed"))
+        if self.motion_gate is not None:
+            expose("teatime_motion", self.motion_gate, ("frames_seen", "frames_skipped", "heartbeats"))
+        expose("teatime_tracker", self.tracker, ("checks", "cache_hits", "tracks_created"))
+        expose("teatime_queue", self.to_infer, ("dropped",), labels={"queue": "infer"})
+        expose("teatime_queue", self.to_classify, ("dropped",), labels={"queue": "classify"})
+        expose("teatime_alerts", self.alerts, ("sent", "failed", "dropped", "retries", "coalesced"))
+        expose("teatime_alerts", self.alerts, ("pending", "spool_pending"), kind="gauge")
+
+    def apply_runtime(self, runtime):
+        """Switches the color check, schedule, cooldown and tracker to a reloaded RuntimeConfig."""
+        self.runtime = runtime
+        self.color_checker.apply(runtime)
+        self.schedule = runtime.schedule
+        self.tracker.configure(**runtime.tracking)
+
+    def active(self):
+        """True inside a time window and outside the cooldown."""
+        return self.suppression() is None
+
+    def suppression(self):
+        """Why work is currently skipped ("cooldown" or "time_window"), or None when active."""
+        if time.time() - self.last_alert_time < self.runtime.cooldown_seconds:
+            return "cooldown"
+        if not self.schedule.is_active():
+            return "time_window"
+        return None
+
+    def capture_stage(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            print(f"[ERROR] Could not open video source {self.source!r}")
+            self.stop_event.set()
+        try:
+            while not self.stop_event.is_set():
+                reason = self.suppression()
+                self.active_gauge.set(int(reason is None))
+                if reason is not None:
+                    REGISTRY.counter("teatime_suppressed_total", "Work skipped by the time window or cooldown gate",
+                                     {"reason": reason, "what": "capture_wait"}).inc()
+                    # Nothing to do until the next window or the end of the cooldown
+                    self.stop_event.wait(min(1.0, self.schedule.seconds_until_transition() or 1.0))
+                    continue
+                with self.capture_stats.track(), self.capture_seconds.time():
+                    ok, frame = cap.read()
+                if not ok:
+                    print("[INFO] Video source exhausted.")
+                    break
+                if not self.frames_captured:
+                    STARTUP.milestone("first_frame")
+                self.frames_captured += 1
+                if self.motion_gate is not None and not self.motion_gate.check(frame):
+                    continue
+                self.to_infer.put((time.time_ns(), frame))
+        finally:
+            cap.release()
+            self.to_infer.close()
+
+    def infer_stage(self):
+        try:
+            # Frames keep being captured (the newest one waits in to_infer)
+            # while the model is still loading
+            while not self.detector.wait_ready(timeout=1.0):
+                if self.stop_event.is_set():
+                    return
+            if self.detector.load_error is not None:
+                print(f"[ERROR] Detector failed to load ({self.detector.load_error}); stopping.")
+                self.stop_event.set()
+                return
+            while not self.stop_event.is_set():
+                item = self.to_infer.get(timeout=1.0)
+                if item is None:
+                    if self.to_infer.closed:
+                        break
+                    continue
+                captured_ns, frame = item
+                with self.infer_stats.track(captured_ns):
+                    # Detached outputs stay valid while the next frame is inferred
+                    outputs = self.detector.infer(frame, detach=True)
+                if STARTUP.milestone("first_inference") is not None:
+                    print(f"[STARTUP] {STARTUP.summary()}")
+                self.to_classify.put((captured_ns, frame, outputs))
+        finally:
+            self.to_classify.close()
+
+    def classify_stage(self):
+        while not self.stop_event.is_set():
+            item = self.to_classify.get(timeout=1.0)
+            if item is None:
+                if self.to_classify.closed:
+                    break
+                continue
+            captured_ns, frame, outputs = item
+            with self.classify_stats.track(captured_ns):
+                detections = self.detector.postprocess(outputs, frame.shape)
+                self.check_and_alert(frame, detections)
+            self.frames_completed += 1
+            latency = time.time() - captured_ns / 1e9
+            self.end_to_end.record(latency)
+            self.end_to_end_seconds.observe(latency)
+        self.stop_event.set()
+
+    def check_and_alert(self, frame, detections):
+        detections = [(bbox, score) for bbox, score in detections if score >= self.runtime.confidence_threshold]
+        if not self.active():
+            return
+        # Cached per-person verdicts; only new, moved, stale or undecided tracks are re-checked
+        tracks = self.tracker.update([bbox for bbox, _ in detections])
+        to_check = [track for track in tracks if self.tracker.needs_check(track)]
+        if to_check:
+            with self.color_check_seconds.time():
+                results, _ = self.color_checker.check_uniform_colors(
+                    frame, [track.bbox for track in to_check], with_mask=False)
+            for track, result in zip(to_check, results):
+                self.tracker.record(track, result)
+        for (bbox, score), track in zip(detections, tracks):
+            profile = self.tracker.vote(track)
+            if profile is not None:
+                print(f"[DETECT] Potential {profile} detected! Uniform color %: {track.verdict[1]:.2f}%")
+                self.alerts.submit(make_alert_payload(float(score), profile, self.schedule.now()))
+                self.last_alert_time = time.time()
+                self.tracker.clear()
+                print(f"[INFO] Cooldown started for {self.runtime.cooldown_seconds} seconds.")
+                break # Trigger on first valid detection
+
+    def log_stats(self, elapsed):
+        fps = self.frames_completed / elapsed if elapsed else 0.0
+        print(f"[STATS] End-to-end FPS: {fps:.1f} ({self.frames_completed} of {self.frames_captured} frames; "
+              f"dropped before inference: {self.to_infer.dropped}, before classify: {self.to_classify.dropped})")
+        if self.motion_gate is not None:
+            print(f"[STATS] Static frames skipped: {self.motion_gate.frames_skipped} of {self.motion_gate.frames_seen} "
+                  f"(heartbeats: {self.motion_gate.heartbeats})")
+        print(f"[STATS] Color checks: {self.tracker.checks}, cached verdicts reused: {self.tracker.cache_hits}")
+        for line in self.alerts.endpoint_summaries():
+            print(f"[STATS] Display {line}")
+        for stats in (self.capture_stats, self.infer_stats, self.classify_stats, self.end_to_end):
+            print(f"[STATS] {stats.summary()}")
+
+    def run(self):
+        self.alerts.start()
+        metrics_server = None
+        if config.METRICS_SERVER_ENABLED:
+            metrics_server = MetricsServer(port=config.METRICS_PORT).start()
+            print(f"[INFO] Metrics on http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+        config_watcher = None
+        if config.RUNTIME_CONFIG_PATH:
+            config_watcher = ConfigWatcher(config.RUNTIME_CONFIG_PATH, self.apply_runtime, current=self.runtime,
+                                           interval=config.RUNTIME_CONFIG_POLL_SECONDS).start()
+        threads = [
+            threading.Thread(target=stage, name=stage.__name__, daemon=True)
+            for stage in (self.capture_stage, self.infer_stage, self.classify_stage)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        print(f"[STARTUP] {STARTUP.summary()}")
+        try:
+            while not self.stop_event.wait(config.STATS_LOG_INTERVAL_SECONDS):
+                self.log_stats(time.monotonic() - started)
+        except KeyboardInterrupt:
+            print("\n[INFO] Stopping...")
+        finally:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join(timeout=2.0)
+            self.log_stats(time.monotonic() - started)
+            self.alerts.stop()
+            if config_watcher is not None:
+                config_watcher.stop()
+            if metrics_server is not None:
+                metrics_server.stop()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    source = config.VIDEO_SOURCE
+    if argv:
+        source = int(argv[0]) if argv[0].isdigit() else argv[0]
+    Pipeline(source).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+# Record kinds
+META = 0        # JSON: cameras, settings and runtime config at the start of a recording
+FRAME = 1       # Compressed image bytes as received
+DETECTIONS = 2  # int32 (x1, y1, x2, y2, track_id) per person box, track_id 0 = untracked
+GATE = 3        # One byte: 1 when the camera became active, 0 when it was suspended
+CONFIG = 4      # JSON: runtime config values after a reload
+ALERT = 5       # JSON: the alert raised while processing the detections with this stamp
+MATCH = 6       # int64 stamp of the frame the detections with this stamp were matched with;
+                # count 0 and no payload when no frame was within the skew
+
+MAGIC = b"TTR1"
+# Every record: magic, kind, camera index, box count, message stamp (ns),
+# wall-clock receipt time (ns), payload length
+RECORD_HEADER = struct.Struct("<4sBBHqqI")
+# Sidecar index: one fixed-size entry per record, so a reader can find and
+# filter records without touching the payloads
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("kind", "u1"), ("camera", "u1"), ("count", "<u2"),
+                        ("length", "<u4"), ("stamp", "<i8"), ("wall", "<i8")])
+BOX_DTYPE = np.dtype("<i4")
+STAMP = struct.Struct("<q")
+# config.py settings outside the runtime config that change what a replay
+# decides; stored in the META record and restored by the replayer
+RECORDED_SETTINGS = ("FRAME_DECODE_SCALE", "FRAME_MATCH_MAX_SKEW_MS", "FRAME_BUFFER_SIZE")
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+class Recorder:
+    """
+    Appends what the node saw, in the order it was handled, to a recording.
+
+    The data file holds self-describing records (RECORD_HEADER + payload);
+    the sidecar `.idx` file holds one INDEX_DTYPE entry per record. Both are
+    append-only and written through large buffers, so recording costs a
+    memcpy per message. Recording stops once the data file would exceed
+    `max_bytes`. All methods are thread-safe.
+    """
+    def __init__(self, path, camera_names, meta=None, max_bytes=None, clock=time.time_ns):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.cameras = {name: i for i, name in enumerate(camera_names)}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._data = open(path, "wb", buffering=1 << 20)
+        self._index = open(index_path(path), "wb", buffering=1 << 16)
+        self._offset = 0
+        self.records = 0
+        self.full = False
+        self._append(META, 0, 0, json.dumps(dict(meta or {}, cameras=list(camera_names))).encode())
+
+    def _append(self, kind, camera, stamp, payload, count=0):
+        with self._lock:
+            if self._data is None or self.full:
+                return
+            size = RECORD_HEADER.size + len(payload)
+            if self.max_bytes is not None and self._offset + size > self.max_bytes:
+                self.full = True
+                return
+            wall = self.clock()
+            self._data.write(RECORD_HEADER.pack(MAGIC, kind, camera, count, stamp, wall, len(payload)))
+            self._data.write(payload)
+            entry = np.array([(self._offset, kind, camera, count, len(payload), stamp, wall)], dtype=INDEX_DTYPE)
+            self._index.write(entry.tobytes())
+            self._offset += size
+            self.records += 1
+
+    def frame(self, camera_name, stamp, data):
+        self._append(FRAME, self.cameras[camera_name], stamp, data)
+
+    def detections(self, camera_name, stamp, bboxes, track_ids):
+        boxes = np.array([(*bbox, track_id or 0) for bbox, track_id in zip(bboxes, track_ids)],
+                         dtype=BOX_DTYPE).reshape(-1, 5)
+        self._append(DETECTIONS, self.cameras[camera_name], stamp, boxes.tobytes(), count=len(boxes))
+
+    def match(self, camera_name, stamp, frame_stamp):
+        """The frame (by stamp, None for none) that detections stamped `stamp` were matched with."""
+        if frame_stamp is None:
+            self._append(MATCH, self.cameras[camera_name], stamp, b"")
+        else:
+            self._append(MATCH, self.cameras[camera_name], stamp, STAMP.pack(frame_stamp), count=1)
+
+    def gate(self, camera_name, active):
+        self._append(GATE, self.cameras[camera_name], 0, b"\x01" if active else b"\x00")
+
+    def config(self, values):
+        self._append(CONFIG, 0, 0, json.dumps(values).encode())
+
+    def alert(self, camera_name, stamp, profile, percentage):
+        self._append(ALERT, self.cameras[camera_name], stamp,
+                     json.dumps({"profile": profile, "percentage": percentage}).encode())
+
+    @property
+    def bytes_written(self):
+        return self._offset
+
+    def flush(self):
+        with self._lock:
+            if self._data is not None:
+                self._data.flush()
+                self._index.flush()
+
+    def close(self):
+        with self._lock:
+            if self._data is not None:
+                self._data.close()
+                self._index.close()
+                self._data = self._index = None
+
+
+class Record:
+    """One record of a Recording; `payload` is a zero-copy view into the mapped file."""
+    __slots__ = ("kind", "camera", "stamp", "wall", "count", "payload")
+
+    def __init__(self, kind, camera, stamp, wall, count, payload):
+        self.kind = kind
+        self.camera = camera
+        self.stamp = stamp
+        self.wall = wall
+        self.count = count
+        self.payload = payload
+
+    def boxes(self):
+        """DETECTIONS: ([(x1, y1, x2, y2), ...], [track_id or None, ...])."""
+        rows = np.frombuffer(self.payload, dtype=BOX_DTYPE).reshape(-1, 5)
+        return ([tuple(int(v) for v in row[:4]) for row in rows],
+                [int(row[4]) or None for row in rows])
+
+    def frame_stamp(self):
+        """MATCH: stamp of the matched frame, or None when there was none."""
+        return STAMP.unpack_from(self.payload)[0] if self.count else None
+
+    def json(self):
+        return json.loads(bytes(self.payload))
+
+
+class Recording:
+    """
+    Read-only, memory-mapped view of a recording.
+
+    Uses the sidecar index when it is present and consistent, and otherwise
+    rebuilds it by scanning the data file. A record cut short by a crash is
+    ignored. Records are read in place from the mapping, so iterating costs
+    no copies and no syscalls.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < RECORD_HEADER.size:
+            raise ValueError(f"{path} is not a recording (too short)")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self.index = self._load_index(size)
+        if not len(self.index) or self.index[0]["kind"] != META:
+            raise ValueError(f"{path} is not a recording (no header record)")
+        self.meta = self[0].json()
+        self.cameras = self.meta["cameras"]
+
+    def _load_index(self, size):
+        index = np.empty(0, dtype=INDEX_DTYPE)
+        try:
+            with open(index_path(self.path), "rb") as f:
+                raw = f.read()
+            index = np.frombuffer(raw[:len(raw) - len(raw) % INDEX_DTYPE.itemsize], dtype=INDEX_DTYPE)
+        except OSError:
+            pass
+        # Entries whose data did not reach the disk are dropped
+        end = index["offset"] + RECORD_HEADER.size + index["length"]
+        index = index[end <= size]
+        if len(index) and self._header(int(index[-1]["offset"])) is None:
+            index = index[:0]
+        # Records whose index entries did not reach the disk are found by scanning
+        start = int(end[len(index) - 1]) if len(index) else 0
+        return np.concatenate([index, self._scan(size, start)])
+
+    def _header(self, offset):
+        if offset + RECORD_HEADER.size > len(self._map):
+            return None
+        fields = RECORD_HEADER.unpack_from(self._map, offset)
+        return fields if fields[0] == MAGIC else None
+
+    def _scan(self, size, offset=0):
+        entries = []
+        while True:
+            fields = self._header(offset)
+            if fields is None:
+                break
+            _, kind, camera, count, stamp, wall, length = fields
+            if offset + RECORD_HEADER.size + length > size:
+                break
+            entries.append((offset, kind, camera, count, length, stamp, wall))
+            offset += RECORD_HEADER.size + length
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        entry = self.index[i]
+        start = int(entry["offset"]) + RECORD_HEADER.size
+        return Record(int(entry["kind"]), int(entry["camera"]), int(entry["stamp"]), int(entry["wall"]),
+                      int(entry["count"]), self._view[start:start + int(entry["length"])])
+
+    def __iter__(self):
+        for i in range(len(self.index)):
+            yield self[i]
+
+    def count(self, kind):
+        return int((self.index["kind"] == kind).sum())
+
+    @property
+    def duration(self):
+        """Seconds between the first and the last record."""
+        return (int(self.index["wall"][-1]) - int(self.index["wall"][0])) / 1e9
+
+    def close(self):
+        """Unmaps the file, or leaves that to the last Record payload still referenced."""
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+        self._file.close()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Replays a recording made with RECORD_PATH through the node's decision
+logic, without cameras, ROS or a display.
+
+    python replay.py recordings/teatime-20250101-140000.ttr             # as fast as possible
+    python replay.py recordings/teatime-20250101-140000.ttr --realtime   # at the recorded pace
+    python replay.py recordings/teatime-20250101-140000.ttr --speed 4    # 4x the recorded pace
+    python replay.py recordings/teatime-20250101-140000.ttr --runtime-config new.json
+
+The recording is memory-mapped and every frame and detection message is
+handed to EdgeCore in the order the node handled it, on the node's
+recorded wall clock. The camera setup, the settings that affect frame
+matching and the runtime config (including reloads) are restored from the
+recording, and gate changes are applied as recorded. Detections are
+checked on the frame the node matched them with (MATCH records) rather
+than matched again: the node may have matched them with a frame that
+arrived after they were recorded. So the replayed alerts must equal the
+recorded ones; the exit status is 1 when they do not.
+Alerts are collected, not sent.
+
+--runtime-config applies a runtime config file (as written by calibrate.py)
+on top of the recorded values, to see which alerts new thresholds would
+have raised. Such a what-if replay only sees what the node saw under the
+recorded settings: gate changes (time windows and cooldowns) are replayed
+as recorded, and detections the node dropped while suspended were never
+recorded. A cooldown started by an alert only the new settings raise
+lasts until the next recorded gate change, however long that is, and a
+recorded cooldown stays in place even if the new settings suppress the
+alert that started it. Detections the node never had to match are matched
+to the closest replayed frame.
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+import config
+import recording
+from core import EdgeCore
+from frame_buffer import LazyFrame
+from recording import Recording
+from runtime_config import RuntimeConfig, read_overrides
+
+
+class CollectedAlerts:
+    """Stands in for the AlertDispatcher and keeps the alert payloads."""
+    def __init__(self):
+        self.payloads = []
+
+    def submit(self, payload):
+        self.payloads.append(payload)
+
+
+class ReplayCore(EdgeCore):
+    """
+    EdgeCore that checks detections on the frames the recording says they
+    were matched with. A frame that reached the node after the detections
+    were recorded (or was evicted since) is read from the recording.
+    """
+    def __init__(self, alerts, rec, **kwargs):
+        super().__init__(alerts, **kwargs)
+        self.rec = rec
+        # (camera, detection stamp) -> matched frame stamps (None for a miss), in recorded order
+        self.matches = {}
+        for i in (rec.index["kind"] == recording.MATCH).nonzero()[0]:
+            record = rec[int(i)]
+            self.matches.setdefault((record.camera, record.stamp), []).append(record.frame_stamp())
+        # (camera, frame stamp) -> record number
+        frames = (rec.index["kind"] == recording.FRAME).nonzero()[0]
+        self.frame_records = {(int(rec.index["camera"][i]), int(rec.index["stamp"][i])): int(i) for i in frames}
+        self.frames_missing = 0
+
+    def match_frame(self, camera, stamp):
+        index = self.cameras.index(camera)
+        recorded = self.matches.get((index, stamp))
+        if not recorded:
+            # Older recording, or a what-if replay that checks more than the node did
+            return camera.frames.closest(stamp)
+        frame_stamp = recorded.pop(0)
+        if frame_stamp is None:
+            camera.frames.misses += 1
+            return None
+        frame = camera.frames.find(frame_stamp)
+        if frame is None and (index, frame_stamp) in self.frame_records:
+            frame = LazyFrame(self.rec[self.frame_records[index, frame_stamp]].payload, frame_stamp)
+        if frame is None:
+            self.frames_missing += 1
+            camera.frames.misses += 1
+            return None
+        camera.frames.matches += 1
+        return frame
+
+
+def make_core(rec, clock, overrides=None):
+    """A ReplayCore configured as the node that made the recording."""
+    for name, value in rec.meta.get("settings", {}).items():
+        setattr(config, name, value)
+    # Read when the cameras are constructed
+    config.CAMERAS = rec.meta["cameras_config"]
+    runtime = RuntimeConfig(overrides=dict(rec.meta["runtime"], **(overrides or {})))
+    return ReplayCore(CollectedAlerts(), rec, runtime=runtime, clock=clock, camera_workers=0, headless=True)
+
+
+def replay(rec, realtime=False, speed=1.0, overrides=None):
+    """
+    Feeds every record of `rec` to a fresh EdgeCore, with `overrides` on top
+    of every recorded runtime config. Returns (core, replayed alerts,
+    recorded alerts, seconds), alerts as (camera, stamp, profile).
+    """
+    overrides = overrides or {}
+    now = [rec[0].wall / 1e9]
+    core = make_core(rec, clock=lambda: now[0], overrides=overrides)
+    replayed = []
+    recorded = []
+    started = time.perf_counter()
+    first_wall = rec[0].wall
+    for record in rec:
+        now[0] = record.wall / 1e9
+        if realtime:
+            delay = (record.wall - first_wall) / 1e9 / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        kind = record.kind
+        if kind == recording.META:
+            continue
+        if kind == recording.CONFIG:
+            core.apply_runtime(RuntimeConfig(overrides=dict(record.json(), **overrides), previous=core.runtime))
+            continue
+        camera = core.cameras[record.camera]
+        if kind == recording.FRAME:
+            core.put_frame(camera, record.payload, record.stamp)
+        elif kind == recording.DETECTIONS:
+            profile = core.process_boxes(camera, record.stamp, *record.boxes())
+            if profile is not None:
+                replayed.append((camera.name, record.stamp, profile))
+        elif kind == recording.GATE:
+            core.set_active(camera, record.payload[0] == 1)
+        elif kind == recording.ALERT:
+            recorded.append((camera.name, record.stamp, record.json()["profile"]))
+    return core, replayed, recorded, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording")
+    parser.add_argument("--realtime", action="store_true", help="Keep the recorded pace instead of running flat out")
+    parser.add_argument("--speed", type=float, default=1.0, help="Pace multiplier for --realtime")
+    parser.add_argument("--runtime-config", metavar="FILE", help="Runtime config JSON overriding the recorded values")
+    args = parser.parse_args(argv)
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+    try:
+        overrides = read_overrides(args.runtime_config) if args.runtime_config else {}
+    except ValueError as e:
+        parser.error(str(e))
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    rec = Recording(args.recording)
+    frames = rec.count(recording.FRAME)
+    detections = rec.count(recording.DETECTIONS)
+    print(f"[INFO] {args.recording}: {len(rec)} records, {frames} frames, {detections} detection messages, "
+          f"{rec.duration:.1f} s, cameras: {', '.join(rec.cameras)}")
+
+    core, replayed, recorded, elapsed = replay(rec, realtime=args.realtime, speed=args.speed, overrides=overrides)
+    core.log_stats()
+    core.stop()
+    if core.frames_missing:
+        print(f"[WARN] {core.frames_missing} matched frames are missing from the recording.")
+    elapsed = max(elapsed, 1e-9)
+    print(f"[STATS] Replayed in {elapsed:.2f} s: {(frames + detections) / elapsed:.0f} messages/s, "
+          f"{detections / elapsed:.0f} detections/s ({rec.duration / elapsed:.1f}x real time)")
+    rec.close()
+
+    for camera, stamp, profile in replayed:
+        print(f"[INFO] Alert: [{camera}] {profile} at stamp {stamp}")
+    if replayed == recorded:
+        print(f"[VERIFY] {len(replayed)} alerts, identical to the recording.")
+        return 0
+    print(f"[VERIFY] Replayed alerts differ from the recording ({len(replayed)} replayed, {len(recorded)} recorded):")
+    for camera, stamp, profile in recorded:
+        if (camera, stamp, profile) not in replayed:
+            print(f"[VERIFY]   missing: [{camera}] {profile} at stamp {stamp}")
+    for camera, stamp, profile in replayed:
+        if (camera, stamp, profile) not in recorded:
+            print(f"[VERIFY]   extra: [{camera}] {profile} at stamp {stamp}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
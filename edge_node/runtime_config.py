@@ -0,0 +1,300 @@
+import json
+import os
+import threading
+
+import config
+from color_lut import ColorClassifier, MAX_PROFILES
+from schedule import Schedule
+
+# Settings that can be changed while the node runs. Everything else in
+# config.py (topics, ports, workers, alert endpoints, ...) needs a restart.
+RELOADABLE = (
+    "UNIFORM_PROFILES",
+    "UNIFORM_PIXEL_PERCENTAGE_THRESHOLD",
+    "COLOR_LUT_BITS",
+    "COLOR_PIXEL_BUDGET",
+    "COLOR_CONFIDENCE_Z",
+    "CONFIDENCE_THRESHOLD",
+    "TIME_WINDOWS",
+    "WEEKLY_TIME_WINDOWS",
+    "TIMEZONE",
+    "COOLDOWN_SECONDS",
+    "TRACK_IOU_THRESHOLD",
+    "TRACK_MAX_AGE_FRAMES",
+    "TRACK_RECHECK_FRAMES",
+    "TRACK_RECHECK_IOU",
+    "TRACK_VOTE_WINDOW",
+    "TRACK_VOTE_MIN",
+)
+
+
+def _number(name, value, low=None, high=None, integer=False):
+    kinds = (int,) if integer else (int, float)
+    # bool is an int subclass, but "true" is never a sensible threshold
+    if isinstance(value, bool) or not isinstance(value, kinds):
+        raise ValueError(f"{name} must be {'an integer' if integer else 'a number'}, got {value!r}")
+    if high is None and value < low:
+        raise ValueError(f"{name} must be at least {low}, got {value!r}")
+    if high is not None and not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}, got {value!r}")
+    return value if integer else float(value)
+
+
+def _hsv(name, value):
+    if not isinstance(value, (list, tuple)) or len(value) != 3:
+        raise ValueError(f"{name} must be an (H, S, V) triple, got {value!r}")
+    return (_number(f"{name} hue", value[0], 0, 179, integer=True),
+            _number(f"{name} saturation", value[1], 0, 255, integer=True),
+            _number(f"{name} value", value[2], 0, 255, integer=True))
+
+
+def _profiles(value):
+    if not isinstance(value, dict) or not value:
+        raise ValueError(f"UNIFORM_PROFILES must be a non-empty mapping, got {value!r}")
+    if len(value) > MAX_PROFILES:
+        raise ValueError(f"At most {MAX_PROFILES} uniform profiles are supported, got {len(value)}")
+    profiles = {}
+    for name, spec in value.items():
+        if not isinstance(spec, dict) or set(spec) - {"lower", "upper", "threshold"}:
+            raise ValueError(f"Profile {name!r} must have 'lower', 'upper' and optionally 'threshold', got {spec!r}")
+        lower = _hsv(f"{name} lower", spec.get("lower"))
+        upper = _hsv(f"{name} upper", spec.get("upper"))
+        if lower[1] > upper[1] or lower[2] > upper[2]:
+            raise ValueError(f"Profile {name!r}: lower saturation/value above upper ({lower} > {upper})")
+        profiles[name] = {"lower": lower, "upper": upper}
+        if "threshold" in spec:
+            profiles[name]["threshold"] = _number(f"{name} threshold", spec["threshold"], 0, 100)
+    return profiles
+
+
+def _windows(name, value):
+    if not isinstance(value, (list, tuple)):
+        raise ValueError(f"{name} must be a list of (start h, start m, end h, end m), got {value!r}")
+    windows = []
+    for window in value:
+        if not isinstance(window, (list, tuple)) or len(window) != 4:
+            raise ValueError(f"{name} entries must be (start h, start m, end h, end m), got {window!r}")
+        windows.append((_number(name, window[0], 0, 23, integer=True), _number(name, window[1], 0, 59, integer=True),
+                        _number(name, window[2], 0, 23, integer=True), _number(name, window[3], 0, 59, integer=True)))
+    return windows
+
+
+def _weekly_windows(value):
+    if not isinstance(value, dict):
+        raise ValueError(f"WEEKLY_TIME_WINDOWS must be a mapping of weekday to windows, got {value!r}")
+    weekly = {}
+    for day, windows in value.items():
+        # JSON object keys are always strings
+        day = int(day) if isinstance(day, str) and day.isdigit() else day
+        weekly[_number("WEEKLY_TIME_WINDOWS weekday", day, 0, 6, integer=True)] = _windows(
+            "WEEKLY_TIME_WINDOWS", windows)
+    return weekly
+
+
+def validate(values):
+    """
+    Checks and normalizes a mapping of RELOADABLE names to values (tuples for
+    JSON lists, int weekdays, floats for thresholds). Raises ValueError.
+    """
+    v = dict(values)
+    v["UNIFORM_PROFILES"] = _profiles(v["UNIFORM_PROFILES"])
+    v["UNIFORM_PIXEL_PERCENTAGE_THRESHOLD"] = _number(
+        "UNIFORM_PIXEL_PERCENTAGE_THRESHOLD", v["UNIFORM_PIXEL_PERCENTAGE_THRESHOLD"], 0, 100)
+    v["COLOR_LUT_BITS"] = _number("COLOR_LUT_BITS", v["COLOR_LUT_BITS"], 1, 8, integer=True)
+    if v["COLOR_PIXEL_BUDGET"] is not None:
+        v["COLOR_PIXEL_BUDGET"] = _number("COLOR_PIXEL_BUDGET", v["COLOR_PIXEL_BUDGET"], 1, integer=True)
+    v["COLOR_CONFIDENCE_Z"] = _number("COLOR_CONFIDENCE_Z", v["COLOR_CONFIDENCE_Z"], 0)
+    v["CONFIDENCE_THRESHOLD"] = _number("CONFIDENCE_THRESHOLD", v["CONFIDENCE_THRESHOLD"], 0, 1)
+    v["TIME_WINDOWS"] = _windows("TIME_WINDOWS", v["TIME_WINDOWS"])
+    v["WEEKLY_TIME_WINDOWS"] = _weekly_windows(v["WEEKLY_TIME_WINDOWS"])
+    if v["TIMEZONE"] is not None and not isinstance(v["TIMEZONE"], str):
+        raise ValueError(f"TIMEZONE must be an IANA name or null, got {v['TIMEZONE']!r}")
+    v["COOLDOWN_SECONDS"] = _number("COOLDOWN_SECONDS", v["COOLDOWN_SECONDS"], 0)
+    v["TRACK_IOU_THRESHOLD"] = _number("TRACK_IOU_THRESHOLD", v["TRACK_IOU_THRESHOLD"], 0, 1)
+    v["TRACK_RECHECK_IOU"] = _number("TRACK_RECHECK_IOU", v["TRACK_RECHECK_IOU"], 0, 1)
+    for name in ("TRACK_MAX_AGE_FRAMES", "TRACK_RECHECK_FRAMES", "TRACK_VOTE_WINDOW", "TRACK_VOTE_MIN"):
+        v[name] = _number(name, v[name], 1, integer=True)
+    if v["TRACK_VOTE_MIN"] > v["TRACK_VOTE_WINDOW"]:
+        raise ValueError(f"TRACK_VOTE_MIN ({v['TRACK_VOTE_MIN']}) exceeds TRACK_VOTE_WINDOW ({v['TRACK_VOTE_WINDOW']})")
+    return v
+
+
+def read_overrides(path):
+    """
+    Reads a JSON object of config.py names to values from `path`.
+    A missing file means no overrides. Raises ValueError for unknown names
+    and for settings that need a restart.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        try:
+            overrides = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path}: {e}") from None
+    if not isinstance(overrides, dict):
+        raise ValueError(f"{path}: expected a JSON object of setting names to values")
+    fixed = sorted(name for name in overrides if name not in RELOADABLE)
+    if fixed:
+        known = [name for name in fixed if hasattr(config, name)]
+        if known:
+            raise ValueError(f"{path}: {', '.join(known)} cannot be changed at runtime; edit config.py and restart")
+        raise ValueError(f"{path}: unknown settings {', '.join(fixed)}")
+    return overrides
+
+
+class RuntimeConfig:
+    """
+    Validated snapshot of the runtime-tunable settings, with everything
+    derived from them built once: the color lookup table, the compiled
+    schedule and the tracker parameters.
+
+    A snapshot is never modified. A reload builds a new one (reusing the
+    previous lookup table and schedule when their inputs did not change) and
+    consumers swap their references to it, so nothing is rebuilt or locked
+    on the message path and a color check never mixes two lookup tables.
+    """
+    def __init__(self, overrides=None, previous=None, source=None):
+        values = {name: getattr(config, name) for name in RELOADABLE}
+        values.update(overrides or {})
+        self.values = validate(values)
+        self.overrides = dict(overrides or {})
+        self.source = source
+        self.version = previous.version + 1 if previous is not None else 1
+        v = self.values
+
+        color_inputs = (v["UNIFORM_PROFILES"], v["UNIFORM_PIXEL_PERCENTAGE_THRESHOLD"], v["COLOR_LUT_BITS"])
+        if previous is not None and previous._color_inputs == color_inputs:
+            self.classifier = previous.classifier
+        else:
+            self.classifier = ColorClassifier(
+                v["UNIFORM_PROFILES"], bits=v["COLOR_LUT_BITS"],
+                default_threshold=v["UNIFORM_PIXEL_PERCENTAGE_THRESHOLD"])
+        self._color_inputs = color_inputs
+
+        schedule_inputs = (v["TIME_WINDOWS"], v["WEEKLY_TIME_WINDOWS"], v["TIMEZONE"])
+        if previous is not None and previous._schedule_inputs == schedule_inputs:
+            self.schedule = previous.schedule
+        else:
+            try:
+                self.schedule = Schedule(*schedule_inputs)
+            except (KeyError, ImportError) as e:
+                # ZoneInfoNotFoundError is a KeyError
+                raise ValueError(f"TIMEZONE {v['TIMEZONE']!r}: {e}") from None
+        self._schedule_inputs = schedule_inputs
+
+        self.pixel_budget = v["COLOR_PIXEL_BUDGET"]
+        self.confidence_z = v["COLOR_CONFIDENCE_Z"]
+        self.confidence_threshold = v["CONFIDENCE_THRESHOLD"]
+        self.cooldown_seconds = v["COOLDOWN_SECONDS"]
+        self.tracking = {
+            "iou_threshold": v["TRACK_IOU_THRESHOLD"],
+            "max_age": v["TRACK_MAX_AGE_FRAMES"],
+            "recheck_frames": v["TRACK_RECHECK_FRAMES"],
+            "recheck_iou": v["TRACK_RECHECK_IOU"],
+            "vote_window": v["TRACK_VOTE_WINDOW"],
+            "vote_min": v["TRACK_VOTE_MIN"],
+        }
+
+    @classmethod
+    def load(cls, path=None, previous=None):
+        """config.py with the overrides in `path` (if any) applied. Raises ValueError."""
+        return cls(read_overrides(path), previous=previous, source=path)
+
+    def changed(self, other):
+        """Names of the settings whose values differ from `other` (all of them when it is None)."""
+        if other is None:
+            return list(self.values)
+        return [name for name in RELOADABLE if self.values[name] != other.values[name]]
+
+
+class ConfigWatcher:
+    """
+    Polls a runtime config file for changes and hands every valid new
+    snapshot to `on_reload` (on the watcher thread).
+
+    Only os.stat() runs per poll; the file is read when its modification
+    time, size or inode changes. An invalid file is reported and the current
+    settings stay in force; removing the file goes back to config.py.
+    """
+    def __init__(self, path, on_reload, current=None, interval=2.0, logger=None):
+        self.path = path
+        self.on_reload = on_reload
+        self.current = current
+        self.interval = interval
+        self.logger = logger
+        self.reloads = 0
+        self.errors = 0
+        self._stamp = self._stat()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _log(self, level, message):
+        if self.logger is not None:
+            getattr(self.logger, level)(message)
+        else:
+            print(message)
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def poll(self):
+        """Reloads if the file changed since the last poll. Returns the new snapshot, or None."""
+        stamp = self._stat()
+        if stamp == self._stamp:
+            return None
+        self._stamp = stamp
+        try:
+            runtime = RuntimeConfig.load(self.path, previous=self.current)
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            self._log("error", f"[ERROR] Runtime config not reloaded, keeping version "
+                               f"{self.current.version if self.current else '-'}: {e}")
+            return None
+        changed = runtime.changed(self.current)
+        if not changed:
+            return None
+        self.current = runtime
+        self.reloads += 1
+        self._log("info", f"[INFO] Runtime config version {runtime.version} loaded from {self.path} "
+                          f"({'overrides removed' if stamp is None else 'changed: ' + ', '.join(changed)})")
+        self.on_reload(runtime)
+        return runtime
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                # A failing consumer must not end the watcher
+                self.errors += 1
+                self._log("error", f"[ERROR] Applying runtime config failed: {e!r}")
+
+
+def load_initial(path, logger=None):
+    """
+    The settings to start with. A broken override file is reported and
+    ignored rather than keeping the node from starting.
+    """
+    try:
+        return RuntimeConfig.load(path)
+    except (OSError, ValueError) as e:
+        message = f"[ERROR] Ignoring runtime config {path}: {e}"
+        if logger is not None:
+            logger.error(message)
+        else:
+            print(message)
+        return RuntimeConfig()
@@ -0,0 +1,86 @@
+import datetime
+from bisect import bisect_right
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+DAY_SECONDS = 24 * 60 * 60
+WEEK_SECONDS = 7 * DAY_SECONDS
+
+
+class Schedule:
+    """
+    Weekly schedule of active time windows, compiled once into sorted,
+    merged intervals of seconds since Monday 00:00.
+
+    Windows use the (Start Hour, Start Minute, End Hour, End Minute) format of
+    config.TIME_WINDOWS; the end minute is inclusive (12:00 is active until
+    12:00:59). A window whose end is before its start runs past midnight.
+    """
+    def __init__(self, windows, weekly_windows=None, timezone=None):
+        if timezone is not None and ZoneInfo is None:
+            raise ImportError("zoneinfo is required for timezone-aware schedules (Python 3.9+)")
+        self.tz = ZoneInfo(timezone) if timezone else None
+
+        weekly_windows = weekly_windows or {}
+        intervals = []
+        for day in range(7):
+            for (start_h, start_m, end_h, end_m) in weekly_windows.get(day, windows):
+                start = day * DAY_SECONDS + (start_h * 60 + start_m) * 60
+                end = day * DAY_SECONDS + (end_h * 60 + end_m + 1) * 60
+                if end <= start:
+                    end += DAY_SECONDS
+                if end > WEEK_SECONDS:
+                    # Sunday night windows continue into Monday morning
+                    intervals.append((0, end - WEEK_SECONDS))
+                    end = WEEK_SECONDS
+                intervals.append((start, end))
+
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        self._starts = [start for start, _ in merged]
+        self._ends = [end for _, end in merged]
+
+    def now(self, timestamp=None):
+        """The current time (or the Unix `timestamp`) in the schedule's timezone."""
+        if timestamp is None:
+            return datetime.datetime.now(self.tz)
+        return datetime.datetime.fromtimestamp(timestamp, self.tz)
+
+    @staticmethod
+    def _week_offset(now):
+        return (now.weekday() * DAY_SECONDS + now.hour * 3600 + now.minute * 60
+                + now.second + now.microsecond / 1e6)
+
+    def is_active(self, now=None):
+        """True if `now` (default: current time in the schedule's timezone) is inside a window."""
+        t = self._week_offset(now or self.now())
+        i = bisect_right(self._starts, t) - 1
+        return i >= 0 and t < self._ends[i]
+
+    def seconds_until_transition(self, now=None):
+        """
+        Seconds until the active state next changes, or None if it never does
+        (no windows at all, or active around the clock).
+        """
+        if not self._starts:
+            return None
+        if self._starts[0] == 0 and self._ends[0] == WEEK_SECONDS:
+            return None
+        t = self._week_offset(now or self.now())
+        i = bisect_right(self._starts, t) - 1
+        if i >= 0 and t < self._ends[i]:
+            end = self._ends[i]
+            if end == WEEK_SECONDS and self._starts[0] == 0:
+                # Window continues past Sunday midnight
+                end += self._ends[0]
+            return end - t
+        if i + 1 < len(self._starts):
+            return self._starts[i + 1] - t
+        return WEEK_SECONDS - t + self._starts[0]
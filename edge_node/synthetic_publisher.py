@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Synthetic camera publisher for exercising the edge node without cameras.
+
+For every camera in config.CAMERAS (or the single default camera) it
+publishes JPEG CompressedImage frames and matching PerceptionTargets with
+one person walking across the frame. Every --uniform-every'th camera dresses
+that person in the first uniform profile, so alerts fire on those only.
+
+Usage: python synthetic_publisher.py [--fps 15] [--width 1280 --height 720] [--uniform-every 2]
+"""
+
+import argparse
+
+import cv2
+import numpy as np
+import rclpy
+from rclpy.node import Node
+from sensor_msgs.msg import CompressedImage, RegionOfInterest
+from ai_msgs.msg import PerceptionTargets, Roi, Target
+
+import config
+from camera import camera_configs
+
+
+def uniform_bgr():
+    """A BGR color inside the first configured uniform profile."""
+    profile = next(iter(config.UNIFORM_PROFILES.values()))
+    lower, upper = profile["lower"], profile["upper"]
+    hsv = np.uint8([[[(l + u) // 2 for l, u in zip(lower, upper)]]])
+    return tuple(int(c) for c in cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)[0, 0])
+
+
+class SyntheticPublisher(Node):
+    def __init__(self, fps, width, height, uniform_every):
+        super().__init__('teatime_synthetic_publisher')
+        self.width = width
+        self.height = height
+        self.frame_index = 0
+        self.cameras = []
+        uniform = uniform_bgr()
+        for index, camera in enumerate(camera_configs()):
+            color = uniform if uniform_every and index % uniform_every == 0 else (90, 110, 60)
+            self.cameras.append((
+                camera["name"],
+                self.create_publisher(CompressedImage, camera["image_topic"], 10),
+                self.create_publisher(PerceptionTargets, camera["detection_topic"], 10),
+                color,
+            ))
+            self.get_logger().info(f"[INFO] Publishing {camera['name']} on {camera['image_topic']} "
+                                   f"and {camera['detection_topic']}")
+        self.timer = self.create_timer(1.0 / fps, self.publish)
+
+    def person_box(self, offset):
+        """A person-sized box walking left to right, phase-shifted per camera."""
+        box_w, box_h = self.width // 6, self.height * 3 // 4
+        span = self.width - box_w
+        x = (self.frame_index * 4 + offset * span // 3) % (2 * span)
+        x = x if x < span else 2 * span - x
+        y = (self.height - box_h) // 2
+        return x, y, box_w, box_h
+
+    def publish(self):
+        stamp = self.get_clock().now().to_msg()
+        for offset, (name, image_pub, detection_pub, color) in enumerate(self.cameras):
+            x, y, w, h = self.person_box(offset)
+            frame = np.full((self.height, self.width, 3), 128, dtype=np.uint8)
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
+
+            image = CompressedImage()
+            image.header.stamp = stamp
+            image.header.frame_id = name
+            image.format = "jpeg"
+            image.data = cv2.imencode(".jpg", frame)[1].tobytes()
+            image_pub.publish(image)
+
+            roi = Roi()
+            roi.type = "body"
+            roi.rect = RegionOfInterest(x_offset=x, y_offset=y, width=w, height=h)
+            target = Target()
+            target.type = "person"
+            target.track_id = 1
+            target.rois = [roi]
+            detections = PerceptionTargets()
+            detections.header.stamp = stamp
+            detections.header.frame_id = name
+            detections.targets = [target]
+            detection_pub.publish(detections)
+        self.frame_index += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fps", type=float, default=15.0)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--uniform-every", type=int, default=2,
+                        help="Dress the person in uniform on every Nth camera (0 = never)")
+    args = parser.parse_args(argv)
+
+    rclpy.init()
+    node = SyntheticPublisher(args.fps, args.width, args.height, args.uniform_every)
+    try:
+        rclpy.spin(node)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.destroy_node()
+        rclpy.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Starts the edge node with a detection backend from backends.py.
+
+    python teatime.py                          # config.DETECTION_BACKEND ("auto" by default)
+    python teatime.py --backend cpu video.mp4  # standalone pipeline on the CPU
+    python teatime.py --list                   # which backends can run here
+
+Only the chosen backend's modules are imported. Startup time per phase is
+logged with a [STARTUP] prefix and exported as teatime_startup_seconds.
+"""
+
+import argparse
+import sys
+
+from metrics import STARTUP
+
+with STARTUP.phase("imports"):
+    import config
+    from backends import BACKENDS, select
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", nargs="?", help="Video source for the standalone backends (default: VIDEO_SOURCE)")
+    parser.add_argument("--backend", choices=["auto", *BACKENDS], default=config.DETECTION_BACKEND)
+    parser.add_argument("--list", action="store_true", help="List the backends and whether they can run here")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for backend in BACKENDS.values():
+            missing = backend.missing()
+            state = "available" if not missing else f"needs {', '.join(missing)}"
+            print(f"{backend.name:5s} {backend.description} [{state}]")
+        return 0
+
+    try:
+        backend = select(args.backend)
+    except (ImportError, ValueError) as e:
+        print(f"[ERROR] {e}")
+        return 1
+    source = args.source
+    if source is not None and source.isdigit():
+        source = int(source)
+    print(f"[INFO] Detection backend: {backend.name} ({backend.description})")
+    backend.run(source)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
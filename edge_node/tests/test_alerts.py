@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from alerts import AlertDispatcher, AlertSpool
+
+
+class StubDisplay:
+    """
+    Local HTTP server standing in for the IoT display. Answers POSTs with
+    the next status in `statuses` (then 200) after `delay` seconds and keeps
+    the JSON bodies it received.
+    """
+    def __init__(self, statuses=(), delay=0.0, port=0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.received = []
+        self.times = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                time.sleep(stub.delay)
+                status = stub.statuses.pop(0) if stub.statuses else 200
+                stub.times.append(time.monotonic())
+                if status == 200:
+                    stub.received.append(json.loads(body))
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/alert"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def display():
+    stubs = []
+
+    def make(*args, **kwargs):
+        stub = StubDisplay(*args, **kwargs)
+        stubs.append(stub)
+        return stub
+
+    yield make
+    for stub in stubs:
+        stub.close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def payload(n=0):
+    return {"event": "tea_service_detected", "profile": "tea_staff", "confidence": 1.0, "n": n}
+
+
+def test_delivers_on_200(display):
+    stub = display()
+    alerts = AlertDispatcher(stub.url, timeout=2.0).start()
+    try:
+        assert alerts.submit(payload())
+        assert wait_for(lambda: alerts.sent == 1)
+        assert stub.received == [payload()]
+        assert alerts.failed == alerts.retries == alerts.dropped == 0
+    finally:
+        alerts.stop()
+
+
+def test_retries_5xx_with_backoff(display):
+    stub = display(statuses=[503, 500])
+    alerts = AlertDispatcher(stub.url, max_retries=3, backoff_seconds=0.1, timeout=2.0).start()
+    try:
+        alerts.submit(payload())
+        assert wait_for(lambda: alerts.sent == 1)
+        assert alerts.retries == 2
+        assert stub.received == [payload()]
+        # Exponential backoff: 0.1 s before the first retry, 0.2 s before the second
+        first, second, third = stub.times
+        assert second - first >= 0.1
+        assert third - second >= 0.2
+    finally:
+        alerts.stop()
+
+
+def test_unreachable_display_is_spooled_and_replayed_after_restart(display, tmp_path):
+    spool_path = str(tmp_path / "spool.jsonl")
+    stub = display()
+    url, port = stub.url, stub.server.server_address[1]
+    stub.close()  # Connection refused from now on
+
+    alerts = AlertDispatcher(url, max_retries=0, timeout=0.5, replay_interval=60.0,
+                             spool=AlertSpool(spool_path)).start()
+    alerts.submit(payload(1))
+    assert wait_for(lambda: alerts.failed == 1 and alerts.spooled == 1)
+    alerts.stop()
+
+    # The display comes back and the node restarts: the spool is replayed and acknowledged
+    stub = display(port=port)
+    spool = AlertSpool(spool_path)
+    assert len(spool) == 1
+    alerts = AlertDispatcher(url, timeout=2.0, spool=spool).start()
+    try:
+        assert wait_for(lambda: alerts.replayed == 1)
+        assert stub.received == [payload(1)]
+        assert len(spool) == 0
+    finally:
+        alerts.stop()
+    assert len(AlertSpool(spool_path)) == 0
+
+
+def test_full_queue_drops_without_spool(display):
+    stub = display()
+    # Not started: nothing drains the queue
+    alerts = AlertDispatcher(stub.url, queue_size=1)
+    assert alerts.submit(payload(1))
+    assert not alerts.submit(payload(2))
+    assert alerts.dropped == 1
+    assert alerts.pending == 1
+    alerts.stop(timeout=0)
+
+
+def test_submit_never_blocks_on_a_slow_display(display):
+    stub = display(delay=1.0)
+    alerts = AlertDispatcher(stub.url, queue_size=2, max_retries=0, timeout=5.0).start()
+    try:
+        started = time.monotonic()
+        for n in range(20):
+            alerts.submit(payload(n))
+        assert time.monotonic() - started < 0.2
+        assert alerts.dropped > 0
+    finally:
+        alerts.stop(timeout=0)
@@ -0,0 +1,23 @@
+import json
+
+import benchmark
+
+ARGS = ["--suite", "preprocess", "--iterations", "1"]
+
+
+def test_missing_baseline_fails_only_with_check(tmp_path):
+    missing = str(tmp_path / "bench_baseline.json")
+    assert benchmark.main(ARGS + ["--baseline", missing]) == 0
+    assert benchmark.main(ARGS + ["--baseline", missing, "--check"]) == 1
+
+
+def test_check_fails_on_cases_without_baseline(tmp_path):
+    path = tmp_path / "bench_baseline.json"
+    assert benchmark.main(ARGS + ["--baseline", str(path), "--update-baseline"]) == 0
+    assert benchmark.main(ARGS + ["--baseline", str(path), "--check", "--tolerance", "1000"]) == 0
+
+    baseline = json.loads(path.read_text())
+    baseline["results"].pop(next(iter(baseline["results"])))
+    path.write_text(json.dumps(baseline))
+    assert benchmark.main(ARGS + ["--baseline", str(path), "--tolerance", "1000"]) == 0
+    assert benchmark.main(ARGS + ["--baseline", str(path), "--check", "--tolerance", "1000"]) == 1
@@ -0,0 +1,65 @@
+import os
+
+import cv2
+import pytest
+
+import config
+from benchmark import synthetic_crops
+from detector import TeaDetector
+
+CROPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crops")
+
+
+def recorded_crops():
+    for name in sorted(os.listdir(CROPS_DIR)):
+        if name.endswith(".png"):
+            yield name, cv2.imread(os.path.join(CROPS_DIR, name))
+
+
+CROPS = list(synthetic_crops()) + list(recorded_crops())
+
+
+@pytest.fixture(scope="module")
+def exact():
+    return TeaDetector()
+
+
+@pytest.fixture
+def estimator():
+    return TeaDetector(pixel_budget=config.COLOR_PIXEL_BUDGET, confidence_z=config.COLOR_CONFIDENCE_Z)
+
+
+def test_recorded_crops_straddle_the_threshold(exact):
+    verdicts = {}
+    for name, crop in recorded_crops():
+        assert crop is not None, name
+        (detected, pct, _), = exact.check_uniform_colors(crop, [(0, 0, crop.shape[1], crop.shape[0])],
+                                                         with_mask=False)[0]
+        verdicts[name] = (detected, pct)
+    threshold = config.UNIFORM_PIXEL_PERCENTAGE_THRESHOLD
+    below, above = verdicts["below_threshold.png"], verdicts["above_threshold.png"]
+    assert not below[0] and threshold - 1.0 < below[1] < threshold
+    assert above[0] and threshold <= above[1] < threshold + 1.0
+
+
+@pytest.mark.parametrize("name,crop", CROPS, ids=[name for name, _ in CROPS])
+def test_estimate_matches_exact_count(exact, estimator, name, crop):
+    bbox = (0, 0, crop.shape[1], crop.shape[0])
+    (expected, exact_pct, _), = exact.check_uniform_colors(crop, [bbox], with_mask=False)[0]
+
+    detected, pct, _, margin = estimator.estimate_uniform_color(crop, bbox)
+    assert detected == expected, f"{name}: exact {exact_pct:.2f}%, estimate {pct:.2f}% +/- {margin:.2f}"
+    if margin:
+        # An estimate is only trusted when the exact count lies inside its interval
+        assert abs(pct - exact_pct) <= margin
+
+    (batched, _, _), = estimator.check_uniform_colors(crop, [bbox], with_mask=False)[0]
+    assert batched == expected
+
+
+def test_estimation_is_exercised(estimator):
+    for _, crop in CROPS:
+        estimator.estimate_uniform_color(crop, (0, 0, crop.shape[1], crop.shape[0]))
+    # Clear cases are estimated from the sample, borderline ones fall back to the exact count
+    assert estimator.estimates > 0
+    assert estimator.exact_fallbacks > 0
@@ -0,0 +1,15 @@
+import urllib.request
+
+import config
+from debug_stream import DebugStream
+
+
+def test_listens_on_loopback_by_default():
+    assert config.DEBUG_STREAM_HOST == "127.0.0.1"
+    stream = DebugStream(port=0).start()
+    try:
+        host, port = stream._server.server_address[:2]
+        assert host == "127.0.0.1"
+        assert b"TeaTime debug" in urllib.request.urlopen(f"http://{host}:{port}/", timeout=5).read()
+    finally:
+        stream.stop()
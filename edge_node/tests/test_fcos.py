@@ -0,0 +1,135 @@
+import math
+import os
+
+import numpy as np
+import pytest
+
+from fcos_lib import LIBPOSTPROCESS_PATH, FcosPostProcessor
+from fcos_numpy import STRIDES, NumpyFcosDecoder
+
+INPUT = 512
+# Original frame twice as wide as the model input: x is scaled by 2, y by 1
+ORI_W, ORI_H = 1024, 512
+
+
+def empty_outputs(classes=80):
+    """Float outputs (5 cls, 5 box, 5 centerness) with nothing above any threshold."""
+    arrays = []
+    for channels, fill in ((classes, -10.0), (4, 0.0), (1, -10.0)):
+        for stride in STRIDES:
+            arrays.append(np.full((1, INPUT // stride, INPUT // stride, channels), fill, dtype=np.float32))
+    return arrays
+
+
+def place(arrays, level, row, col, cls_logit, ctr_logit, ltrb, class_id=0):
+    """Puts one anchor point hit at (row, col) of stride level `level`."""
+    arrays[level][0, row, col, class_id] = cls_logit
+    arrays[level + 5][0, row, col] = ltrb
+    arrays[level + 10][0, row, col, 0] = ctr_logit
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + math.exp(-x))
+
+
+def decode(arrays, decoder=None, **kwargs):
+    decoder = decoder or NumpyFcosDecoder(INPUT, INPUT)
+    return decoder.decode(arrays, ORI_W, ORI_H, **kwargs)
+
+
+def test_single_box_and_score():
+    arrays = empty_outputs()
+    # Stride 8, anchor center ((6 + 0.5) * 8, (4 + 0.5) * 8) = (52, 36)
+    place(arrays, 0, 4, 6, cls_logit=2.0, ctr_logit=0.0, ltrb=(10, 20, 30, 40), class_id=3)
+
+    result = decode(arrays)
+    assert len(result) == 1
+    # Input box (42, 16, 82, 76), x scaled by 2 onto the original frame
+    np.testing.assert_allclose(result[0]["bbox"], [84, 16, 164, 76])
+    assert result[0]["score"] == pytest.approx(math.sqrt(sigmoid(2.0) * sigmoid(0.0)), rel=1e-6)
+    assert result[0]["id"] == 3
+
+
+def test_centerness_gates_the_score():
+    arrays = empty_outputs()
+    # A confident class with poor centerness: sqrt(0.98 * 0.12) < 0.5
+    place(arrays, 1, 3, 3, cls_logit=4.0, ctr_logit=-2.0, ltrb=(8, 8, 8, 8))
+    assert len(decode(arrays)) == 0
+    assert len(decode(arrays, score_threshold=0.3)) == 1
+
+
+def test_boxes_are_clipped_to_the_frame():
+    arrays = empty_outputs()
+    place(arrays, 2, 0, 0, cls_logit=4.0, ctr_logit=4.0, ltrb=(100, 100, 100, 100))
+    np.testing.assert_allclose(decode(arrays)[0]["bbox"], [0, 0, 232, 116])
+
+
+def test_dequantization_matches_float_outputs():
+    floats = empty_outputs()
+    place(floats, 0, 4, 6, cls_logit=2.0, ctr_logit=0.5, ltrb=(10, 20, 30, 40))
+    place(floats, 3, 2, 5, cls_logit=3.0, ctr_logit=1.5, ltrb=(60, 70, 80, 90), class_id=7)
+
+    # Quantize every output with a per-channel scale, as the BPU hands them out
+    scales, quantized = [], []
+    for index, array in enumerate(floats):
+        channels = array.shape[-1]
+        scale = np.full(channels, 0.5 if index < 5 else 0.25 if index < 10 else 0.125, dtype=np.float32)
+        scale[0] /= 2  # Channels need not share a scale
+        scales.append(scale)
+        quantized.append(np.round(array / scale).astype(np.int32))
+
+    expected = decode(floats)
+    result = decode(quantized, NumpyFcosDecoder(INPUT, INPUT, scales=scales))
+    assert len(result) == len(expected) == 2
+    np.testing.assert_allclose(result["bbox"], expected["bbox"])
+    np.testing.assert_allclose(result["score"], expected["score"], rtol=1e-6)
+    np.testing.assert_array_equal(result["id"], expected["id"])
+
+
+def test_nchw_layout():
+    arrays = empty_outputs()
+    place(arrays, 0, 4, 6, cls_logit=2.0, ctr_logit=0.0, ltrb=(10, 20, 30, 40))
+    nchw = [np.ascontiguousarray(np.transpose(a, (0, 3, 1, 2))) for a in arrays]
+    result = decode(nchw, NumpyFcosDecoder(INPUT, INPUT, layouts=["NCHW"] * len(nchw)))
+    np.testing.assert_allclose(result["bbox"], decode(arrays)["bbox"])
+
+
+def test_nms_is_class_aware():
+    # Neighbouring stride 8 anchors with 80 x 80 boxes overlap with IoU 0.82
+    same = empty_outputs()
+    place(same, 0, 10, 10, cls_logit=3.0, ctr_logit=3.0, ltrb=(40, 40, 40, 40))
+    place(same, 0, 10, 11, cls_logit=2.0, ctr_logit=2.0, ltrb=(40, 40, 40, 40))
+    result = decode(same)
+    assert len(result) == 1
+    assert result[0]["score"] == pytest.approx(math.sqrt(sigmoid(3.0) * sigmoid(3.0)), rel=1e-6)
+
+    mixed = empty_outputs()
+    place(mixed, 0, 10, 10, cls_logit=3.0, ctr_logit=3.0, ltrb=(40, 40, 40, 40), class_id=0)
+    place(mixed, 0, 10, 11, cls_logit=2.0, ctr_logit=2.0, ltrb=(40, 40, 40, 40), class_id=56)
+    result = decode(mixed)
+    assert sorted(result["id"]) == [0, 56]
+
+    # Below the IoU threshold both boxes of the same class survive
+    assert len(decode(same, nms_threshold=0.9)) == 2
+
+
+def test_top_k_keeps_the_best_scores_in_order():
+    arrays = empty_outputs()
+    logits = [1.0, 3.5, 2.0, 4.0, 0.5, 3.0, 2.5, 1.5]
+    for k, logit in enumerate(logits):
+        # Well separated stride 16 anchors, so NMS suppresses nothing
+        place(arrays, 1, 2, 2 + 3 * k, cls_logit=logit, ctr_logit=4.0, ltrb=(8, 8, 8, 8))
+
+    result = decode(arrays, score_threshold=0.1, nms_top_k=5)
+    expected = sorted((math.sqrt(sigmoid(logit) * sigmoid(4.0)) for logit in logits), reverse=True)[:5]
+    np.testing.assert_allclose(result["score"], expected, rtol=1e-6)
+    assert len(decode(arrays, score_threshold=0.1, nms_top_k=8)) == 8
+
+
+@pytest.mark.skipif(not os.path.exists(LIBPOSTPROCESS_PATH), reason="needs libpostprocess.so (RDK board)")
+def test_numpy_backend_matches_c_backend():
+    from benchmark import fake_model_outputs
+    model_outputs, outputs = fake_model_outputs()
+    report = FcosPostProcessor(model_outputs, ori_w=1920, ori_h=1080, backend="numpy").compare_backends(outputs)
+    assert report["c_detections"] > 0
+    assert report["parity"], report
@@ -0,0 +1,81 @@
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import config
+from metrics import MetricsServer, Registry
+
+
+@pytest.fixture
+def server():
+    registry = Registry()
+    registry.counter("teatime_test_total", "Test counter").inc()
+    server = MetricsServer(registry, port=0, max_profile_seconds=0.5).start()
+    yield server
+    server.stop()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def get(server, path):
+    host, port = server._server.server_address[:2]
+    return urllib.request.urlopen(f"http://{host}:{port}{path}", timeout=5)
+
+
+def test_listens_on_loopback_by_default(server):
+    assert config.METRICS_HOST == "127.0.0.1"
+    assert server._server.server_address[0] == "127.0.0.1"
+    assert b"teatime_test_total 1" in get(server, "/metrics").read()
+
+
+def test_profile_duration_is_capped(server):
+    started = time.monotonic()
+    assert get(server, "/profile?seconds=0.1").status == 200
+    assert time.monotonic() - started < 0.5
+    for seconds in ("300", "0", "-1", "abc"):
+        with pytest.raises(urllib.error.HTTPError) as error:
+            get(server, f"/profile?seconds={seconds}")
+        assert error.value.code == 400
+
+
+def expect_error(server, path, code):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(server, path)
+    assert error.value.code == code
+
+
+def test_one_profile_at_a_time(server):
+    get(server, "/profile/start")
+    expect_error(server, "/profile?seconds=0.1", 409)
+    expect_error(server, "/profile/start", 409)
+    assert get(server, "/profile/stop").status == 200
+    expect_error(server, "/profile/stop", 409)
+
+
+def test_stop_does_not_cut_a_timed_profile_short(server):
+    timed = threading.Thread(target=lambda: get(server, "/profile?seconds=0.4"))
+    timed.start()
+    assert wait_for(lambda: server.profiler.running)
+    expect_error(server, "/profile/stop", 409)
+    assert server.profiler.running
+    timed.join()
+
+
+def test_started_profile_stops_after_the_limit(server):
+    get(server, "/profile/start")
+    assert server.profiler.running
+    # max_profile_seconds is 0.5 in these tests
+    assert wait_for(lambda: not server.profiler.running, timeout=2.0)
+    # The stacks wait for /profile/stop, and another profile can start meanwhile
+    assert get(server, "/profile/stop").status == 200
+    assert get(server, "/profile?seconds=0.1").status == 200
@@ -0,0 +1,100 @@
+import cv2
+import numpy as np
+import pytest
+
+import config
+import recording
+from camera import camera_configs
+from core import EdgeCore
+from recording import RECORDED_SETTINGS, Recorder, Recording
+from replay import CollectedAlerts, replay
+from runtime_config import RuntimeConfig
+
+MS = 1_000_000
+PERSON = [(0, 0, 320, 240)]
+
+
+def jpeg(uniform):
+    image = np.full((240, 320, 3), 120, dtype=np.uint8)
+    if uniform:
+        image[:] = (180, 40, 170)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+@pytest.fixture(autouse=True)
+def restore_config(monkeypatch):
+    # replay() restores the recorded settings into config
+    for name in RECORDED_SETTINGS + ("CAMERAS",):
+        monkeypatch.setattr(config, name, getattr(config, name))
+
+
+@pytest.fixture
+def runtime():
+    # One matching check is enough for an alert
+    return RuntimeConfig(overrides={"TRACK_VOTE_MIN": 1, "TRACK_VOTE_WINDOW": 1})
+
+
+def recorder(path, runtime):
+    cameras = camera_configs()
+    return Recorder(str(path), [entry["name"] for entry in cameras],
+                    meta={"cameras_config": cameras, "runtime": runtime.values,
+                          "settings": {name: getattr(config, name) for name in RECORDED_SETTINGS}})
+
+
+def race(path, runtime, matched_is_uniform, with_match=True):
+    """
+    Detections stamped 140 ms were recorded while only the frame stamped
+    100 ms was buffered; the frame stamped 150 ms arrived before the worker
+    matched them, so the node checked that one.
+    """
+    rec = recorder(path, runtime)
+    rec.gate("default", True)
+    rec.frame("default", 100 * MS, jpeg(not matched_is_uniform))
+    rec.detections("default", 140 * MS, PERSON, [None])
+    rec.frame("default", 150 * MS, jpeg(matched_is_uniform))
+    if with_match:
+        rec.match("default", 140 * MS, 150 * MS)
+    if matched_is_uniform:
+        rec.alert("default", 140 * MS, "tea_staff", 100.0)
+    rec.close()
+    return Recording(str(path))
+
+
+def test_replay_checks_the_frame_the_node_matched(tmp_path, runtime):
+    rec = race(tmp_path / "hit.ttr", runtime, matched_is_uniform=True)
+    core, replayed, recorded, _ = replay(rec)
+    core.stop()
+    assert replayed == recorded == [("default", 140 * MS, "tea_staff")]
+    assert core.frames_missing == 0
+
+    rec = race(tmp_path / "miss.ttr", runtime, matched_is_uniform=False)
+    core, replayed, recorded, _ = replay(rec)
+    core.stop()
+    # The only frame replayed before the detections shows a uniform, but the node never looked at it
+    assert replayed == recorded == []
+
+
+def test_recordings_without_matches_use_the_closest_replayed_frame(tmp_path, runtime):
+    rec = race(tmp_path / "old.ttr", runtime, matched_is_uniform=False, with_match=False)
+    core, replayed, recorded, _ = replay(rec)
+    core.stop()
+    assert replayed == [("default", 140 * MS, "tea_staff")]
+
+
+def test_node_records_the_matched_frame(tmp_path, runtime):
+    path = tmp_path / "live.ttr"
+    rec = recorder(path, runtime)
+    core = EdgeCore(CollectedAlerts(), runtime=runtime, camera_workers=0, headless=True, recorder=rec)
+    camera = core.camera
+    core.set_active(camera, True)
+    core.put_frame(camera, jpeg(False), 100 * MS)
+    core.process_boxes(camera, 140 * MS, PERSON, [None])
+    core.process_boxes(camera, 900 * MS, [(0, 0, 40, 80)], [None])  # No frame within the skew
+    core.stop()
+    rec.close()
+
+    records = list(Recording(str(path)))
+    matches = [(r.stamp, r.frame_stamp()) for r in records if r.kind == recording.MATCH]
+    assert matches == [(140 * MS, 100 * MS), (900 * MS, None)]
+    kinds = [r.kind for r in records]
+    assert kinds.index(recording.MATCH) > kinds.index(recording.DETECTIONS)
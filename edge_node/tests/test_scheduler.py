@@ -0,0 +1,165 @@
+import datetime
+import logging
+import threading
+import time
+
+import config
+from camera import Camera, FairScheduler
+
+# 10:30 in config.TIMEZONE, inside the first default time window
+IN_WINDOW = datetime.datetime(2026, 1, 5, 5, 0, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def cameras(*names):
+    return [Camera(name, f"/{name}/image", f"/{name}/detections") for name in names]
+
+
+class Recorder:
+    """Handler that records what it handled and can hold the worker until released."""
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.handled = []
+        self.release = threading.Event()
+        self.release.set()
+        self.lock = threading.Lock()
+        self.running = {}
+        self.overlaps = 0
+
+    def __call__(self, camera, item):
+        with self.lock:
+            self.running[camera.name] = self.running.get(camera.name, 0) + 1
+            self.overlaps += self.running[camera.name] > 1
+        try:
+            self.release.wait(5.0)
+            if camera.name in self.fail:
+                raise RuntimeError(f"broken camera {camera.name}")
+            with self.lock:
+                self.handled.append((camera.name, item))
+        finally:
+            with self.lock:
+                self.running[camera.name] -= 1
+
+
+def test_quiet_camera_is_served_before_a_busy_one_catches_up():
+    busy, quiet = cameras("busy", "quiet")
+    handler = Recorder()
+    scheduler = FairScheduler(handler, workers=1)
+    try:
+        handler.release.clear()
+        scheduler.submit(busy, 1)
+        assert wait_for(lambda: handler.running.get("busy") == 1)
+        # While the worker is held, the busy camera floods and the quiet one sends once
+        scheduler.submit(quiet, 1)
+        for n in range(2, 10):
+            scheduler.submit(busy, n)
+        handler.release.set()
+        assert wait_for(lambda: len(handler.handled) == 3)
+        # Only the newest busy message is kept, and it waits its turn
+        assert handler.handled == [("busy", 1), ("quiet", 1), ("busy", 9)]
+        assert busy.detections_dropped == 7
+        assert quiet.detections_dropped == 0
+    finally:
+        scheduler.stop()
+
+
+def test_a_camera_is_never_handled_by_two_workers_at_once():
+    cams = cameras("a", "b", "c")
+    handler = Recorder()
+    scheduler = FairScheduler(handler, workers=4)
+    try:
+        for n in range(200):
+            for camera in cams:
+                scheduler.submit(camera, n)
+        # Every camera's newest message is handled in the end
+        assert wait_for(lambda: {name for name, item in handler.handled if item == 199} == {"a", "b", "c"})
+        assert handler.overlaps == 0
+    finally:
+        scheduler.stop()
+
+
+def test_failing_camera_does_not_starve_the_others(caplog):
+    bad, good = cameras("bad", "good")
+    handler = Recorder(fail=["bad"])
+    scheduler = FairScheduler(handler, workers=1)
+    try:
+        with caplog.at_level(logging.ERROR, logger="teatime"):
+            for n in range(20):
+                scheduler.submit(bad, n)
+                scheduler.submit(good, n)
+                assert wait_for(lambda: ("good", n) in handler.handled)
+        assert [item for _, item in handler.handled] == list(range(20))
+        assert bad.detection_errors > 0
+        assert good.detection_errors == 0
+        # Logged through the logger, with the traceback
+        record = caplog.records[0]
+        assert "[bad]" in record.getMessage()
+        assert "Traceback" in record.getMessage() and "broken camera bad" in record.getMessage()
+    finally:
+        scheduler.stop()
+
+
+def test_cooldown_is_per_camera(monkeypatch):
+    monkeypatch.setattr(config, "CAMERAS", [
+        {"name": "hall", "image_topic": "/hall/image", "detection_topic": "/hall/detections"},
+        {"name": "pantry", "image_topic": "/pantry/image", "detection_topic": "/pantry/detections",
+         "cooldown_seconds": 60},
+    ])
+    from core import EdgeCore
+    from replay import CollectedAlerts
+    now = [IN_WINDOW]
+    core = EdgeCore(CollectedAlerts(), clock=lambda: now[0], camera_workers=0, headless=True)
+    try:
+        hall, pantry = core.cameras
+        for camera in core.cameras:
+            core.update_gate(camera)
+        assert hall.active and pantry.active
+
+        # An alert on the pantry camera only puts the pantry into cooldown
+        pantry.last_alert_time = now[0]
+        core.update_gate(pantry)
+        core.update_gate(hall)
+        assert hall.active and not pantry.active
+        assert pantry.cooldown_remaining(now[0]) == 60
+        assert hall.cooldown_remaining(now[0]) == 0
+
+        handled = []
+        monkeypatch.setattr(core.scheduler, "handler", lambda camera, msg: handled.append(camera.name))
+        core.detection_callback(pantry, object())
+        core.detection_callback(hall, object())
+        assert handled == ["hall"]
+
+        # The pantry's own, shorter cooldown ends on its own schedule
+        now[0] += 61
+        core.update_gate(pantry)
+        assert pantry.active
+    finally:
+        core.stop()
+
+
+def test_suspension_outside_the_window_is_not_blamed_on_the_cooldown(caplog):
+    from core import EdgeCore
+    from replay import CollectedAlerts
+    now = [IN_WINDOW]
+    core = EdgeCore(CollectedAlerts(), clock=lambda: now[0], camera_workers=0, headless=True)
+    try:
+        camera = core.camera
+        core.update_gate(camera)
+        # An alert at 11:55 and its cooldown still pending at 12:05, after the window closed
+        camera.last_alert_time = now[0] + 85 * 60
+        now[0] += 95 * 60
+        assert camera.cooldown_remaining(now[0]) > 0
+        with caplog.at_level(logging.INFO, logger="teatime"):
+            core.update_gate(camera)
+        assert not camera.active
+        assert "Pipeline suspended (outside time window)" in caplog.text
+    finally:
+        core.stop()
@@ -0,0 +1,176 @@
+from collections import Counter, deque
+
+
+def iou(a, b):
+    """Intersection over union of two (x1, y1, x2, y2) boxes."""
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _centroid_close(a, b, max_shift):
+    """True when the centers of a and b are within max_shift of a's diagonal."""
+    dx = (a[0] + a[2] - b[0] - b[2]) / 2
+    dy = (a[1] + a[3] - b[1] - b[3]) / 2
+    diagonal_sq = (a[2] - a[0]) ** 2 + (a[3] - a[1]) ** 2
+    return dx * dx + dy * dy <= diagonal_sq * max_shift * max_shift
+
+
+class Track:
+    """One person followed across messages, with their cached color verdict and recent votes."""
+    __slots__ = ("id", "bbox", "last_seen", "checked_bbox", "checked_at", "verdict", "votes")
+
+    def __init__(self, track_id, bbox, frame, vote_window):
+        self.id = track_id
+        self.bbox = bbox
+        self.last_seen = frame
+        self.checked_bbox = None
+        self.checked_at = None
+        self.verdict = None   # (is_detected, percentage, profile) of the last color check
+        self.votes = deque(maxlen=vote_window)  # Matched profile (or None) per color check
+
+
+class Tracker:
+    """
+    Lightweight IoU/centroid tracker over person boxes.
+
+    Each track caches its last uniform verdict, so the color check only runs
+    for new tracks, every `recheck_frames` updates, when the box has moved
+    (IoU with the last checked box below `recheck_iou`), or while a vote is
+    undecided. An alert needs `vote_min` matching checks among the track's
+    last `vote_window`, so a single bad frame cannot trigger one.
+
+    Boxes that carry a track id from the detector (PerceptionTargets.track_id)
+    are associated by id; the others greedily by IoU, then centroid distance.
+    """
+    def __init__(self, iou_threshold=0.3, max_age=15, recheck_frames=10, recheck_iou=0.7,
+                 vote_window=5, vote_min=3, max_shift=0.25):
+        if not 1 <= vote_min <= vote_window:
+            raise ValueError(f"vote_min must be between 1 and vote_window ({vote_window}), got {vote_min}")
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.recheck_frames = recheck_frames
+        self.recheck_iou = recheck_iou
+        self.vote_window = vote_window
+        self.vote_min = vote_min
+        self.max_shift = max_shift
+        self.tracks = {}
+        self.frame = 0
+        self._next_id = 0
+
+        # Statistics
+        self.checks = 0
+        self.cache_hits = 0
+        self.tracks_created = 0
+
+    def configure(self, iou_threshold, max_age, recheck_frames, recheck_iou, vote_window, vote_min):
+        """
+        Changes the matching, re-check and voting parameters in place, keeping
+        the current tracks. Each track keeps its most recent `vote_window` votes.
+        """
+        if not 1 <= vote_min <= vote_window:
+            raise ValueError(f"vote_min must be between 1 and vote_window ({vote_window}), got {vote_min}")
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.recheck_frames = recheck_frames
+        self.recheck_iou = recheck_iou
+        self.vote_min = vote_min
+        if vote_window != self.vote_window:
+            self.vote_window = vote_window
+            for track in list(self.tracks.values()):
+                track.votes = deque(track.votes, maxlen=vote_window)
+
+    def clear(self):
+        """Forgets all tracks and their votes (e.g. after an alert)."""
+        self.tracks.clear()
+
+    def update(self, bboxes, track_ids=None):
+        """
+        Associates this message's boxes with tracks, creating tracks for new
+        people and expiring those unseen for `max_age` updates.
+        Returns the Track for each box, in order.
+        """
+        self.frame += 1
+        track_ids = track_ids or [None] * len(bboxes)
+        assigned = [None] * len(bboxes)
+        claimed = set()
+
+        # Detector-provided ids first
+        for i, (bbox, track_id) in enumerate(zip(bboxes, track_ids)):
+            if track_id is not None:
+                key = ("id", track_id)
+                track = self.tracks.get(key)
+                if track is None:
+                    track = self._create(key, bbox)
+                assigned[i] = track
+                claimed.add(key)
+
+        # Then the remaining boxes against unclaimed tracks, best overlap first
+        free = [i for i in range(len(bboxes)) if assigned[i] is None]
+        if free:
+            candidates = [key for key in self.tracks if key not in claimed and key[0] == "iou"]
+            pairs = []
+            for i in free:
+                for key in candidates:
+                    track = self.tracks[key]
+                    overlap = iou(bboxes[i], track.bbox)
+                    if overlap >= self.iou_threshold or _centroid_close(track.bbox, bboxes[i], self.max_shift):
+                        pairs.append((overlap, i, key))
+            pairs.sort(reverse=True)
+            for _, i, key in pairs:
+                if assigned[i] is None and key not in claimed:
+                    assigned[i] = self.tracks[key]
+                    claimed.add(key)
+            for i in free:
+                if assigned[i] is None:
+                    key = ("iou", self._next_id)
+                    self._next_id += 1
+                    assigned[i] = self._create(key, bboxes[i])
+
+        for bbox, track in zip(bboxes, assigned):
+            track.bbox = bbox
+            track.last_seen = self.frame
+
+        # Expire tracks that left the scene
+        for key in [key for key, track in self.tracks.items() if self.frame - track.last_seen > self.max_age]:
+            del self.tracks[key]
+        return assigned
+
+    def _create(self, key, bbox):
+        track = Track(key, bbox, self.frame, self.vote_window)
+        self.tracks[key] = track
+        self.tracks_created += 1
+        return track
+
+    def needs_check(self, track):
+        """True when the cached verdict of `track` is missing, stale or undecided."""
+        stale = (track.checked_at is None
+                 or self.frame - track.checked_at >= self.recheck_frames
+                 or iou(track.bbox, track.checked_bbox) < self.recheck_iou
+                 # Keep checking while some, but not enough, checks matched
+                 or (any(track.votes) and self.vote(track) is None))
+        if not stale:
+            self.cache_hits += 1
+        return stale
+
+    def record(self, track, verdict):
+        """Caches a fresh color check result (is_detected, percentage, profile) and counts its vote."""
+        track.verdict = verdict
+        track.checked_bbox = track.bbox
+        track.checked_at = self.frame
+        track.votes.append(verdict[2] if verdict[0] else None)
+        self.checks += 1
+
+    def vote(self, track):
+        """The profile with at least `vote_min` matching checks in the window, or None."""
+        if len(track.votes) < self.vote_min:
+            return None
+        tally = Counter(profile for profile in track.votes if profile is not None)
+        if not tally:
+            return None
+        profile, count = tally.most_common(1)[0]
+        return profile if count >= self.vote_min else None